@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Benchmark of data codecs: YAML text vs. binary records.
+
+Encodes and decodes synthetic users one record at a time, as persistence
+does, and prints encode/decode time and total size of every codec as JSON.
+
+    python benchmarks/codec.py [--users 10000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.dirname(__file__))
+
+# pylint: disable=C0413
+import yaml
+
+from polydating_bot.store import (
+    binarycodec,
+    yamlcodec
+)
+from polydating_bot.store.binarycodec import (
+    Compression
+)
+from generator import (
+    load_questions,
+    make_user
+)
+
+def _yaml_codec(libyaml: bool):
+    return (
+        lambda data: yamlcodec.dump(data).encode(),
+        lambda record: yamlcodec.load(record.decode()),
+        libyaml,
+    )
+
+def _binary_codec(compression: Compression):
+    return (
+        lambda data: binarycodec.dumps(data, compression),
+        binarycodec.loads,
+        False,
+    )
+
+def _codecs():
+    codecs = {'yaml': _yaml_codec(False)}
+    if yaml.__with_libyaml__:
+        codecs['yaml-libyaml'] = _yaml_codec(True)
+    for compression in Compression:
+        codecs[f'binary-{compression.value}'] = _binary_codec(compression)
+    return codecs
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    args = parser.parse_args()
+
+    load_questions()
+    rng = random.Random(0)
+    users = [make_user(x, rng) for x in range(1, args.users + 1)]
+    for name, (encode, decode, libyaml) in _codecs().items():
+        yamlcodec.use_libyaml(libyaml)
+        start = time.perf_counter()
+        records = [encode(x) for x in users]
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for record in records:
+            decode(record)
+        decode_time = time.perf_counter() - start
+
+        print(json.dumps({
+            'codec': name,
+            'users': len(users),
+            'encode_s': round(encode_time, 3),
+            'decode_s': round(decode_time, 3),
+            'size_mb': round(sum(len(x) for x in records) / 2 ** 20, 2),
+        }))
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Synthetic persistence data generator.
+
+Populations are deterministic for the same seed: users answer base, custom
+and final questions of the form, have photo file_id lists and all form
+statuses; chats keep published forms; bot data lists admins and pending
+forms.
+"""
+# pylint: disable=W0212
+
+import os
+import random
+
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple
+)
+
+from polydating_bot.data import (
+    BotData,
+    ChatData,
+    Data,
+    DataType,
+    Form,
+    FormStatus,
+    QuestionType,
+    UserData
+)
+from polydating_bot.data.botdata import (
+    _IdList
+)
+from polydating_bot.data.dating import (
+    _Answer,
+    _AnswerList,
+    _Question
+)
+from polydating_bot.store import (
+    binarycodec,
+    yamlcodec
+)
+from polydating_bot.store.binarycodec import (
+    Compression
+)
+
+CUSTOM_QUESTIONS = (
+    _Question('gender', 'Какой у тебя гендер?', '', 'text', True),
+    _Question('orientation', 'Какая у тебя ориентация?', '', 'text', False),
+    _Question('relations', 'Какие отношения у тебя уже есть?',
+              'Расскажи о своих партнёрах, если хочешь.', 'text', False),
+    _Question('looking_for', 'Кого ты ищешь?', '', 'text', True),
+)
+
+_NAMES = ('Аня', 'Борис', 'Вера', 'Глеб', 'Даша', 'Егор', 'Женя', 'Зоя', 'Илья', 'Катя')
+_PLACES = ('#Мск', '#Спб', '#Нижний_Новгород', '#Улан_Удэ', '#Казань', '#Екатеринбург')
+_WORDS = (
+    'люблю', 'книги', 'походы', 'кофе', 'музыку', 'кино', 'настолки', 'котиков',
+    'честность', 'общение', 'путешествия', 'языки', 'велосипед', 'театр',
+)
+_FILE_ID_CHARS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+_STATUSES = (
+    (FormStatus.BLOCKING, 25),
+    (FormStatus.IDLE, 20),
+    (FormStatus.PENDING, 10),
+    (FormStatus.RETURNED, 5),
+    (FormStatus.PUBLISHED, 40),
+)
+
+def load_questions() -> None:
+    """Load form questions with custom ones."""
+    Form.load_questions(list(CUSTOM_QUESTIONS))
+
+def _file_id(rng: random.Random) -> str:
+    return 'AgACAgIAAxkBAAI' + ''.join(rng.choices(_FILE_ID_CHARS, k=56))
+
+def _text(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choices(_WORDS, k=words)).capitalize() + '.'
+
+def _answer(rng: random.Random, question: _Question, var_id: int):
+    question_type = question.question_type
+    if question.tag == 'name':
+        return f'{rng.choice(_NAMES)} {var_id}'
+    if question.tag == 'place':
+        return rng.choice(_PLACES)
+    if question_type == QuestionType.DIGITS:
+        return rng.randint(18, 60)
+    if question_type == QuestionType.PHOTO:
+        return [_file_id(rng) for _ in range(rng.randint(1, 5))]
+    if question_type == QuestionType.AUDIO:
+        if rng.random() < 0.5:
+            return (True, [_file_id(rng)])
+        return (False, _text(rng, 3))
+    return _text(rng, rng.randint(3, 60))
+
+def make_user(var_id: int, rng: random.Random) -> UserData:
+    """Make user with random answers and status."""
+    statuses, weights = zip(*_STATUSES)
+    status = rng.choices(statuses, weights)[0]
+
+    answers = []
+    for question in Form._questions:
+        # Forms which can not be sent miss some of required answers
+        missing = status == FormStatus.BLOCKING and question.required
+        if (missing and rng.random() < 0.5) or (not question.required and rng.random() < 0.3):
+            continue
+        answers.append(_Answer(question.tag, _answer(rng, question, var_id)))
+
+    data = UserData.__new__(UserData)
+    data._id = var_id
+    data._name_id = f'user{var_id}'
+    data._current_question = rng.randrange(len(Form._questions))
+    data._error = None
+    data._back = None
+    data._answers = _AnswerList(answers)
+    data._status = status.name
+    data._note = _text(rng, 8) if status == FormStatus.RETURNED else ''
+    return data
+
+def make_chat(var_id: int, rng: random.Random, user_ids: List[int]) -> ChatData:
+    """Make chat with some of published forms."""
+    data = ChatData.__new__(ChatData)
+    data._id = var_id
+    data._name_id = f'chat{-var_id}'
+    data._forms = {
+        x: [rng.randint(1, 10 ** 6) for _ in range(rng.randint(2, 7))]
+        for x in rng.sample(user_ids, min(len(user_ids), 20))
+    }
+    data._error = None
+    data._msgs = [None] * ChatData._MSG_COUNT
+    data._needs_update = False
+    return data
+
+def make_bot(admin_ids: List[int], pending_ids: List[int]) -> BotData:
+    """Make bot data with admins and pending forms."""
+    data = BotData.__new__(BotData)
+    data._id = None
+    data._name_id = None
+    data._uuid = '00000000-0000-4000-8000-000000000000'
+    data._owner = admin_ids[0] if admin_ids else None
+    data._dating_channel = -1001
+
+    data._admins = _IdList('admins')
+    data._admins._list.extend(admin_ids)
+    data._pending_forms = _IdList('pending_forms')
+    data._pending_forms._list.extend(pending_ids)
+    return data
+
+def _dump(data: Any, path: str, binary: bool, compression: Compression) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if binary:
+        with open(path + '.bin', 'wb') as f:
+            binarycodec.dump(data, f, compression)
+    else:
+        with open(path + '.yaml', 'w') as f:
+            yamlcodec.dump(data, f)
+
+def generate(
+    directory: str,
+    users: int,
+    chats: int = 0,
+    seed: int = 0,
+    binary: bool = False,
+    compression: Compression = Compression.NONE,
+) -> Tuple[List[int], List[int]]:
+    """Generate persistence directory with synthetic data. Returns user and
+    chat IDs. Users are generated one by one, so memory does not grow with
+    their number."""
+    rng = random.Random(seed)
+    load_questions()
+    chats = chats or max(users // 1000, 1)
+
+    user_ids = list(range(1, users + 1))
+    chat_ids = [-(10 ** 12) - x for x in range(1, chats + 1)]
+
+    pending_ids = []
+    names: Dict[DataType, Dict[int, str]] = {DataType.USER: {}, DataType.CHAT: {}}
+
+    def dump(data: Data) -> None:
+        _dump(data, os.path.join(data.directory(directory), 'data'), binary, compression)
+        if data.data_type() in names:
+            names[data.data_type()][data.id] = data.name_id
+
+    for var_id in user_ids:
+        user = make_user(var_id, rng)
+        dump(user)
+        if user._status == FormStatus.PENDING.name:
+            pending_ids.append(var_id)
+    for var_id in chat_ids:
+        dump(make_chat(var_id, rng, user_ids))
+    dump(make_bot(user_ids[:5], pending_ids))
+
+    for data_type, type_names in names.items():
+        _dump(type_names, os.path.join(directory, data_type.value, 'names'), binary, compression)
+
+    conversations: Dict[str, Dict[Tuple, int]] = {
+        'user': {(x,): rng.randint(0, 2) for x in user_ids}
+    }
+    path = os.path.join(directory, 'bot', 'conv.yaml')
+    with open(path, 'w') as f:
+        yamlcodec.dump(conversations, f)
+    return user_ids, chat_ids
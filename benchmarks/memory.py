@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Benchmark of memory taken by loaded users.
+
+Encodes synthetic users, decodes them back as persistence does on load and
+prints traced memory per user of every codec as JSON.
+
+    python benchmarks/memory.py [--users 10000]
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.dirname(__file__))
+
+# pylint: disable=C0413
+from polydating_bot.store import (
+    binarycodec,
+    yamlcodec
+)
+from generator import (
+    load_questions,
+    make_user
+)
+
+_CODECS = {
+    'yaml': (yamlcodec.dump, yamlcodec.load),
+    'binary': (binarycodec.dumps, binarycodec.loads),
+}
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    args = parser.parse_args()
+
+    yamlcodec.use_libyaml()
+    load_questions()
+    rng = random.Random(0)
+    users = [make_user(x, rng) for x in range(1, args.users + 1)]
+
+    for name, (encode, decode) in _CODECS.items():
+        records = [encode(x) for x in users]
+
+        gc.collect()
+        tracemalloc.start()
+        loaded = [decode(x) for x in records]
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        answers = sum(len(x.answers) for x in loaded)
+        print(json.dumps({
+            'codec': name,
+            'users': len(loaded),
+            'answers_per_user': round(answers / len(loaded), 1),
+            'bytes_per_user': round(size / len(loaded)),
+        }))
+
+if __name__ == '__main__':
+    _main()
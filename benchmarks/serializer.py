@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Microbenchmark of data objects serialization.
+
+Packs synthetic users into mappings and back, as YAML and binary codecs do
+for every record, and prints the best time per 10k records of every step as
+JSON tagged with the current commit.
+
+    python benchmarks/serializer.py [--users 10000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.dirname(__file__))
+
+# pylint: disable=C0413
+from polydating_bot.data import (
+    UserData
+)
+from polydating_bot.store import (
+    binarycodec,
+    yamlcodec
+)
+from generator import (
+    load_questions,
+    make_user
+)
+from store import (
+    _commit
+)
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    yamlcodec.use_libyaml()
+    load_questions()
+    rng = random.Random(0)
+    users = [make_user(x, rng) for x in range(1, args.users + 1)]
+    mappings = [UserData.to_mapping(x) for x in users]
+    records = [binarycodec.dumps(x) for x in users]
+    documents = [yamlcodec.dump(x) for x in users]
+
+    steps = {
+        'to_mapping': lambda: [UserData.to_mapping(x) for x in users],
+        'from_mapping': lambda: [UserData.from_mapping(x) for x in mappings],
+        'binary_dumps': lambda: [binarycodec.dumps(x) for x in users],
+        'binary_loads': lambda: [binarycodec.loads(x) for x in records],
+        'yaml_dump': lambda: [yamlcodec.dump(x) for x in users],
+        'yaml_load': lambda: [yamlcodec.load(x) for x in documents],
+    }
+
+    result = {'commit': _commit(), 'users': args.users}
+    for name, step in steps.items():
+        best = min(timeit.repeat(step, number=1, repeat=args.repeat))
+        result[f'{name}_ms'] = round(best * 1000 * 10000 / args.users, 2)
+    print(json.dumps(result))
+
+if __name__ == '__main__':
+    _main()
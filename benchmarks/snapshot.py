@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Benchmark of persistence getters: deepcopy snapshots vs. copy-free handoff.
+
+Generates synthetic users store (if no directory is given) and loads it in
+a separate process per variant to measure time and peak RSS of
+'get_user_data()' as the dispatcher calls it.
+
+    python benchmarks/snapshot.py [--users 50000] [--directory path]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from copy import (
+    deepcopy
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.dirname(__file__))
+
+# pylint: disable=C0413
+from telegram.ext import (
+    BasePersistence
+)
+
+from polydating_bot.store import (
+    YamlPersistence,
+    yamlcodec
+)
+from generator import (
+    generate,
+    load_questions
+)
+from store import (
+    FakeBot
+)
+
+_VARIANTS = ('deepcopy', 'handoff')
+
+class _DeepcopyPersistence(YamlPersistence):
+    """Persistence with getters as they used to be."""
+    def get_user_data(self):
+        return deepcopy(super().get_user_data())
+
+    def insert_bot(self, obj):
+        return BasePersistence.insert_bot(self, obj)
+
+def _run(variant: str, directory: str) -> None:
+    yamlcodec.use_libyaml()
+    load_questions()
+    cls = _DeepcopyPersistence if variant == 'deepcopy' else YamlPersistence
+    persistence = cls(directory=directory)
+    persistence.set_bot(FakeBot())
+
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    user_data = persistence.get_user_data()
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(json.dumps({
+        'variant': variant,
+        'users': len(user_data),
+        'time_s': round(elapsed, 3),
+        'peak_rss_mb': round(peak_rss / 1024, 1),
+        'load_rss_mb': round((peak_rss - base_rss) / 1024, 1),
+    }))
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--directory', help='existing store to load')
+    parser.add_argument('--run', choices=_VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        _run(args.run, args.directory)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = args.directory
+        if not directory:
+            directory = tmp_dir
+            yamlcodec.use_libyaml()
+            generate(directory, args.users)
+
+        for variant in _VARIANTS:
+            subprocess.run(
+                [sys.executable, __file__, '--run', variant, '--directory', directory],
+                check=True
+            )
+
+if __name__ == '__main__':
+    _main()
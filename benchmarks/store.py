@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Benchmark of YAML persistence on synthetic populations.
+
+Generates a store for every number of users and measures it in a separate
+process: cold load of all data and conversations, single-record update,
+'flush()' of dirty records, conversation updates and peak RSS. Every run
+prints one JSON line tagged with the current commit, so results can be
+compared between commits. No network access is needed: a fake bot answers
+chat requests from the generated data.
+
+    python benchmarks/store.py [--users 1000,10000,100000] [--libyaml] [--binary]
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.dirname(__file__))
+
+# pylint: disable=C0413
+from telegram import (
+    Bot,
+    Chat,
+    User
+)
+
+from polydating_bot.data import (
+    UserData
+)
+from polydating_bot.store import (
+    YamlPersistence,
+    yamlcodec
+)
+from generator import (
+    generate,
+    load_questions
+)
+
+_UPDATES = 1000
+
+class FakeBot(Bot):
+    """Bot answering API requests locally, without network."""
+    def __init__(self):
+        super().__init__('123456:benchmark')
+
+    def get_me(self, *args, **kwargs) -> User:
+        return User(123456, 'Benchmark', True, username='benchmark_bot', bot=self)
+
+    def get_chat(self, chat_id, *args, **kwargs) -> Chat:
+        if int(chat_id) > 0:
+            return Chat(chat_id, Chat.PRIVATE, username=f'user{chat_id}', bot=self)
+        return Chat(chat_id, Chat.CHANNEL, title=f'chat{-int(chat_id)}', bot=self)
+
+    getMe = get_me
+    getChat = get_chat
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def _persistence(args: argparse.Namespace, **kwargs) -> YamlPersistence:
+    persistence = YamlPersistence(
+        directory=args.directory,
+        binary=args.binary,
+        lazy=args.lazy,
+        load_workers=args.load_workers,
+        **kwargs
+    )
+    persistence.set_bot(FakeBot())
+    return persistence
+
+def _cold_load(persistence: YamlPersistence):
+    start = time.perf_counter()
+    user_data = persistence.get_user_data()
+    persistence.get_chat_data()
+    persistence.get_bot_data()
+    persistence.get_conversations('user')
+    return user_data, time.perf_counter() - start
+
+def _update_users(persistence: YamlPersistence, user_data, user_ids) -> float:
+    """Change note of users and pass them to persistence, as handlers do.
+    Returns average time of update."""
+    start = time.perf_counter()
+    for user_id in user_ids:
+        data = user_data[user_id]
+        UserData.from_dict(data).note = f'note {time.perf_counter()}'
+        persistence.update_user_data(user_id, data)
+    return (time.perf_counter() - start) / len(user_ids)
+
+def _run(args: argparse.Namespace) -> None:
+    yamlcodec.use_libyaml(args.libyaml)
+    load_questions()
+    rng = random.Random(1)
+
+    persistence = _persistence(args)
+    user_data, load_time = _cold_load(persistence)
+    load_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    user_ids = rng.sample(range(1, args.users + 1), min(_UPDATES, args.users))
+
+    # Records are written right away
+    update_time = _update_users(persistence, user_data, user_ids)
+
+    # Records are written on flush only
+    persistence = _persistence(args, on_flush=True)
+    user_data, _ = _cold_load(persistence)
+    _update_users(persistence, user_data, user_ids)
+    start = time.perf_counter()
+    persistence.flush()
+    flush_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for user_id in user_ids:
+        persistence.update_conversation('user', (user_id,), rng.randint(3, 9))
+    conv_time = (time.perf_counter() - start) / len(user_ids)
+
+    print(json.dumps({
+        'commit': _commit(),
+        'users': args.users,
+        'libyaml': args.libyaml,
+        'binary': args.binary,
+        'lazy': args.lazy,
+        'load_s': round(load_time, 3),
+        'update_ms': round(update_time * 1000, 3),
+        'flush_s': round(flush_time, 3),
+        'flush_records': len(user_ids),
+        'conversation_ms': round(conv_time * 1000, 3),
+        'load_rss_mb': round(load_rss / 1024, 1),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }), flush=True)
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', default='1000,10000,100000',
+                        help='comma-separated numbers of users [1000,10000,100000]')
+    parser.add_argument('--libyaml', action='store_true', help='use libyaml C implementation')
+    parser.add_argument('--binary', action='store_true', help='use binary records')
+    parser.add_argument('--lazy', action='store_true', help='load users on demand')
+    parser.add_argument('--load-workers', type=int, default=0, help='parallel load threads')
+    parser.add_argument('--directory', help=argparse.SUPPRESS)
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        args.users = int(args.users)
+        _run(args)
+        return
+
+    yamlcodec.use_libyaml()
+    for users in (int(x) for x in args.users.split(',')):
+        with tempfile.TemporaryDirectory() as directory:
+            generate(directory, users, binary=args.binary)
+            command = [
+                sys.executable, __file__, '--run', '--users', str(users),
+                '--directory', directory, '--load-workers', str(args.load_workers),
+            ]
+            command += [f'--{x}' for x in ('libyaml', 'binary', 'lazy') if getattr(args, x)]
+            subprocess.run(command, check=True)
+
+if __name__ == '__main__':
+    _main()
@@ -3,10 +3,15 @@
 
 import logging
 
+from typing import (
+    Dict
+)
+
 from telegram import (
     utils
 )
 from telegram.ext import (
+    Dispatcher,
     Updater,
 )
 
@@ -14,13 +19,20 @@ from polydating_bot import (
      MissingDataError
 )
 from polydating_bot.store import (
+    SqlitePersistence,
     YamlPersistence,
-    BotConfig as config
+    BotConfig as config,
+    use_libyaml
+)
+from polydating_bot.store.workingset import (
+    WorkingSet
 )
 from polydating_bot.data import (
     BotData,
+    ChatCache,
     Data,
-    Form
+    Form,
+    UserData
 )
 import polydating_bot.handlers
 
@@ -35,16 +47,66 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Select YAML implementation before any file is loaded
+use_libyaml(config.libyaml)
+
 # Update form questions list (after logger initialization)
 Form.load_questions(YamlPersistence.load_file(config.form_file))
 
+def _persistence():
+    if config.backend == 'sqlite':
+        return SqlitePersistence(filename=config.database_file)
+    return YamlPersistence(
+        directory=config.persist_dir,
+        flush_interval=config.flush_interval,
+        flush_changes=config.flush_changes,
+        durability=config.durability,
+        commit_interval=config.commit_interval,
+        load_workers=config.load_workers,
+        load_processes=config.load_processes,
+        lazy=config.lazy_users,
+        cache_size=config.cache_size,
+        journal_ratio=config.journal_ratio,
+        binary=config.binary,
+        compression=config.compression,
+        write_queue=config.write_queue,
+        cleanup=True,
+    )
+
+def _update_forms(user_data: Dict) -> None:
+    """Update statuses of loaded forms as per the current questions list."""
+    forms = []
+    for data in user_data.values():
+        try:
+            forms.append(UserData.from_dict(data))
+        except MissingDataError:
+            continue
+    Form.update_statuses(forms)
+
+def _pin_updates(dispatcher: Dispatcher, working_set: WorkingSet) -> None:
+    """Process every update within 'pinned()' block of the working set, so
+    records got by handlers are not evicted till the update is processed."""
+    process_update = dispatcher.process_update
+
+    def _process_update(update: object) -> None:
+        with working_set.pinned():
+            process_update(update)
+
+    dispatcher.process_update = _process_update
+
 def _main():
-    persistence = YamlPersistence(directory=config.persist_dir)
+    persistence = _persistence()
     updater = Updater(config.token, persistence=persistence)
 
     dispatcher = updater.dispatcher
     logger.info('Dispatcher is created.')
 
+    # Users loaded on demand update their statuses when read
+    if config.backend == 'sqlite' or not config.lazy_users:
+        _update_forms(dispatcher.user_data)
+    elif isinstance(dispatcher.user_data, WorkingSet):
+        _pin_updates(dispatcher, dispatcher.user_data)
+
     # Create bot data if missing
     try:
         bot_data = BotData.from_dict(dispatcher.bot_data)
@@ -61,6 +123,7 @@ def _main():
 
     # Update persistence data
     Data.update_bot(dispatcher.bot)
+    Data.update_chat_cache(ChatCache(ttl=config.chat_cache_ttl))
 
     # Register bot handlers, e.g. converstaion/command handlers
     polydating_bot.handlers.add_handlers(dispatcher)
@@ -1,18 +1,26 @@
 """Import data modules."""
 
-from .base import ABCYamlMeta, Data, DataType
-from .dating import Form, FormStatus, QuestionType
+from .chatcache import ChatCache
+from .base import ABCYamlMeta, Data, DataType, Versioned
+from .dating import Coverage, Form, FormStatus, QuestionType, StatusIndex
 from .botdata import BotData
 from .userdata import UserData
 from .chatdata import ChatData
+from .registry import register_yaml_types, yaml_types
 
 __all__ = (
     'ABCYamlMeta',
     'BotData',
+    'ChatCache',
     'ChatData',
+    'Coverage',
     'Data',
     'DataType',
     'Form',
     'FormStatus',
     'QuestionType',
+    'StatusIndex',
+    'Versioned',
+    'register_yaml_types',
+    'yaml_types',
 )
@@ -2,7 +2,11 @@
 """Data base class module."""
 from __future__ import annotations
 
+import copy
+import hashlib
+import itertools
 import logging
+import operator
 import os
 
 from abc import (
@@ -13,8 +17,13 @@ from enum import (
     Enum
 )
 from typing import (
+    Any,
     Dict,
-    Optional
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union
 )
 
 from yaml import (
@@ -25,6 +34,7 @@ from telegram import (
     Chat,
     Bot,
     TelegramError,
+    User,
     utils,
 )
 from telegram.ext import (
@@ -36,6 +46,10 @@ from polydating_bot import (
     MissingDataError,
     IncorrectIdError
 )
+from polydating_bot.data.chatcache import (
+    ChatCache,
+    ChatId
+)
 
 logger = logging.getLogger(__name__)
 
@@ -45,17 +59,93 @@ class DataType(Enum):
     CHAT = 'chat'
     BOT = 'bot'
 
+class _Serializer:
+    """Packs fields of data objects into mapping and back as per data mapping
+    of their class: a section is a field name or a list of field names."""
+    __slots__ = ('_sections', '_attrs', '_getter')
+
+    def __init__(self, mapping: Dict[str, Union[str, List[str]]]):
+        attrs = []
+        sections = []
+        for key, val in mapping.items():
+            if isinstance(val, list):
+                sections.append((key, len(attrs), len(attrs) + len(val)))
+                attrs.extend(val)
+            else:
+                sections.append((key, len(attrs), None))
+                attrs.append(val)
+
+        # Section values are slices of a single tuple of all fields
+        self._sections: Tuple[Tuple[str, int, Optional[int]], ...] = tuple(sections)
+        self._attrs: Tuple[str, ...] = tuple(attrs)
+        getter = operator.attrgetter(*attrs)
+        self._getter = getter if len(attrs) > 1 else lambda x: (getter(x),)
+
+    def pack(self, obj: Any) -> Dict:
+        """Get mapping of object fields."""
+        values = self._getter(obj)
+        return {
+            key: values[start] if end is None else list(values[start:end])
+            for key, start, end in self._sections
+        }
+
+    def unpack(self, obj: Any, mapping: Dict) -> None:
+        """Set object fields from mapping made by 'pack()'."""
+        values = []
+        for key, _, end in self._sections:
+            if end is None:
+                values.append(mapping[key])
+            else:
+                values.extend(mapping[key])
+        vars(obj).update(zip(self._attrs, values))
+
 class ABCYamlMeta(YAMLObjectMetaclass, ABCMeta):
-    """Combined metaclass of YAMLObjectMetaclass and ABCMeta."""
+    """Combined metaclass of YAMLObjectMetaclass and ABCMeta. Serializer of
+    data classes is made once, at class creation."""
+    def __init__(cls, name, bases, kwds):
+        super().__init__(name, bases, kwds)
+        if hasattr(cls, '_mapping') and not cls.__abstractmethods__:
+            cls._serializer = _Serializer({**cls._mapping, **cls.data_mapping()})
+
+# Versions are unique across objects, so a new object never matches a version
+# of the object it replaces
+_VERSIONS = itertools.count(1)
+
+class Versioned:
+    """Mutation version mixin. Every mutation of persistent state must call
+    'touch()'. Objects loaded from persistence have zero version."""
+    __slots__ = ()
+
+    _version: int = 0
+
+    @property
+    def version(self) -> int:
+        """Mutation version of the object."""
+        return self._version
+
+    def touch(self) -> None:
+        """Bump mutation version."""
+        self._version = self.next_version()
+
+    @staticmethod
+    def next_version() -> int:
+        """Get a new unique version."""
+        return next(_VERSIONS)
 
-class Data(YAMLObject, metaclass=ABCYamlMeta): # pylint: disable=R0903
+class Data(YAMLObject, Versioned, metaclass=ABCYamlMeta): # pylint: disable=R0903
     """Data base class."""
     _KEY: str = 'data'
     _bot: Optional[Bot] = None
 
+    _chats: ChatCache = ChatCache()
+
+    # Case-insensitive index of usernames/titles to IDs of every data type
+    _name_index: Dict[DataType, Dict[str, int]] = {x: {} for x in DataType}
+
     _mapping = {
         'obj': ['_id', '_name_id']
     }
+    _serializer: _Serializer
 
     def __init__(self, chat: Optional[Chat] = None):
         self._id: Optional[int] = None
@@ -64,18 +154,16 @@ class Data(YAMLObject, metaclass=ABCYamlMeta): # pylint: disable=R0903
         logger.debug(f'Creating new data: {locals()}')
         if chat:
             self._id = chat.id
-            if chat.username:
-                self._name_id = chat.username
-            elif chat.title:
-                self._name_id = chat.title
-            elif chat.full_name:
-                self._name_id = chat.full_name
+            self._name_id = self._chat_name(chat)
 
         # Add new data to the bot data list
         data_dict = self._data_by_type()
         self.update_dict(data_dict, self._id)
 
         super().__init__()
+        if self._id:
+            self.index()
+        self.touch()
 
     def __str__(self):
         return f'{self._id}: {self._name_id}'
@@ -145,27 +233,71 @@ class Data(YAMLObject, metaclass=ABCYamlMeta): # pylint: disable=R0903
             raise IncorrectIdError
         return cls.from_dict(cls._data_by_type(), var_id)
 
+    @staticmethod
+    def _name_key(name: str) -> str:
+        return name.lstrip('@').casefold()
+
+    @staticmethod
+    def index_name(
+        data_type: DataType,
+        var_id: int,
+        name_id: Optional[str],
+        old_name_id: Optional[str] = None
+    ) -> None:
+        """Update usernames index with a name of the ID, e.g. of loaded data."""
+        index = Data._name_index[data_type]
+        if old_name_id and index.get(Data._name_key(old_name_id)) == var_id:
+            del index[Data._name_key(old_name_id)]
+        if name_id:
+            index[Data._name_key(name_id)] = var_id
+
+    def index(self) -> None:
+        """Add data to indexes, e.g. after load."""
+        self.index_name(self.data_type(), self._id, self._name_id)
+
     @classmethod
     def by_username(cls, username: str) -> Data:
-        """Get instance of class by username."""
+        """Get instance of class by username (or title), case-insensitive."""
         assert cls.data_type() in DataType and cls.data_type() != DataType.BOT
-        data = cls._data_by_type()
-
-        data_it = (x for x in data.items() if cls.from_dict(x).name_id == username)
-        try:
-            return next(data_it)
-        except StopIteration as exc:
-            raise MissingDataError(f'No data with username {username}') from exc
+        var_id = Data._name_index[cls.data_type()].get(cls._name_key(username))
+        if var_id is None:
+            raise MissingDataError(f'No data with username {username}')
+        return cls.by_id(var_id)
 
     @property
     def id(self) -> int: # pylint: disable=C0103
         """Chat ID which this data relates to."""
         return self._id
 
+    @property
+    def name_id(self) -> Optional[str]:
+        """Username or title of the chat this data relates to."""
+        return self._name_id
+
+    @name_id.setter
+    def name_id(self, value: Optional[str]) -> None:
+        if value == self._name_id:
+            return
+        self.index_name(self.data_type(), self._id, value, self._name_id)
+        self._name_id = value
+        self.touch()
+
+    @staticmethod
+    def _chat_name(chat: Union[Chat, User]) -> Optional[str]:
+        if chat.username:
+            return chat.username
+        if getattr(chat, 'title', None):
+            return chat.title
+        return chat.full_name or None
+
+    def update_name(self, chat: Union[Chat, User]) -> None:
+        """Update username or title with the current one of the chat."""
+        self.name_id = self._chat_name(chat)
+
     def mention(self) -> str:
         """Get Telegram mention by ID."""
         try:
-            chat: Chat = self._bot.getChat(self._id)
+            chat: Chat = self.get_chat(self._id)
         except TelegramError as exc:
             raise IncorrectIdError from exc
 
@@ -186,14 +318,41 @@ class Data(YAMLObject, metaclass=ABCYamlMeta): # pylint: disable=R0903
         if self.data_type() == DataType.BOT:
             path = root_dir
         else:
-            path = os.path.join(root_dir, f'{self._id}_{self._name_id}')
+            # Path depends on ID only, so renamed chat keeps its directory
+            path = os.path.join(root_dir, self.shard(self._id), str(self._id))
         return os.path.normpath(path)
 
+    @staticmethod
+    def shard(var_id: int) -> str:
+        """Get shard directory name of the ID: stable one byte hash in hex."""
+        return hashlib.blake2b(str(var_id).encode(), digest_size=1).hexdigest()
+
     @classmethod
     def update_bot(cls, bot: Bot) -> None:
         """Bind bot instance for Data class."""
         cls._bot = bot
 
+    @classmethod
+    def update_chat_cache(cls, cache: ChatCache) -> None:
+        """Set chat info cache for Data class."""
+        Data._chats = cache
+
+    @classmethod
+    def get_chat(cls, chat_id: ChatId) -> Chat:
+        """Get chat info by ID or @username, cached."""
+        return Data._chats.get(cls._bot, chat_id)
+
+    @classmethod
+    def prefetch_chats(cls, chat_ids: Iterable[ChatId]) -> None:
+        """Get info of chats missing in cache concurrently, e.g. before
+        mentioning all of them."""
+        Data._chats.prefetch(cls._bot, chat_ids)
+
+    @classmethod
+    def observe_chat(cls, chat: Union[Chat, User]) -> None:
+        """Drop cached info of the chat if update shows it is renamed."""
+        Data._chats.observe(chat)
+
     @abstractclassmethod
     def data_type(cls) -> DataType:
         """This method must return data type as per DataType values."""
@@ -203,35 +362,52 @@ class Data(YAMLObject, metaclass=ABCYamlMeta): # pylint: disable=R0903
         """This method must return data mapping for YAML transformation."""
 
     @classmethod
-    def to_yaml(cls, dumper, data: Data): # pylint: disable=C0116
-        mapping = {}
-
-        cls_mapping = dict(cls._mapping)
-        cls_mapping.update(cls.data_mapping())
+    def detached_mapping(cls) -> Dict:
+        """Data mapping sections which are also stored apart from the rest of
+        the data, so frequent changes of them do not rewrite the whole record."""
+        return {}
+
+    def versions(self) -> Tuple[int, int]:
+        """Mutation versions of the data and of its detached sections."""
+        return (self.version, 0)
+
+    def detached_state(self) -> Dict:
+        """Get values of detached mapping sections."""
+        return {
+            key: [getattr(self, attr) for attr in val]
+            for key, val in self.detached_mapping().items()
+        }
+
+    def restore_detached(self, state: Dict) -> None:
+        """Restore values of detached mapping sections."""
+        for key, val in self.detached_mapping().items():
+            for attr, value in zip(val, state.get(key, ())):
+                setattr(self, attr, value)
 
-        logger.debug(f'{cls_mapping}')
-
-        for key, val in cls_mapping.items():
-            if not isinstance(val, list):
-                mapping[key] = getattr(data, val)
-            else:
-                mapping[key] = []
-                for attr in val:
-                    mapping[key].append(getattr(data, attr))
-        return dumper.represent_mapping(cls.yaml_tag, mapping)
+    @classmethod
+    def to_mapping(cls, data: Data) -> Dict:
+        """Get serializable mapping of data object as per data mapping."""
+        return cls._serializer.pack(data)
 
     @classmethod
-    def from_yaml(cls, loader, node): # pylint: disable=C0116
-        mapping = loader.construct_mapping(node, deep=True)
+    def from_mapping(cls, mapping: Dict) -> Data:
+        """Create data object from mapping made by 'to_mapping()'."""
         data = cls.__new__(cls)
+        cls._serializer.unpack(data, mapping)
+        return data
 
-        cls_mapping = dict(cls._mapping)
-        cls_mapping.update(cls.data_mapping())
-
-        for key, val in cls_mapping.items():
-            if not isinstance(val, list):
-                setattr(data, val, mapping[key])
-            else:
-                for idx, attr in enumerate(val):
-                    setattr(data, attr, mapping[key][idx])
+    def snapshot(self) -> Data:
+        """Get a copy of the data as per data mapping which shares no state
+        with it, e.g. to write it while the data is being changed."""
+        # Not a 'cls.__new__': bot data is a singleton
+        data = object.__new__(type(self))
+        self._serializer.unpack(data, copy.deepcopy(self._serializer.pack(self)))
         return data
+
+    @classmethod
+    def to_yaml(cls, dumper, data: Data): # pylint: disable=C0116
+        return dumper.represent_mapping(cls.yaml_tag, cls.to_mapping(data))
+
+    @classmethod
+    def from_yaml(cls, loader, node): # pylint: disable=C0116
+        return cls.from_mapping(loader.construct_mapping(node, deep=True))
@@ -18,9 +18,6 @@ from collections.abc import (
     MutableSequence
 )
 
-from telegram.ext import (
-    Dispatcher
-)
 from telegram import (
     TelegramError
 )
@@ -34,12 +31,13 @@ from polydating_bot import (
 from polydating_bot.data import (
     ABCYamlMeta,
     Data,
-    DataType
+    DataType,
+    Versioned
 )
 
 logger = logging.getLogger(__name__)
 
-class _IdList(MutableSequence, YAMLObject, metaclass=ABCYamlMeta): # pylint: disable=R0901
+class _IdList(MutableSequence, YAMLObject, Versioned, metaclass=ABCYamlMeta): # pylint: disable=R0901
     yaml_tag = u'!IdList'
 
     def __init__(self, name: str):
@@ -52,6 +50,11 @@ class _IdList(MutableSequence, YAMLObject, metaclass=ABCYamlMeta): # pylint: dis
     def __len__(self):
         return self._list.__len__()
 
+    def __eq__(self, other):
+        if not isinstance(other, _IdList):
+            return False
+        return self._name == other._name and self._list == other._list
+
     def __getitem__(self, idx):
         return self._list.__getitem__(idx)
 
@@ -60,6 +63,7 @@ class _IdList(MutableSequence, YAMLObject, metaclass=ABCYamlMeta): # pylint: dis
 
     def __delitem__(self, idx):
         self._list.__delitem__(idx)
+        self.touch()
 
     def __str__(self):
         return self._list.__str__()
@@ -69,20 +73,21 @@ class _IdList(MutableSequence, YAMLObject, metaclass=ABCYamlMeta): # pylint: dis
 
     def append(self, value):
         """Append item to list."""
-        bot = Dispatcher.get_instance().bot
         try:
-            var_id = bot.getChat(value).id
+            var_id = Data.get_chat(value).id
         except TelegramError as exc:
             raise IncorrectIdError(f'Can\'t get chat: {value}') from exc
 
         if var_id not in self._list:
             logger.info(f'New id added to \'{self._name}\' list: {var_id}')
             self._list.append(var_id)
+            self.touch()
 
     def remove(self, value):
         """Remove item from list."""
         if value in self._list:
             self._list.remove(value)
+            self.touch()
 
     @classmethod
     def to_yaml(cls, dumper, data: _IdList):
@@ -129,6 +134,11 @@ class BotData(Data):
             'dating': ['_dating_channel', '_pending_forms', '_admins'],
         }
 
+    @property
+    def version(self) -> int:
+        """Mutation version of bot data including its lists."""
+        return max(self._version, self._admins.version, self._pending_forms.version)
+
     @property
     def uuid(self) -> str:
         """Bot UUID string. Used for deep-linking."""
@@ -150,7 +160,8 @@ class BotData(Data):
             return
 
         try:
-            self._owner = self._bot.getChat(value[1]).id
+            self._owner = self.get_chat(value[1]).id
+            self.touch()
             logger.info(f'Setting new owner: {value[1]}')
         except TelegramError:
             logger.warning(f'Couldn\'t set new owner! Incorrect chat id: {id}')
@@ -166,12 +177,13 @@ class BotData(Data):
             if not value:
                 channel = None
             else:
-                channel = self._bot.getChat(value)
+                channel = self.get_chat(value)
         except TelegramError as exc:
             raise IncorrectIdError('Could not find channel.') from exc
         else:
             if channel.type == 'channel':
                 self._dating_channel = channel.id
+                self.touch()
                 logger.info(f'Adding new dating channel: {channel.username}')
             else:
                 raise IncorrectIdError('Not a channel.')
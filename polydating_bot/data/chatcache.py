@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Telegram chats info cache module."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+from collections import (
+    OrderedDict
+)
+from concurrent.futures import (
+    ThreadPoolExecutor
+)
+from typing import (
+    Dict,
+    Hashable,
+    Iterable,
+    Optional,
+    Tuple,
+    Union
+)
+
+from telegram import (
+    Bot,
+    Chat,
+    TelegramError,
+    User
+)
+from telegram.error import (
+    BadRequest
+)
+
+logger = logging.getLogger(__name__)
+
+ChatId = Union[int, str]
+
+# Cached chat or error of a chat which does not exist, and expiration time
+_Entry = Tuple[Union[Chat, TelegramError], float]
+
+_CHAT_NOT_FOUND = 'chat not found'
+
+class ChatCache:
+    """Cache of 'getChat' results by chat ID or @username.
+
+    Chats expire in 'ttl' seconds; at most 'maxsize' chats are kept, the
+    least recently used ones are evicted above it. Unknown chats are cached
+    for 'negative_ttl' seconds: their lookups raise the cached error without
+    a request. Other errors, e.g. network ones or the bot being blocked, are
+    never cached.
+
+    Chats which turn out to be renamed (see 'observe') are dropped, so the
+    next lookup gets fresh info. 'prefetch' looks up a list of chats by
+    'workers' concurrent requests, e.g. before mentioning all of them.
+    """
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 600.0,
+        negative_ttl: float = 60.0,
+        workers: int = 8,
+    ):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._workers = workers
+
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits: int = 0
+        self._misses: int = 0
+
+    @staticmethod
+    def _key(chat_id: ChatId) -> Hashable:
+        if isinstance(chat_id, str):
+            try:
+                return int(chat_id)
+            except ValueError:
+                return chat_id.casefold()
+        return chat_id
+
+    def _lookup(self, key: Hashable, count: bool = True) -> Optional[Union[Chat, TelegramError]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] < time.monotonic():
+                del self._entries[key]
+                entry = None
+
+            if count:
+                if entry:
+                    self._hits += 1
+                else:
+                    self._misses += 1
+            if not entry:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _store(self, key: Hashable, value: Union[Chat, TelegramError]) -> None:
+        ttl = self._negative_ttl if isinstance(value, TelegramError) else self._ttl
+        expires = time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            # Chat requested by @username is also found by its ID
+            if isinstance(value, Chat) and key != value.id:
+                self._entries[value.id] = (value, expires)
+                self._entries.move_to_end(value.id)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, bot: Bot, chat_id: ChatId) -> Chat:
+        """Get chat info by ID or @username. Raises TelegramError if chat is
+        unknown or could not be requested."""
+        key = self._key(chat_id)
+        if self._ttl > 0:
+            value = self._lookup(key)
+            if isinstance(value, TelegramError):
+                raise value
+            if value:
+                return value
+
+        try:
+            chat = bot.getChat(chat_id)
+        except BadRequest as exc:
+            if self._negative_ttl > 0 and exc.message.casefold() == _CHAT_NOT_FOUND:
+                self._store(key, exc)
+            raise
+        if self._ttl > 0:
+            self._store(key, chat)
+        return chat
+
+    def prefetch(self, bot: Bot, chat_ids: Iterable[ChatId]) -> None:
+        """Look up chats missing in cache concurrently."""
+        if self._ttl <= 0:
+            return
+        missing = [
+            x for x in dict.fromkeys(chat_ids) if self._lookup(self._key(x), False) is None
+        ]
+        if not missing:
+            return
+
+        def get(chat_id: ChatId) -> None:
+            try:
+                self.get(bot, chat_id)
+            except TelegramError as exc:
+                logger.warning(f'Can\'t get chat: {chat_id}: {exc}')
+
+        with ThreadPoolExecutor(max_workers=min(self._workers, len(missing))) as executor:
+            # Errors are logged by 'get', results are in cache
+            list(executor.map(get, missing))
+        logger.debug(f'Chats prefetched: {len(missing)}')
+
+    def invalidate(self, chat_id: ChatId) -> None:
+        """Drop cached chat info."""
+        with self._lock:
+            entry = self._entries.pop(self._key(chat_id), None)
+            if entry and isinstance(entry[0], Chat) and entry[0].username:
+                self._entries.pop(entry[0].username.casefold(), None)
+                self._entries.pop(f'@{entry[0].username}'.casefold(), None)
+
+    def observe(self, chat: Union[Chat, User]) -> None:
+        """Check chat or user of an update against cached info: renamed chats
+        are dropped from cache."""
+        with self._lock:
+            entry = self._entries.get(chat.id)
+        if not entry or not isinstance(entry[0], Chat):
+            return
+
+        cached = entry[0]
+        names = ('username', 'title', 'first_name', 'last_name')
+        if any(getattr(chat, x, None) != getattr(cached, x, None) for x in names
+               if hasattr(chat, x)):
+            logger.debug(f'Chat info changed: {chat.id}')
+            self.invalidate(chat.id)
+
+    def clear(self) -> None:
+        """Drop all cached chats."""
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Cache metrics: size, hits and misses."""
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self._hits, 'misses': self._misses}
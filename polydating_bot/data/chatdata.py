@@ -72,6 +72,7 @@ class ChatData(Data):
 
         self.delete_form(user_id)
         self._forms[user_id] = [msg.message_id for msg in value]
+        self.touch()
 
     @property
     def needs_update(self) -> bool:
@@ -80,7 +81,9 @@ class ChatData(Data):
 
     @needs_update.setter
     def needs_update(self, value: bool) -> None:
-        self._needs_update = value
+        if self._needs_update != value:
+            self._needs_update = value
+            self.touch()
 
     def delete_form(self, user_id: int) -> None:
         """Delete all user media and other form data from current chat."""
@@ -90,6 +93,7 @@ class ChatData(Data):
         for message_id in self._forms[user_id]:
             self._bot.deleteMessage(self._id, message_id)
         del self._forms[user_id]
+        self.touch()
 
     def _show_button(self, user_id: int, callback_data: str):
         keyboard = InlineKeyboardMarkup.from_button(
@@ -110,7 +114,7 @@ class ChatData(Data):
         media_cls = None
         file_ids = []
         for answer in data.answers:
-            if data.questions[answer].question_type == media_type:
+            if data.questions.record(answer.tag).question_type == media_type:
                 if media_type == QuestionType.AUDIO and answer.value[0]:
                     file_ids.extend(answer.value[1])
                     media_cls = InputMediaAudio
@@ -169,12 +173,14 @@ class ChatData(Data):
         message = self._bot.sendMessage(self._id, text=f'Ошибка: {text}')
 
         self._error = message.message_id
+        self.touch()
 
     def clear_error(self) -> None:
         """Clear error message."""
         if self._error:
             self._bot.deleteMessage(self.id, self._error)
             self._error = None
+            self.touch()
 
     def clear_messages(self) -> None:
         """Clear bot messages."""
@@ -185,6 +191,7 @@ class ChatData(Data):
             except TelegramError:
                 pass
         self._needs_update = False
+        self.touch()
 
     def print_messages(self, *args: Dict) -> None:
         """Print messages. Pass each message argument as keyword dictionary."""
@@ -200,6 +207,7 @@ class ChatData(Data):
             if not kwargs:
                 if msg:
                     self._msgs[idx] = None
+                    self.touch()
                     self._bot.delete_message(self.id, msg)
                 continue
 
@@ -211,8 +219,10 @@ class ChatData(Data):
                         **kwargs
                     )
                     self._msgs[idx] = message.message_id
+                    self.touch()
                 except TelegramError as exc:
                     logger.debug(exc)
             else:
                 message = self._bot.send_message(self.id, **kwargs)
                 self._msgs[idx] = message.message_id
+                self.touch()
@@ -3,10 +3,19 @@
 
 from __future__ import annotations
 
+import hashlib
 import logging
+import sys
+import threading
 
 from typing import (
+    Dict,
+    FrozenSet,
+    Iterable,
     List,
+    Mapping,
+    NamedTuple,
+    Optional,
     Union,
     Any,
     Tuple
@@ -36,7 +45,8 @@ from polydating_bot import (
     MissingDataError
 )
 from polydating_bot.data import (
-    ABCYamlMeta
+    ABCYamlMeta,
+    Versioned
 )
 
 logger = logging.getLogger(__name__)
@@ -56,11 +66,128 @@ class QuestionType(Enum):
     AUDIO = auto()
     PHOTO = auto()
 
+class StatusIndex:
+    """Index of form IDs by status.
+
+    Counts and IDs of forms with a status are got without scanning all users.
+    IDs of a status are kept in order their forms got it. Statuses derived
+    from answers (BLOCKING and IDLE) are updated when a form status is read.
+    """
+    def __init__(self):
+        self._ids: Dict[FormStatus, Dict[int, None]] = {x: {} for x in FormStatus}
+        self._statuses: Dict[int, FormStatus] = {}
+        self._lock = threading.Lock()
+
+    def update(self, var_id: int, status: FormStatus) -> None:
+        """Set status of the form ID."""
+        with self._lock:
+            old_status = self._statuses.get(var_id)
+            if old_status == status:
+                return
+            if old_status:
+                del self._ids[old_status][var_id]
+            self._ids[status][var_id] = None
+            self._statuses[var_id] = status
+
+    def remove(self, var_id: int) -> None:
+        """Drop the form ID from index."""
+        with self._lock:
+            status = self._statuses.pop(var_id, None)
+            if status:
+                del self._ids[status][var_id]
+
+    def status(self, var_id: int) -> Optional[FormStatus]:
+        """Indexed status of the form ID."""
+        return self._statuses.get(var_id)
+
+    def count(self, status: FormStatus) -> int:
+        """Number of forms with the status."""
+        return len(self._ids[status])
+
+    def counts(self) -> Dict[FormStatus, int]:
+        """Number of forms of every status."""
+        with self._lock:
+            return {x: len(y) for x, y in self._ids.items()}
+
+    def ids(self, status: FormStatus) -> List[int]:
+        """IDs of forms with the status."""
+        with self._lock:
+            return list(self._ids[status])
+
+    def clear(self) -> None:
+        """Drop all form IDs."""
+        with self._lock:
+            for ids in self._ids.values():
+                ids.clear()
+            self._statuses.clear()
+
+class Coverage:
+    """Answers coverage of forms by their IDs, for bulk queries.
+
+    Queries are mask operations over coverage of all forms at once instead
+    of scanning their answers. Masks are made for the questions list loaded
+    at creation.
+    """
+    def __init__(self, forms: Mapping[int, Form]):
+        self._ids: List[int] = list(forms)
+        self._masks: List[int] = [x.coverage for x in forms.values()]
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _select(self, mask: int, value: int, equal: bool = True) -> List[int]:
+        """IDs of forms which coverage masked by 'mask' is (not) 'value'."""
+        return [
+            var_id for var_id, x in zip(self._ids, self._masks) if (x & mask == value) == equal
+        ]
+
+    def answered(self, tags: Iterable[str]) -> List[int]:
+        """IDs of forms with answers to all the questions. Raises
+        MissingDataError if there is no such question."""
+        mask = Form.question_mask(tags)
+        return self._select(mask, mask)
+
+    def missing(self, tags: Iterable[str]) -> List[int]:
+        """IDs of forms without answer to any of the questions. Raises
+        MissingDataError if there is no such question."""
+        mask = Form.question_mask(tags)
+        return self._select(mask, mask, False)
+
+    def complete(self) -> List[int]:
+        """IDs of forms with answers to all required questions."""
+        mask = Form.required_mask()
+        return self._select(mask, mask)
+
+    def incomplete(self) -> List[int]:
+        """IDs of forms without answer to any of required questions."""
+        mask = Form.required_mask()
+        return self._select(mask, mask, False)
+
+    def missing_counts(self) -> Dict[str, int]:
+        """Number of forms without answer to every required question."""
+        counts = {}
+        for tag in Form.required_tags():
+            bit = Form.question_mask((tag,))
+            counts[tag] = sum(1 for x in self._masks if not x & bit)
+        return counts
+
 class _Item(YAMLObject):
+    # Items are the bulk of users data: no per-instance dictionary
+    __slots__ = ('_tag', '_value')
+
     def __init__(self, tag: str, value: Any):
-        self._tag: str = tag
+        # Answers of all users share tag strings with questions
+        self._tag: str = sys.intern(tag)
         self._value: Any = value
 
+    def __setstate__(self, state: Union[Dict, Tuple[Dict, Dict]]) -> None:
+        # Items pickled before slots keep state in a dictionary
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        for key, val in state.items():
+            setattr(self, key, val)
+        self._tag = sys.intern(self._tag)
+
     def __eq__(self, other: _Item):
         if not isinstance(other, _Item):
             logger.warning('Other is of incorrect type.')
@@ -83,42 +210,71 @@ class _Item(YAMLObject):
         """Value of item."""
         return self._value
 
-class _ItemList(YAMLObject, MutableSequence, metaclass=ABCYamlMeta): # pylint: disable=R0901
+class _ItemList(YAMLObject, MutableSequence, Versioned, metaclass=ABCYamlMeta): # pylint: disable=R0901
+    # Positions of items by tag, built on first lookup by tag
+    _index: Optional[Dict[str, int]] = None
+
     def __init__(self, item_list: Union[List[_Item], _ItemList] = None):
         self._items: List[_Item] = list()
+        self._index = None
         if item_list:
-            self.extend(item_list)
+            for item in item_list:
+                assert isinstance(item, _Item)
+            self._items.extend(item_list)
         super().__init__()
 
+    def __getstate__(self) -> Dict:
+        # Index is not stored, it is rebuilt on demand
+        state = dict(vars(self))
+        state.pop('_index', None)
+        return state
+
     def __len__(self):
         return self._items.__len__()
 
     def __iter__(self):
         return self._items.__iter__()
 
+    def __eq__(self, other):
+        if not isinstance(other, _ItemList):
+            return False
+        return self._items == other._items
+
+    def _positions(self) -> Dict[str, int]:
+        if self._index is None:
+            index = {}
+            for idx, item in enumerate(self._items):
+                # The first item of a tag is found, as by a scan
+                index.setdefault(item.tag, idx)
+            self._index = index
+        return self._index
+
+    @staticmethod
+    def _tag(key: Union[_Item, str]) -> str:
+        if isinstance(key, _Item):
+            return key.tag
+        return str(key)
+
+    def _added(self, start: int) -> None:
+        """Index items appended from 'start' position."""
+        if self._index is None:
+            return
+        for idx in range(start, len(self._items)):
+            self._index.setdefault(self._items[idx].tag, idx)
+
     def __contains__(self, key: object):
-        try:
-            if isinstance(key, int):
-                return False
-            self.__getitem__(key)
-            return True
-        except MissingDataError:
+        if isinstance(key, int):
             return False
+        return self._tag(key) in self._positions()
 
     def __getitem__(self, key):
         if isinstance(key, int):
             return self._items[key]
 
-        if isinstance(key, _Item):
-            tag = key.tag
-        else:
-            tag = str(key)
-
-        for item in self._items:
-            if item.tag != tag:
-                continue
-            return item
-        raise MissingDataError
+        try:
+            return self._items[self._positions()[self._tag(key)]]
+        except KeyError as exc:
+            raise MissingDataError from exc
 
     def __delitem__(self, item):
         pass
@@ -130,17 +286,25 @@ class _ItemList(YAMLObject, MutableSequence, metaclass=ABCYamlMeta): # pylint: d
         """Extends existing list."""
         for item in values:
             assert isinstance(item, _Item)
+        start = len(self._items)
         self._items.extend(values)
+        self._added(start)
+        self.touch()
 
     def append(self, value: _Item):
         """Append item to existing list."""
         assert isinstance(value, _Item)
         self._items.append(value)
+        self._added(len(self._items) - 1)
+        self.touch()
 
     def insert(self, index, value: _Item):
         """Default insert."""
         assert isinstance(value, _Item)
         self._items.insert(index, value)
+        # Positions of following items are shifted
+        self._index = None
+        self.touch()
 
     @classmethod
     def to_yaml(cls, dumper, data: _ItemList):
@@ -152,6 +316,8 @@ class _ItemList(YAMLObject, MutableSequence, metaclass=ABCYamlMeta): # pylint: d
         return cls(seq)
 
 class _Question(_Item):
+    __slots__ = ('_note', '_required', '_question_type')
+
     yaml_tag = u'!Question'
 
     def __init__(
@@ -172,7 +338,7 @@ class _Question(_Item):
             QuestionType[question_type]
         except KeyError as exc:
             raise TypeError('Incorrect question type.') from exc
-        self._question_type = question_type
+        self._question_type = sys.intern(question_type)
 
     @classmethod
     def to_yaml(cls, dumper, data: _Question):
@@ -258,6 +424,16 @@ _FINAL_QUESTIONS = _ItemList([
     ),
 ])
 
+class _QuestionRecord(NamedTuple):
+    """Question compiled on questions list load: MarkdownV2 texts are
+    escaped once."""
+    tag: str
+    question_type: QuestionType
+    required: bool
+    text: str
+    note: str
+    message: str
+
 class _QuestionList(_ItemList): # pylint: disable=R0901
     """Questions list. Represents attributes and methods for questions."""
     yaml_tag = u'!Questions'
@@ -269,7 +445,71 @@ class _QuestionList(_ItemList): # pylint: disable=R0901
             self._items.extend(questions)
         self._items.extend(_FINAL_QUESTIONS)
 
+        # Answers coverage of a form is a mask of question bits by position
+        self._bits: Dict[str, int] = {x: 1 << y for x, y in self._positions().items()}
+        self._required: FrozenSet[str] = frozenset(x.tag for x in self._items if x.required)
+        self._required_mask: int = self.mask(self._required)
+        tags = '\n'.join(x.tag for x in self._items)
+        self._fingerprint: str = hashlib.sha1(tags.encode()).hexdigest()[:16]
+        self._records: Tuple[_QuestionRecord, ...] = tuple(
+            self._compile(x) for x in self._items
+        )
+        # Every questions list has a version of its own
+        self.touch()
+
+    @staticmethod
+    def _compile(question: _Question) -> _QuestionRecord:
+        text = utils.helpers.escape_markdown(question.value, 2)
+        note = utils.helpers.escape_markdown(question.note, 2)
+        req = utils.helpers.escape_markdown(r'\(*\)') if question.required else ''
+        message = ''.join((
+            f'{req} ',
+            f'*{text}*\n',
+            f'_{note}_' if note else '',
+        ))
+        return _QuestionRecord(
+            question.tag, question.question_type, question.required, text, note, message
+        )
+
+    def record(self, key: Union[int, str]) -> _QuestionRecord:
+        """Compiled question by position or tag."""
+        if isinstance(key, int):
+            return self._records[key]
+        try:
+            return self._records[self._positions()[key]]
+        except KeyError as exc:
+            raise MissingDataError from exc
+
+    @property
+    def required(self) -> FrozenSet[str]:
+        """Tags of required questions."""
+        return self._required
+
+    @property
+    def required_mask(self) -> int:
+        """Bitmask of required questions."""
+        return self._required_mask
+
+    @property
+    def fingerprint(self) -> str:
+        """Digest of question tags and positions: masks made for a list are
+        valid for lists of the same fingerprint."""
+        return self._fingerprint
+
+    def bit(self, tag: str) -> int:
+        """Bit of the question, zero if there is no such question."""
+        return self._bits.get(tag, 0)
+
+    def mask(self, tags: Iterable[str]) -> int:
+        """Bitmask of the questions."""
+        mask = 0
+        for tag in tags:
+            mask |= self._bits.get(tag, 0)
+        return mask
+
 class _Answer(_Item): # pylint: disable=R0903
+    __slots__ = ()
+
     yaml_tag = u'!Answer'
 
     def __init__(self, tag: str, answer: str):
@@ -299,17 +539,38 @@ class _AnswerList(_ItemList): # pylint: disable=R0901
             logger.debug('Creating new answer item.')
             answer = _Answer(key, item)
             self._items.append(answer)
+            self._added(len(self._items) - 1)
+        self.touch()
 
     def __delitem__(self, item):
-        item = self.__getitem__(item)
-        self._items.remove(item)
+        try:
+            del self._items[self._positions()[self._tag(item)]]
+        except KeyError as exc:
+            raise MissingDataError from exc
+        # Positions of following items are shifted
+        self._index = None
+        self.touch()
 
 _AnswerType = Tuple[str, Union[Message, List[Message]]]
 
-class Form(YAMLObject, metaclass=ABCYamlMeta):
+class Form(YAMLObject, Versioned, metaclass=ABCYamlMeta):
     """Dating form class."""
     _questions: _QuestionList = _QuestionList()
 
+    # IDs of users' forms by status
+    _status_index: StatusIndex = StatusIndex()
+
+    # Answers coverage is stored with answers along with fingerprint of the
+    # questions list it is made for. It is valid for the answers version it
+    # is made for, i.e. loaded coverage is valid for loaded answers.
+    _coverage: int = 0
+    _coverage_catalog: str = str()
+    _coverage_version: int = 0
+
+    # Messages rendered by 'print_body()' and key of content they are made
+    # for, not stored
+    _body: Optional[Tuple[Tuple, List[str]]] = None
+
     yaml_tag = u'!Form'
 
     def __init__(self, *args, **kwargs): # pylint: disable=W0613
@@ -318,6 +579,11 @@ class Form(YAMLObject, metaclass=ABCYamlMeta):
         self._status: str = FormStatus.BLOCKING.name
         self._note: str = str()
 
+    @property
+    def version(self) -> int:
+        """Mutation version of the form including its answers."""
+        return max(self._version, self._answers.version)
+
     @property
     def questions(self) -> _QuestionList:
         """Questions list."""
@@ -363,10 +629,40 @@ class Form(YAMLObject, metaclass=ABCYamlMeta):
     def answers(self, value: _AnswerType) -> None:
         data = self._format_answer(value)
 
+        coverage = self.coverage
         if not value[0] in self._answers:
             self._answers.append(_Answer(value[0], data))
         else:
             self._answers[value[0]] = data
+        self._coverage = coverage | self._questions.bit(value[0])
+        self._coverage_version = self._answers.version
+        self.touch()
+
+    def delete_answer(self, question: Union[_Question, str]) -> None:
+        """Delete answer to the question. Raises MissingDataError if there is
+        no answer."""
+        coverage = self.coverage
+        del self._answers[question]
+        tag = question.tag if isinstance(question, _Question) else question
+        self._coverage = coverage & ~self._questions.bit(tag)
+        self._coverage_version = self._answers.version
+
+    @property
+    def coverage(self) -> int:
+        """Bitmask of answered questions by their positions in questions
+        list."""
+        questions = self._questions
+        if (self._coverage_catalog != questions.fingerprint or
+                self._coverage_version != self._answers.version):
+            self._coverage = questions.mask(x.tag for x in self._answers)
+            self._coverage_catalog = questions.fingerprint
+            self._coverage_version = self._answers.version
+        return self._coverage
+
+    @property
+    def required_left(self) -> int:
+        """Number of required questions without answers."""
+        return bin(self._questions.required_mask & ~self.coverage).count('1')
 
     @classmethod
     def load_questions(cls, questions: List[_Question]) -> None:
@@ -375,26 +671,83 @@ class Form(YAMLObject, metaclass=ABCYamlMeta):
         for question in questions:
             if not isinstance(question, _Question):
                 raise TypeError
-            logger.debug(vars(question))
+            logger.debug(f'{question}: {question.question_type.name}')
         cls._questions = _QuestionList(questions)
 
-    @property
-    def status(self) -> FormStatus:
-        """Form status Enum."""
-        for question in [q for q in self._questions if q.required]:
-            if question not in self._answers:
-                self._status = FormStatus.BLOCKING.name
-                return FormStatus.BLOCKING
+    @classmethod
+    def question_mask(cls, tags: Iterable[str]) -> int:
+        """Bitmask of the questions in answers coverage. Raises
+        MissingDataError if there is no such question."""
+        mask = 0
+        for tag in tags:
+            bit = cls._questions.bit(tag)
+            if not bit:
+                raise MissingDataError(f'Unknown question: {tag}')
+            mask |= bit
+        return mask
+
+    @classmethod
+    def required_mask(cls) -> int:
+        """Bitmask of required questions in answers coverage."""
+        return cls._questions.required_mask
+
+    @classmethod
+    def required_tags(cls) -> List[str]:
+        """Tags of required questions in questions list order."""
+        return [x.tag for x in cls._questions if x.required]
+
+    @classmethod
+    def update_statuses(cls, forms: Iterable[Form]) -> int:
+        """Update statuses derived from answers of the forms, e.g. after
+        questions list is changed. Returns number of changed forms."""
+        forms = dict(enumerate(forms))
+        incomplete = set(Coverage(forms).incomplete())
+
+        count = 0
+        for position, form in forms.items():
+            # Only forms which completeness disagrees with status change it
+            blocking = form._status == FormStatus.BLOCKING.name # pylint: disable=W0212
+            if (position in incomplete) != blocking:
+                form.status # pylint: disable=W0104
+                count += 1
+        logger.info(f'Form statuses updated: {count}')
+        return count
+
+    @staticmethod
+    def status_index() -> StatusIndex:
+        """Index of form IDs by status."""
+        return Form._status_index
+
+    def _set_status(self, status: FormStatus) -> None:
+        self._status = status.name
+        # Form is a part of user data which has ID
+        var_id = getattr(self, '_id', None)
+        if var_id:
+            self._status_index.update(var_id, status)
+        self.touch()
 
+    @property
+    def derived_status(self) -> FormStatus:
+        """Form status as per answers without updating it or status index,
+        e.g. to write a snapshot of the form."""
+        if self.required_left:
+            return FormStatus.BLOCKING
         if self._status == FormStatus.BLOCKING.name:
-            self._status = FormStatus.IDLE.name
             return FormStatus.IDLE
         return FormStatus[self._status]
 
+    @property
+    def status(self) -> FormStatus:
+        """Form status Enum."""
+        status = self.derived_status
+        if status.name != self._status:
+            self._set_status(status)
+        return status
+
     @status.setter
     def status(self, value: FormStatus) -> None:
         logger.debug(f'Setting new status to {str(self)}: {value.name}')
-        self._status = value.name
+        self._set_status(value)
 
     @property
     def note(self) -> str:
@@ -404,6 +757,7 @@ class Form(YAMLObject, metaclass=ABCYamlMeta):
     @note.setter
     def note(self, value) -> None:
         self._note = value
+        self.touch()
 
     def _print_header(self) -> str:
         text = (
@@ -415,8 +769,19 @@ class Form(YAMLObject, metaclass=ABCYamlMeta):
             text += f"\n\n{self.answers['self'].value}"
         return utils.helpers.escape_markdown(text, 2)
 
+    def _body_key(self) -> Tuple:
+        """Key of content rendered by 'print_body()'."""
+        return (self._answers.version, self._questions.version)
+
     def print_body(self) -> List[str]:
-        """Prints form body to be sent."""
+        """Prints form body to be sent. Body is rendered once for the same
+        answers and questions list."""
+        key = self._body_key()
+        if self._body is None or self._body[0] != key:
+            self._body = (key, self._render_body())
+        return list(self._body[1])
+
+    def _render_body(self) -> List[str]:
         items = [self._print_header()]
         delim = '\n\n'
 
@@ -424,7 +789,7 @@ class Form(YAMLObject, metaclass=ABCYamlMeta):
             # These questions are part of a header
             if answer in _BASE_QUESTIONS or answer in _FINAL_QUESTIONS:
                 continue
-            question = utils.helpers.escape_markdown(self._questions[answer].value, 2)
+            question = self._questions.record(answer.tag).text
             answer = utils.helpers.escape_markdown(answer.value, 2)
             item = delim.join((f'*{question}*', answer))
             items.append(item)
@@ -451,11 +816,6 @@ class Form(YAMLObject, metaclass=ABCYamlMeta):
 
     def print_status(self) -> str:
         """Returns this form status string."""
-        qcount = 0
-        for question in self._questions:
-            if question.required and question not in self._answers:
-                qcount += 1
-
         # Update status
         status = self.status
 
@@ -465,7 +825,7 @@ class Form(YAMLObject, metaclass=ABCYamlMeta):
                 f'Отвечено вопросов: {len(self._answers)} из {len(self._questions)}'
             )
             if status == FormStatus.BLOCKING:
-                text += f' (ещё {qcount} обязательных)'
+                text += f' (ещё {self.required_left} обязательных)'
             text += '\n'
         text += f'Статус анкеты: {status.value}'
 
@@ -481,8 +841,11 @@ class Form(YAMLObject, metaclass=ABCYamlMeta):
     def to_yaml(cls, dumper, data: Form):
         mapping = {
             'answers': data.answers,
-            'status': data.status.name,
+            # Written forms may be snapshots: they must not change the index
+            'status': data.derived_status.name,
             'note': data.note,
+            'coverage': data.coverage,
+            'coverage_catalog': data._coverage_catalog, # pylint: disable=W0212
         }
         return dumper.represent_mapping(cls.yaml_tag, mapping)
 
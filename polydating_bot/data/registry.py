@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""YAML tags registry module."""
+
+import logging
+
+from typing import (
+    Tuple
+)
+
+from polydating_bot.data.dating import (
+    Form,
+    _Answer,
+    _AnswerList,
+    _Question,
+    _QuestionList
+)
+from polydating_bot.data.botdata import (
+    BotData,
+    _IdList
+)
+from polydating_bot.data.userdata import (
+    UserData
+)
+from polydating_bot.data.chatdata import (
+    ChatData
+)
+
+logger = logging.getLogger(__name__)
+
+# YAMLObject registers tags only for pure Python loader and dumper classes
+_YAML_TYPES = (
+    UserData,
+    ChatData,
+    BotData,
+    Form,
+    _Answer,
+    _AnswerList,
+    _Question,
+    _QuestionList,
+    _IdList,
+)
+
+def yaml_types() -> Tuple[type, ...]:
+    """Get all data classes with YAML tags."""
+    return _YAML_TYPES
+
+def register_yaml_types(loader: type, dumper: type) -> None:
+    """Register constructors and representers of data tags for loader and
+    dumper classes, e.g. for libyaml based CLoader and CDumper."""
+    for cls in _YAML_TYPES:
+        loader.add_constructor(cls.yaml_tag, cls.from_yaml)
+        dumper.add_representer(cls, cls.to_yaml)
+    logger.debug(f'YAML tags registered: {loader.__name__}, {dumper.__name__}')
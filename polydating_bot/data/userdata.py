@@ -8,7 +8,8 @@ import logging
 from typing import (
     Optional,
     Callable,
-    Dict
+    Dict,
+    Tuple
 )
 
 from telegram import (
@@ -18,7 +19,8 @@ from telegram import (
 from polydating_bot.data import (
     Data,
     DataType,
-    Form
+    Form,
+    FormStatus
 )
 
 logger = logging.getLogger(__name__)
@@ -27,6 +29,8 @@ class UserData(Data, Form): # pylint: disable=R0902
     """User data class."""
     yaml_tag = u'!UserData'
 
+    _conv_version: int = 0
+
     def __init__(self, chat: Chat):
         super().__init__(chat)
 
@@ -42,9 +46,27 @@ class UserData(Data, Form): # pylint: disable=R0902
     def data_mapping(cls) -> Dict:
         return {
             'conv': ['_back', '_current_question'],
-            'form': ['_answers', '_status', '_note'],
+            'form': ['_answers', '_status', '_note', '_coverage', '_coverage_catalog'],
+        }
+
+    @classmethod
+    def detached_mapping(cls) -> Dict:
+        # Navigation changes on every button press, form content does not
+        return {
+            'conv': ['_back', '_current_question'],
         }
 
+    def index(self) -> None:
+        super().index()
+        self.status_index().update(self._id, FormStatus[self._status])
+
+    @property
+    def version(self) -> int:
+        return max(super().version, self._conv_version)
+
+    def versions(self) -> Tuple[int, int]:
+        return (super().version, self._conv_version)
+
     @property
     def current_question(self) -> int:
         """Current question index."""
@@ -53,6 +75,7 @@ class UserData(Data, Form): # pylint: disable=R0902
     @current_question.setter
     def current_question(self, value) -> None:
         self._current_question = value % len(self.questions)
+        self._conv_version = self.next_version()
 
     @property
     def back(self):
@@ -61,7 +84,13 @@ class UserData(Data, Form): # pylint: disable=R0902
 
     @back.setter
     def back(self, value) -> None:
-        self._back = value
+        if self._back != value:
+            self._back = value
+            self._conv_version = self.next_version()
+
+    def _body_key(self) -> Tuple:
+        # Nick of the form is a mention of the user
+        return (*super()._body_key(), self._name_id)
 
     def nick(self) -> str:
         return self.mention()
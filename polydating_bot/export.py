@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""Stream records from one persistence backend to another.
+
+    python -m polydating_bot.export SOURCE TARGET [--full]
+
+SOURCE and TARGET are a YAML persistence directory or a SQLite database
+('*.db', '*.sqlite', '*.sqlite3'); TARGET may also be a JSON lines file
+('*.jsonl') for analytics. Records are streamed one batch at a time, so memory
+does not grow with the number of users.
+
+Progress is saved next to TARGET ('TARGET.export') after every batch: an
+interrupted export resumes where it stopped. Once a pass is complete, the
+next run is a delta pass: only records changed since the previous pass
+started are exported (YAML source only, SQLite rows are all exported again).
+So a live store is migrated by a first pass while the bot is running and a
+short final pass after the bot is stopped. Bot data and conversations are
+exported as a whole on every pass.
+
+At the end of every pass records which are missing in SOURCE are removed from
+TARGET; IDs of records of a data type are kept in memory to find them. JSON
+lines files are append-only: records removed from SOURCE stay there.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import time
+
+from collections.abc import (
+    MutableSequence
+)
+from typing import (
+    Any,
+    Dict,
+    IO,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union
+)
+
+from yaml import (
+    YAMLObject
+)
+
+from polydating_bot import (
+    PersistenceError
+)
+from polydating_bot.data import (
+    Data,
+    DataType
+)
+from polydating_bot.store import (
+    AtomicWriter,
+    Compression,
+    Durability,
+    SqlitePersistence,
+    YamlPersistence,
+    use_libyaml
+)
+from polydating_bot.store.layout import (
+    RECORD_TYPES
+)
+
+logger = logging.getLogger(__name__)
+
+_SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+_JSONL_SUFFIX = '.jsonl'
+_STATE_SUFFIX = '.export'
+# Records modified right before the previous pass started are exported again:
+# file systems keep modification time with limited precision
+_MTIME_SLACK = 2.0
+_COMMIT_INTERVAL = 60000
+
+def _plain(obj: Any) -> Any:
+    """Convert data objects to JSON serializable ones."""
+    if isinstance(obj, Data):
+        return type(obj).to_mapping(obj)
+    if isinstance(obj, MutableSequence):
+        return list(obj)
+    if isinstance(obj, YAMLObject):
+        # Answers and questions are tagged values
+        return {obj.tag: obj.value}
+    if callable(obj):
+        return f'{obj.__module__}.{obj.__qualname__}'
+    raise TypeError(f'Object is not serializable: {type(obj)}')
+
+class JsonlStore:
+    """Export target writing a JSON object per line: records as
+    '{"type", "id", "name_id", "data"}' and conversation states as
+    '{"type": "conversation", "name", "key", "state"}'. The file is truncated
+    to 'offset', i.e. to the end of the last committed batch. Records of
+    delta passes are appended: the last line of an ID wins."""
+    def __init__(self, path: str, offset: int = 0):
+        self._path = path
+        try:
+            self._file: IO = open(path, 'a+')
+            self._file.truncate(offset)
+            self._file.seek(offset)
+        except OSError as exc:
+            raise PersistenceError(f'Can\'t open file: {path}') from exc
+
+    @property
+    def offset(self) -> int:
+        """Size of written records."""
+        return self._file.tell()
+
+    def _write(self, obj: Dict) -> None:
+        try:
+            self._file.write(json.dumps(obj, ensure_ascii=False, default=_plain) + '\n')
+        except OSError as exc:
+            raise PersistenceError(f'Can\'t write file: {self._path}') from exc
+
+    def import_records(self, records: Iterable[Data]) -> int:
+        """Append records. Returns number of written records."""
+        count = 0
+        for data in records:
+            self._write({
+                'type': data.data_type().value,
+                'id': data.id,
+                'name_id': data.name_id,
+                'data': data,
+            })
+            count += 1
+        return count
+
+    def import_conversations(self, conversations: Iterable[Tuple[str, Tuple, Any]]) -> None:
+        """Append conversation states."""
+        for name, key, state in conversations:
+            self._write({'type': 'conversation', 'name': name, 'key': key, 'state': state})
+
+    def flush(self) -> None:
+        """Make written records durable."""
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as exc:
+            raise PersistenceError(f'Can\'t sync file: {self._path}') from exc
+
+_Store = Union[YamlPersistence, SqlitePersistence, JsonlStore]
+
+def _open(
+    path: str,
+    target: bool = False,
+    offset: int = 0,
+    binary: bool = False,
+    compression: Compression = Compression.NONE,
+) -> _Store:
+    if path.endswith(_JSONL_SUFFIX):
+        return JsonlStore(path, offset)
+    if path.endswith(_SQLITE_SUFFIXES):
+        return SqlitePersistence(filename=path)
+    if not target:
+        return YamlPersistence(directory=path)
+    # Written files are made durable by 'flush()' after every batch
+    return YamlPersistence(
+        directory=path,
+        durability=Durability.GROUP_COMMIT,
+        commit_interval=_COMMIT_INTERVAL,
+        binary=binary,
+        compression=compression,
+        cleanup=True,
+    )
+
+def _load_state(path: str) -> Dict:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as exc:
+        raise PersistenceError(f'Can\'t load export state: {path}') from exc
+
+def _chunks(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _remove_missing(
+    source: _Store, target: Union[YamlPersistence, SqlitePersistence], data_type: DataType
+) -> int:
+    """Remove records of data type which are missing in source from target.
+    Delta passes load changed records only, so removals are found by IDs."""
+    ids = set(source.iter_record_ids(data_type))
+    missing = [x for x in target.iter_record_ids(data_type) if x not in ids]
+    return target.remove_records(data_type, missing) if missing else 0
+
+def export(
+    source_path: str,
+    target_path: str,
+    full: bool = False,
+    batch_size: int = 1000,
+    binary: bool = False,
+    compression: Compression = Compression.NONE,
+) -> int:
+    """Export records and conversations of source store to target one.
+    Resumes an interrupted pass or makes a delta pass after a complete one
+    unless 'full' is set. 'binary' and 'compression' select format of YAML
+    persistence target. Returns number of exported records."""
+    if source_path.endswith(_JSONL_SUFFIX):
+        raise PersistenceError('JSON lines file can\'t be a source.')
+
+    state_path = target_path.rstrip(os.sep) + _STATE_SUFFIX
+    state = {} if full else _load_state(state_path)
+    if state.get('source') != os.path.abspath(source_path):
+        state = {'source': os.path.abspath(source_path)}
+    if not state.get('pass_start'):
+        state.update(pass_start=time.time(), positions={})
+    since: Optional[float] = state.get('since')
+    if since is not None:
+        since -= _MTIME_SLACK
+
+    source = _open(source_path)
+    target = _open(target_path, True, state.get('offset', 0), binary, compression)
+    writer = AtomicWriter(Durability.PER_WRITE)
+
+    def save_state() -> None:
+        if isinstance(target, JsonlStore):
+            state['offset'] = target.offset
+        writer.write(state_path, lambda f: json.dump(state, f))
+
+    logger.info(
+        f'Export started: {source_path} -> {target_path}: '
+        f'{"delta" if since is not None else "full"} pass'
+    )
+
+    count = 0
+    for data_type in RECORD_TYPES:
+        position = state['positions'].get(data_type.value)
+        records = source.iter_records(data_type, position, since)
+        for chunk in _chunks(records, batch_size):
+            count += target.import_records(data for _, data in chunk)
+            target.flush()
+            state['positions'][data_type.value] = chunk[-1][0]
+            save_state()
+            logger.info(f'Records exported: {data_type.value}: {count}')
+
+        if not isinstance(target, JsonlStore):
+            removed = _remove_missing(source, target, data_type)
+            if removed:
+                logger.info(f'Records removed: {data_type.value}: {removed}')
+
+    # Bot data and conversations are small: they are exported as a whole
+    count += target.import_records(data for _, data in source.iter_records(DataType.BOT))
+    target.import_conversations(source.iter_conversations())
+    target.flush()
+
+    state.update(since=state['pass_start'], pass_start=None, positions={})
+    save_state()
+    logger.info(f'Export finished: {source_path} -> {target_path}: {count} records')
+    return count
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='persistence directory or SQLite database')
+    parser.add_argument('target', help='persistence directory, SQLite database or JSONL file')
+    parser.add_argument('--full', action='store_true',
+                        help='export all records, ignoring state of previous runs')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='records to write between progress saves [1000]')
+    parser.add_argument('--binary', action='store_true',
+                        help='store records of target directory in binary format')
+    parser.add_argument('--compression', choices=[x.value for x in Compression],
+                        default=Compression.NONE.value,
+                        help='binary records compression [none]')
+    parser.add_argument('--libyaml', action='store_true',
+                        help='use libyaml C implementation if available')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s - %(message)s', level=logging.INFO)
+    use_libyaml(args.libyaml)
+    export(
+        args.source,
+        args.target,
+        args.full,
+        args.batch_size,
+        args.binary,
+        Compression(args.compression)
+    )
+
+if __name__ == '__main__':
+    _main()
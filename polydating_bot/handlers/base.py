@@ -35,6 +35,8 @@ from polydating_bot import (
 from polydating_bot.data import (
     BotData,
     ChatData,
+    Data,
+    FormStatus,
     UserData
 )
 
@@ -113,24 +115,28 @@ def _show(update: Update, context: CallbackContext):
         return
     user_data = UserData.by_id(var_id)
     chat_data = ChatData.from_context(context)
-    bot_data = BotData.from_context(context)
 
-    if var_id in bot_data.pending_forms:
+    if UserData.status_index().status(var_id) == FormStatus.PENDING:
         chat_data.send_form(user_data, callback_data=f'{str(REMOVE)}{var_id}')
         logger.info(f'Showing data: {str(user_data)}')
     update.callback_query.delete_message()
 
 def _update_chat(update: Update, context: CallbackContext):
+    Data.observe_chat(update.message.chat)
+    Data.observe_chat(update.message.from_user)
+
     try:
-        ChatData.from_context(context).needs_update = True
+        chat_data = ChatData.from_context(context)
+        chat_data.needs_update = True
+        chat_data.update_name(update.message.chat)
     except MissingDataError:
         ChatData(update.message.chat).update_context(context)
 
     try:
-        UserData.from_context(context)
+        # Keep usernames index up to date with renamed users
+        UserData.from_context(context).update_name(update.message.from_user)
     except MissingDataError:
-        bot = Dispatcher.get_instance().bot
-        chat = bot.getChat(update.message.from_user.id)
+        chat = UserData.get_chat(update.message.from_user.id)
         UserData(chat).update_context(context)
 
 def add_handlers(dispatcher: Dispatcher):
@@ -21,6 +21,8 @@ from polydating_bot import (
 )
 from polydating_bot.data import (
     BotData,
+    Coverage,
+    Data,
     UserData,
     ChatData,
     FormStatus
@@ -43,6 +45,7 @@ class _AdminList(HandlerAction):
         bot_data = BotData.from_context(self._context)
 
         text = [list(), list()]
+        Data.prefetch_chats(bot_data.admins)
         for admin in bot_data.admins:
             try:
                 if admin > 0:
@@ -64,6 +67,16 @@ class _AdminList(HandlerAction):
         text[1] = 'Список админских чатов: ' + ', '.join(text[1])
         bot_data._bot.send_message(self._update.effective_chat.id, '\n'.join(text))
 
+def _user_id(value: str) -> int:
+    """Get user ID by ID or @username."""
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return UserData.by_username(value).id
+        except MissingDataError as exc:
+            raise CommandError('Этот username мне не знаком. :(') from exc
+
 class _AdminAdd(HandlerAction):
     def __call__(self, parser, namespace, values, option_string = None):
         bot_data = BotData.from_context(self._context)
@@ -76,13 +89,7 @@ class _AdminAdd(HandlerAction):
         elif not values:
             raise CommandError('Укажите ID пльзователя или сделайте реплай на его сообщение.')
 
-        try:
-            var_id = int(values)
-        except TypeError:
-            try:
-                var_id = UserData.by_username(values)
-            except MissingDataError as exc:
-                raise CommandError('Этот username мне не знаком. :(') from exc
+        var_id = _user_id(values)
         try:
             bot_data.admins.append(var_id)
         except IncorrectIdError as exc:
@@ -93,11 +100,7 @@ class _AdminRm(HandlerAction):
         bot_data = BotData.from_context(self._context)
 
         for admin in values:
-            try:
-                admin = int(admin)
-                bot_data.admins.remove(admin)
-            except ValueError as exc:
-                raise CommandError('Несуществующий ID.') from exc
+            bot_data.admins.remove(_user_id(admin))
 
 @command_handler
 def _admins(update: Update, context: CallbackContext):
@@ -108,26 +111,47 @@ def _admins(update: Update, context: CallbackContext):
     list_parser = subparsers.add_parser('list', help='list admins')
     list_parser.add_argument('list', nargs=0, action=_AdminList, **def_args)
 
-    add_parser = subparsers.add_parser('add', help='add admin(s) with \'id\'')
+    add_parser = subparsers.add_parser('add', help='add admin with \'id\' or @username')
     add_parser.add_argument('id', nargs='?', action=_AdminAdd, **def_args)
 
-    rm_parser = subparsers.add_parser('rm', help='remove admin(s) with \'id\'')
+    rm_parser = subparsers.add_parser('rm', help='remove admin(s) with \'id\' or @username')
     rm_parser.add_argument('id', nargs='*', action=_AdminRm, **def_args)
 
     parser.parse_args(context.args)
 
 class _PendingList(HandlerAction):
     def __call__(self, parser, namespace, values, option_string = None):
-        bot_data = BotData.from_context(self._context)
         bot = Dispatcher.get_instance().bot
 
         text = []
-        for var_id in bot_data.pending_forms:
+        pending_ids = UserData.status_index().ids(FormStatus.PENDING)
+        UserData.prefetch_chats(pending_ids)
+        for var_id in pending_ids:
             user_data = UserData.by_id(var_id)
             text.append(f'{var_id} ({user_data.mention()})')
-        text = 'Список анкет: ' + ', '.join(text)
+        text = f'Список анкет ({len(pending_ids)}): ' + ', '.join(text)
         bot.sendMessage(self._update.effective_chat.id, text)
 
+class _PendingStats(HandlerAction):
+    def __call__(self, parser, namespace, values, option_string = None):
+        bot = Dispatcher.get_instance().bot
+
+        counts = UserData.status_index().counts()
+        text = ['Анкеты по статусам:']
+        text += [f'{status.value}: {count}' for status, count in counts.items()]
+
+        # Users loaded on demand are counted only if they are loaded
+        forms = {}
+        for var_id, data in Dispatcher.get_instance().user_data.items():
+            try:
+                forms[var_id] = UserData.from_dict(data)
+            except MissingDataError:
+                continue
+        coverage = Coverage(forms)
+        text += ['', f'Без ответа на обязательный вопрос ({len(coverage)} анкет):']
+        text += [f'{tag}: {count}' for tag, count in coverage.missing_counts().items()]
+        bot.sendMessage(self._update.effective_chat.id, '\n'.join(text))
+
 class _PendingShow(HandlerAction):
     def __call__(self, parser, namespace, values, option_string = None):
         user_data = UserData.by_id(int(values[0]))
@@ -139,7 +163,6 @@ class _PendingPost(HandlerAction):
     def __call__(self, parser, namespace, values, option_string = None):
         user_data = UserData.by_id(int(values[0]))
         bot_data = BotData.from_context(self._context)
-        bot = Dispatcher.get_instance().bot
 
         if not bot_data.dating_channel:
             raise CommandError('Не указан канал для публикации!')
@@ -148,7 +171,7 @@ class _PendingPost(HandlerAction):
         try:
             channel = ChatData.by_id(bot_data.dating_channel)
         except MissingDataError:
-            channel = ChatData(bot.getChat(bot_data.dating_channel))
+            channel = ChatData(ChatData.get_chat(bot_data.dating_channel))
         finally:
             channel.send_form(user_data)
 
@@ -188,6 +211,9 @@ def _pending(update: Update, context: CallbackContext):
     list_parser = subparsers.add_parser('list', help='list pending form')
     list_parser.add_argument('list', nargs=0, action=_PendingList, **def_args)
 
+    stats_parser = subparsers.add_parser('stats', help='count forms by status')
+    stats_parser.add_argument('stats', nargs=0, action=_PendingStats, **def_args)
+
     show_parser = subparsers.add_parser('show', help='show form with \'id\'')
     show_parser.add_argument('id', nargs=1, action=_PendingShow, **def_args)
 
@@ -218,7 +244,7 @@ class _ChannelShow(HandlerAction):
                 channel = None
         except MissingDataError:
             try:
-                channel = ChatData(bot.getChat(bot_data.dating_channel))
+                channel = ChatData(ChatData.get_chat(bot_data.dating_channel))
             except TelegramError:
                 logger.warning(f'Channel seems to be outdated: {bot_data.dating_channel}')
                 bot_data.dating_channel = None
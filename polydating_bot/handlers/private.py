@@ -4,6 +4,10 @@
 
 import logging
 
+from typing import (
+    Tuple
+)
+
 import decorator
 
 from telegram import (
@@ -136,23 +140,28 @@ def _start(update: Update, context: CallbackContext) -> None:
 
     return _select_level(update, context)
 
+# Menus do not change: they are built once
+_SELECT_LEVEL_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton(text='Управление анкетой', callback_data=str(MANAGE_FORM)),
+    ],
+    [
+        InlineKeyboardButton(text='Помощь', callback_data=str(SHOW_HELP)),
+    ],
+])
+
+_HELP_KEYBOARD = InlineKeyboardMarkup.from_button(
+    InlineKeyboardButton(text='Назад', callback_data=str(BACK))
+)
+
 @_state
 def _select_level(update: Update, context: CallbackContext) -> None:
     text = (
         'Для работы с ботом выберите один из вариантов:'
     )
-    buttons = [
-        [
-            InlineKeyboardButton(text='Управление анкетой', callback_data=str(MANAGE_FORM)),
-        ],
-        [
-            InlineKeyboardButton(text='Помощь', callback_data=str(SHOW_HELP)),
-        ],
-    ]
-    keyboard = InlineKeyboardMarkup(buttons)
 
     chat_data = ChatData.from_context(context)
-    chat_data.print_messages({'text': text, 'reply_markup': keyboard})
+    chat_data.print_messages({'text': text, 'reply_markup': _SELECT_LEVEL_KEYBOARD})
     return SELECT_LEVEL
 
 @_state(back=_select_level)
@@ -161,18 +170,12 @@ def _show_help(update: Update, context: CallbackContext):
         'Позже здесь появятся правила и ссылки на более другие документы:\n\n'
         'За любой помощью обращайтесь к разработчику бота: @srLuxint'
     )
-    button = InlineKeyboardButton(text='Назад', callback_data=str(BACK))
-    keyboard = InlineKeyboardMarkup.from_button(button)
 
     chat_data = ChatData.from_context(context)
-    chat_data.print_messages({'text': text, 'reply_markup': keyboard})
+    chat_data.print_messages({'text': text, 'reply_markup': _HELP_KEYBOARD})
     return SELECT_ACTION
 
-@_state(back=_select_level)
-def _manage_form(update: Update, context: CallbackContext):
-    user_data = UserData.from_context(context)
-    chat_data = ChatData.from_context(context)
-
+def _manage_form_menu(status: FormStatus) -> Tuple[str, InlineKeyboardMarkup]:
     answer_button = InlineKeyboardButton(text='Ответить на вопросы',
                                          callback_data=str(ASK_QUESTION))
     show_form_button = InlineKeyboardButton(text='Показать анкету',
@@ -181,7 +184,6 @@ def _manage_form(update: Update, context: CallbackContext):
     buttons = [[], [], []]
     text = str()
 
-    status = user_data.status
     if status == FormStatus.BLOCKING:
         buttons[0].append(
             answer_button
@@ -237,8 +239,16 @@ def _manage_form(update: Update, context: CallbackContext):
     buttons[2].append(
         InlineKeyboardButton(text='Назад', callback_data=str(BACK))
     )
-    keyboard = InlineKeyboardMarkup(buttons)
+    return text, InlineKeyboardMarkup(buttons)
+
+_MANAGE_FORM_MENUS = {x: _manage_form_menu(x) for x in FormStatus}
 
+@_state(back=_select_level)
+def _manage_form(update: Update, context: CallbackContext):
+    user_data = UserData.from_context(context)
+    chat_data = ChatData.from_context(context)
+
+    text, keyboard = _MANAGE_FORM_MENUS[user_data.status]
     logger.debug(f'{text}, {keyboard}')
     chat_data.print_messages(
             {'text': text},
@@ -252,13 +262,13 @@ def _send_form(update: Update, context: CallbackContext):
     bot = Dispatcher.get_instance().bot
 
     # Send message to all admins chats (chats have negative ID)
+    text = utils.helpers.escape_markdown(
+        f'Новая анкета: {user_data.id} \({user_data.mention()}\)'
+    )
+    keyboard = InlineKeyboardMarkup.from_button(InlineKeyboardButton(
+        text='Показать', callback_data=f'{str(SHOW)}{user_data.id}'
+    ))
     for chat in [c for c in bot_data.admins if c < 0]:
-        text = utils.helpers.escape_markdown(
-            f'Новая анкета: {user_data.id} \({user_data.mention()}\)'
-        )
-        keyboard = InlineKeyboardMarkup.from_button(InlineKeyboardButton(
-            text='Показать', callback_data=f'{str(SHOW)}{user_data.id}'
-        ))
         bot.sendMessage(chat, text=text, reply_markup=keyboard, parse_mode='MarkdownV2')
 
     # Update form status
@@ -309,9 +319,9 @@ def _shift_question(update: Update, context: CallbackContext):
 
 def _delete_answer(update: Update, context: CallbackContext):
     user_data = UserData.from_context(context)
-    question = user_data.questions[user_data.current_question]
+    question = user_data.questions.record(user_data.current_question)
     try:
-        del user_data.answers[question]
+        user_data.delete_answer(question.tag)
     except MissingDataError:
         pass
     return _ask_question(update, context)
@@ -319,7 +329,7 @@ def _delete_answer(update: Update, context: CallbackContext):
 def _show_media(update: Update, context: CallbackContext):
     user_data = UserData.from_context(context)
     chat_data = ChatData.from_context(context)
-    question = user_data.questions[user_data.current_question]
+    question = user_data.questions.record(user_data.current_question)
 
     try:
         chat_data.send_media(user_data, question.question_type)
@@ -354,35 +364,21 @@ def _question_keyboard(
         )])
     return InlineKeyboardMarkup(buttons)
 
-def _format_question_text(question) -> str:
-    if question.required:
-        req = utils.helpers.escape_markdown('\(*\)')
-    else:
-        req = ''
-
-    if question.note:
-        note = f'_{utils.helpers.escape_markdown(question.note, 2)}_'
-    else:
-        note = ''
-
-    text = (
-        f'{req} ',
-        f'*{utils.helpers.escape_markdown(question.value, 2)}*\n',
-        f'{note}',
-    )
-    return ''.join(text)
+_QUESTION_KEYBOARDS = {
+    (x, y): _question_keyboard(x, y) for x in (False, True) for y in (False, True)
+}
 
 @_state(back=_manage_form)
 def _ask_question(update: Update, context: CallbackContext) -> None:
     user_data = UserData.from_context(context)
     chat_data = ChatData.from_context(context)
-    question = user_data.questions[user_data.current_question]
+    question = user_data.questions.record(user_data.current_question)
 
     show: bool = False
     remove: bool = False
 
     try:
-        answer = user_data.answers[question].value
+        answer = user_data.answers[question.tag].value
     except MissingDataError as exc:
         if question.question_type in (QuestionType.TEXT, QuestionType.DIGITS):
             answer = 'Не отвечено'
@@ -409,15 +405,15 @@ def _ask_question(update: Update, context: CallbackContext) -> None:
         remove = True
 
     chat_data.print_messages(
-        {'text': _format_question_text(question), 'parse_mode': 'MarkdownV2'},
-        {'text': answer, 'reply_markup': _question_keyboard(show, remove)}
+        {'text': question.message, 'parse_mode': 'MarkdownV2'},
+        {'text': answer, 'reply_markup': _QUESTION_KEYBOARDS[(show, remove)]}
     )
     return ASK_QUESTION
 
 def _proc_answer(update: Update, context: CallbackContext):
     user_data = UserData.from_context(context)
     chat_data = ChatData.from_context(context)
-    question = user_data.questions[user_data.current_question]
+    question = user_data.questions.record(user_data.current_question)
 
     if question.question_type == QuestionType.PHOTO:
         queue = context.dispatcher.update_queue
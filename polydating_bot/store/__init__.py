@@ -1,9 +1,20 @@
 """Import polydating_bot.store modules."""
 
+from .atomicfile import AtomicWriter, Durability
+from .binarycodec import Compression
+from .yamlcodec import use_libyaml
+from .journal import ConversationJournal
 from .yamlpersistence import YamlPersistence
+from .sqlitepersistence import SqlitePersistence
 from .config import BotConfig
 
 __all__ = (
+    'AtomicWriter',
     'BotConfig',
+    'Compression',
+    'ConversationJournal',
+    'Durability',
+    'SqlitePersistence',
     'YamlPersistence',
+    'use_libyaml',
 )
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Atomic file writes with configurable durability."""
+
+from __future__ import annotations
+
+import os
+import re
+import itertools
+import logging
+import threading
+
+from enum import (
+    Enum
+)
+from typing import (
+    Callable,
+    Dict,
+    IO,
+    Optional
+)
+
+from polydating_bot import (
+    PersistenceError
+)
+
+logger = logging.getLogger(__name__)
+
+_TMP_PATTERN = re.compile(r'^\..+\.\d+\.\d+\.tmp$')
+
+class Durability(Enum):
+    """Durability policies of written files."""
+    NONE = 'none'
+    PER_WRITE = 'per-write'
+    GROUP_COMMIT = 'group-commit'
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def remove_stale(directory: str) -> int:
+    """Remove temporary files left in directory tree by writers which didn't
+    finish, e.g. after a crash. Must not run while files are being written.
+    Returns number of removed files."""
+    count = 0
+    for root, _dirs, files in os.walk(directory):
+        for filename in files:
+            if _TMP_PATTERN.match(filename):
+                _remove(os.path.join(root, filename))
+                count += 1
+    if count:
+        logger.warning(f'Stale temporary files removed: {directory}: {count}')
+    return count
+
+def _fsync_path(path: str) -> None:
+    """Fsync file or directory by path."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class AtomicWriter:
+    """Writes files atomically: data goes to temporary file which replaces the
+    target one with 'os.replace'. A crash never leaves truncated target file.
+
+    Durability policies:
+      * none: no fsync at all, data is flushed by OS at its own pace;
+      * per-write: every file and its directory are fsynced before and after
+        replacing target file;
+      * group-commit: written temporary files are collected and every
+        'commit_interval' ms the whole batch is fsynced, moved in place and
+        their directories are fsynced together.
+
+    'on_commit' callback is called on every commit, e.g. to make other files
+    durable at the same pace.
+    """
+    def __init__(
+        self,
+        durability: Durability = Durability.NONE,
+        commit_interval: int = 0,
+        on_commit: Optional[Callable[[], None]] = None,
+    ):
+        self._durability = durability
+        self._interval = commit_interval / 1000
+        self._on_commit = on_commit
+
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._pending: Dict[str, str] = {}
+        self._counter = itertools.count()
+        self._event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        if durability == Durability.GROUP_COMMIT:
+            if not self._interval:
+                raise ValueError('Group commit requires non-zero commit interval.')
+            self._thread = threading.Thread(
+                target=self._run, name='AtomicWriterCommit', daemon=True
+            )
+            self._thread.start()
+
+    @property
+    def durability(self) -> Durability:
+        """Durability policy."""
+        return self._durability
+
+    def _tmp_path(self, path: str) -> str:
+        head, tail = os.path.split(path)
+        return os.path.join(head, f'.{tail}.{os.getpid()}.{next(self._counter)}.tmp')
+
+    def write(self, path: str, dump: Callable[[IO], None], binary: bool = False) -> None:
+        """Write file atomically. 'dump' callback writes data to file object
+        opened in text or 'binary' mode."""
+        tmp_path = self._tmp_path(path)
+        done = False
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb' if binary else 'w') as f:
+                dump(f)
+                if self._durability == Durability.PER_WRITE:
+                    f.flush()
+                    os.fsync(f.fileno())
+            done = True
+        except OSError as exc:
+            raise PersistenceError(f'Can\'t write file: {path}') from exc
+        finally:
+            # Failed dump of any kind must not leave temporary file behind
+            if not done:
+                _remove(tmp_path)
+
+        if self._durability == Durability.GROUP_COMMIT:
+            self._enqueue(path, tmp_path)
+            return
+
+        try:
+            os.replace(tmp_path, path)
+            if self._durability == Durability.PER_WRITE:
+                _fsync_path(os.path.dirname(path))
+        except OSError as exc:
+            _remove(tmp_path)
+            raise PersistenceError(f'Can\'t replace file: {path}') from exc
+
+    def _enqueue(self, path: str, tmp_path: str) -> None:
+        # The same file written twice before commit leaves stale temporary file
+        with self._lock:
+            stale = self._pending.get(path)
+            self._pending[path] = tmp_path
+        if stale:
+            _remove(stale)
+
+    def _run(self) -> None:
+        while True:
+            self._event.wait(self._interval)
+            self._event.clear()
+            try:
+                self.commit()
+            except PersistenceError as exc:
+                logger.error(f'Group commit failed: {exc}')
+
+    def commit(self) -> None:
+        """Make all pending files durable and move them in place. Files which
+        were not moved in place on failure stay pending till next commit."""
+        with self._commit_lock:
+            error = None
+            try:
+                self._commit_pending()
+            except PersistenceError as exc:
+                error = exc
+            if self._on_commit:
+                self._on_commit()
+            if error:
+                raise error
+
+    def _commit_pending(self) -> None:
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        if not pending:
+            return
+
+        # Files are committed one by one: a bad file must not hold the others
+        failed: Dict[str, str] = {}
+        error: Optional[OSError] = None
+        directories = set()
+        for path, tmp_path in pending.items():
+            try:
+                _fsync_path(tmp_path)
+                os.replace(tmp_path, path)
+            except FileNotFoundError:
+                logger.warning(f'Pending file is missing, dropped: {tmp_path}')
+                continue
+            except OSError as exc:
+                failed[path] = tmp_path
+                error = exc
+                continue
+            directories.add(os.path.dirname(path))
+
+        for directory in directories:
+            try:
+                _fsync_path(directory)
+            except OSError as exc:
+                error = exc
+
+        if failed:
+            self._requeue(failed)
+        if error:
+            raise PersistenceError(
+                f'Can\'t commit files: {len(failed)} of {len(pending)} pending: {error}'
+            ) from error
+        logger.debug(f'Files committed: {len(pending)}')
+
+    def _requeue(self, pending: Dict[str, str]) -> None:
+        # Files written again while committing are newer than requeued ones
+        with self._lock:
+            for path, tmp_path in pending.items():
+                if path in self._pending:
+                    _remove(tmp_path)
+                else:
+                    self._pending[path] = tmp_path
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Versioned binary codec of persistence data."""
+
+import copyreg
+import gzip
+import io
+import logging
+import lzma
+import pickle
+
+from enum import (
+    Enum
+)
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Optional
+)
+
+from polydating_bot import (
+    PersistenceError
+)
+from polydating_bot.data import (
+    Data,
+    Versioned,
+    yaml_types
+)
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PDB'
+VERSION = 1
+_PROTOCOL = 5
+
+class Compression(Enum):
+    """Compression of binary records."""
+    NONE = 'none'
+    GZIP = 'gzip'
+    LZMA = 'lzma'
+
+# Header byte of every compression; values are stored in files, do not change
+_COMPRESSION_IDS = {
+    Compression.NONE: 0,
+    Compression.GZIP: 1,
+    Compression.LZMA: 2,
+}
+_COMPRESSIONS = {v: k for k, v in _COMPRESSION_IDS.items()}
+
+_DATA_TYPES: Dict[str, type] = {
+    x.yaml_tag: x for x in yaml_types() if issubclass(x, Data)
+}
+
+def _construct_data(tag: str, mapping: Dict) -> Data:
+    return _DATA_TYPES[tag].from_mapping(mapping)
+
+class _Pickler(pickle.Pickler):
+    """Pickler which stores data objects by their YAML tags and data mapping,
+    the same fields as in YAML files, and never stores mutation versions."""
+    def reducer_override(self, obj: Any) -> Any:
+        if isinstance(obj, Data):
+            return (_construct_data, (obj.yaml_tag, obj.to_mapping(obj)))
+        if isinstance(obj, Versioned) and '_version' in vars(obj):
+            # Loaded objects must have zero version
+            state = dict(obj.__getstate__() if hasattr(obj, '__getstate__') else vars(obj))
+            del state['_version']
+            return (copyreg.__newobj__, (type(obj),), state)
+        return NotImplemented
+
+def _compress(payload: bytes, compression: Compression) -> bytes:
+    if compression == Compression.GZIP:
+        return gzip.compress(payload, compresslevel=6)
+    if compression == Compression.LZMA:
+        return lzma.compress(payload)
+    return payload
+
+def _decompress(payload: bytes, compression: Compression) -> bytes:
+    if compression == Compression.GZIP:
+        return gzip.decompress(payload)
+    if compression == Compression.LZMA:
+        return lzma.decompress(payload)
+    return payload
+
+def dumps(data: Any, compression: Compression = Compression.NONE) -> bytes:
+    """Encode data into binary record: magic, format version, compression
+    and pickled payload."""
+    buffer = io.BytesIO()
+    _Pickler(buffer, protocol=_PROTOCOL).dump(data)
+    header = MAGIC + bytes((VERSION, _COMPRESSION_IDS[compression]))
+    return header + _compress(buffer.getvalue(), compression)
+
+def loads(record: bytes) -> Any:
+    """Decode binary record."""
+    header_len = len(MAGIC) + 2
+    if len(record) < header_len or not record.startswith(MAGIC):
+        raise PersistenceError('Incorrect binary record: bad header')
+
+    version, compression_id = record[len(MAGIC)], record[len(MAGIC) + 1]
+    if version > VERSION:
+        raise PersistenceError(f'Incorrect binary record: unsupported version {version}')
+    compression: Optional[Compression] = _COMPRESSIONS.get(compression_id)
+    if not compression:
+        raise PersistenceError(f'Incorrect binary record: unknown compression {compression_id}')
+
+    try:
+        return pickle.loads(_decompress(record[header_len:], compression))
+    except (pickle.UnpicklingError, EOFError, OSError, lzma.LZMAError,
+            AttributeError, ImportError, KeyError) as exc:
+        raise PersistenceError(f'Incorrect binary record: {exc}') from exc
+
+def dump(data: Any, stream: BinaryIO, compression: Compression = Compression.NONE) -> None:
+    """Write binary record to the stream."""
+    stream.write(dumps(data, compression))
+
+def load(stream: BinaryIO) -> Any:
+    """Read binary record from the stream."""
+    return loads(stream.read())
@@ -8,7 +8,8 @@ import sys
 
 from typing import (
     Dict,
-    Any
+    Any,
+    Union
 )
 
 from configparser import (
@@ -19,6 +20,13 @@ from argparse import (
     ArgumentParser
 )
 
+from polydating_bot.store.atomicfile import (
+    Durability
+)
+from polydating_bot.store.binarycodec import (
+    Compression
+)
+
 logger = logging.getLogger(__name__)
 
 #TODO: fix those variables
@@ -26,6 +34,8 @@ ROOT = f"{os.path.expanduser('~/git/pets/polydating-bot')}"
 DEFAULT_CONFIG_DIR = f"{os.path.join(ROOT, 'config')}"
 DEFAULT_PERSIST_DIR = f"{os.path.join(ROOT, 'tmp')}"
 QUEST_FORM = 'dating-form.yaml'
+SQLITE_DB = 'polydating.sqlite3'
+BACKENDS = ('yaml', 'sqlite')
 
 def _get_property_object(obj: object, attr: str) -> property:
     """Helpers to get properties of the object."""
@@ -52,6 +62,12 @@ def _dict_strip(data: Dict) -> Dict:
         del data[key]
     return data
 
+def _to_bool(value: Union[bool, str]) -> bool:
+    """Helper to parse boolean option either from cmdline or config file."""
+    if isinstance(value, str):
+        return value.lower() in ('1', 'yes', 'true', 'on')
+    return bool(value)
+
 class _BotConfigMeta(type):
     def __init__(cls, *args, **kwargs):
         super().__init__(cls, args, kwargs)
@@ -60,6 +76,21 @@ class _BotConfigMeta(type):
         cls._persist_dir: str = DEFAULT_PERSIST_DIR
         cls._loglevel: int = logging.WARNING
         cls._token: str = str()
+        cls._flush_interval: int = 0
+        cls._flush_changes: int = 0
+        cls._backend: str = BACKENDS[0]
+        cls._libyaml: bool = False
+        cls._load_workers: int = 0
+        cls._load_processes: bool = False
+        cls._lazy_users: bool = False
+        cls._cache_size: int = 0
+        cls._durability: Durability = Durability.NONE
+        cls._commit_interval: int = 0
+        cls._journal_ratio: float = 4.0
+        cls._binary: bool = False
+        cls._compression: Compression = Compression.NONE
+        cls._write_queue: int = 0
+        cls._chat_cache_ttl: int = 600
 
     @property
     def token(cls) -> str:
@@ -115,6 +146,179 @@ class _BotConfigMeta(type):
         if isinstance(level, int):
             cls._loglevel = level
 
+    @property
+    def flush_interval(cls) -> int:
+        """Persistence write-behind interval (ms). Zero to write synchronously."""
+        return cls._flush_interval
+
+    @flush_interval.setter
+    def flush_interval(cls, value: str) -> None:
+        try:
+            cls._flush_interval = max(int(value), 0)
+        except ValueError:
+            logger.error(f'Incorrect flush interval: {value}')
+
+    @property
+    def flush_changes(cls) -> int:
+        """Number of persistence updates to trigger write-behind flush early."""
+        return cls._flush_changes
+
+    @flush_changes.setter
+    def flush_changes(cls, value: str) -> None:
+        try:
+            cls._flush_changes = max(int(value), 0)
+        except ValueError:
+            logger.error(f'Incorrect flush changes count: {value}')
+
+    @property
+    def backend(cls) -> str:
+        """Persistence backend name."""
+        return cls._backend
+
+    @backend.setter
+    def backend(cls, value: str) -> None:
+        if value.lower() in BACKENDS:
+            cls._backend = value.lower()
+        else:
+            logger.error(f'Incorrect persistence backend: {value}')
+
+    @property
+    def database_file(cls) -> str:
+        """SQLite persistence database file."""
+        return os.path.join(cls.persist_dir, SQLITE_DB)
+
+    @property
+    def libyaml(cls) -> bool:
+        """Use libyaml based YAML loader and dumper if available."""
+        return cls._libyaml
+
+    @libyaml.setter
+    def libyaml(cls, value: Union[bool, str]) -> None:
+        cls._libyaml = _to_bool(value)
+
+    @property
+    def load_workers(cls) -> int:
+        """Number of workers to load persistence data at startup."""
+        return cls._load_workers
+
+    @load_workers.setter
+    def load_workers(cls, value: str) -> None:
+        try:
+            cls._load_workers = max(int(value), 0)
+        except ValueError:
+            logger.error(f'Incorrect load workers count: {value}')
+
+    @property
+    def load_processes(cls) -> bool:
+        """Use processes instead of threads to load persistence data."""
+        return cls._load_processes
+
+    @load_processes.setter
+    def load_processes(cls, value: Union[bool, str]) -> None:
+        cls._load_processes = _to_bool(value)
+
+    @property
+    def lazy_users(cls) -> bool:
+        """Load user data on first access instead of startup."""
+        return cls._lazy_users
+
+    @lazy_users.setter
+    def lazy_users(cls, value: Union[bool, str]) -> None:
+        cls._lazy_users = _to_bool(value)
+
+    @property
+    def cache_size(cls) -> int:
+        """Maximum number of user data records kept in memory (lazy mode)."""
+        return cls._cache_size
+
+    @cache_size.setter
+    def cache_size(cls, value: str) -> None:
+        try:
+            cls._cache_size = max(int(value), 0)
+        except ValueError:
+            logger.error(f'Incorrect cache size: {value}')
+
+    @property
+    def chat_cache_ttl(cls) -> int:
+        """Time (s) to keep Telegram chats info in cache. Zero to disable."""
+        return cls._chat_cache_ttl
+
+    @chat_cache_ttl.setter
+    def chat_cache_ttl(cls, value: str) -> None:
+        try:
+            cls._chat_cache_ttl = max(int(value), 0)
+        except ValueError:
+            logger.error(f'Incorrect chat cache TTL: {value}')
+
+    @property
+    def write_queue(cls) -> int:
+        """Size of persistence write queue. Zero to write without queue."""
+        return cls._write_queue
+
+    @write_queue.setter
+    def write_queue(cls, value: str) -> None:
+        try:
+            cls._write_queue = max(int(value), 0)
+        except ValueError:
+            logger.error(f'Incorrect write queue size: {value}')
+
+    @property
+    def durability(cls) -> Durability:
+        """Persistence files durability policy."""
+        return cls._durability
+
+    @durability.setter
+    def durability(cls, value: str) -> None:
+        try:
+            cls._durability = Durability(value.lower())
+        except ValueError:
+            logger.error(f'Incorrect durability policy: {value}')
+
+    @property
+    def commit_interval(cls) -> int:
+        """Persistence group commit interval (ms)."""
+        return cls._commit_interval
+
+    @commit_interval.setter
+    def commit_interval(cls, value: str) -> None:
+        try:
+            cls._commit_interval = max(int(value), 0)
+        except ValueError:
+            logger.error(f'Incorrect commit interval: {value}')
+
+    @property
+    def journal_ratio(cls) -> float:
+        """Conversations journal to snapshot size ratio to compact journal."""
+        return cls._journal_ratio
+
+    @journal_ratio.setter
+    def journal_ratio(cls, value: str) -> None:
+        try:
+            cls._journal_ratio = max(float(value), 1.0)
+        except ValueError:
+            logger.error(f'Incorrect journal ratio: {value}')
+
+    @property
+    def binary(cls) -> bool:
+        """Store persistence data with binary codec instead of YAML."""
+        return cls._binary
+
+    @binary.setter
+    def binary(cls, value: Union[bool, str]) -> None:
+        cls._binary = _to_bool(value)
+
+    @property
+    def compression(cls) -> Compression:
+        """Compression of binary persistence data."""
+        return cls._compression
+
+    @compression.setter
+    def compression(cls, value: str) -> None:
+        try:
+            cls._compression = Compression(value.lower())
+        except ValueError:
+            logger.error(f'Incorrect compression: {value}')
+
     @property
     def form_file(cls) -> str:
         """Form questions file."""
@@ -193,5 +397,60 @@ class BotConfig(metaclass=_BotConfigMeta):
         parser.add_argument('--log-level', metavar='log', dest='loglevel',
                             choices=['critical', 'error', 'warning', 'info', 'debug'],
                             help='log verbosity level [warning]')
+
+        parser.add_argument('--backend', metavar='name', dest='backend',
+                            choices=BACKENDS,
+                            help=f'persistence backend [{BACKENDS[0]}]')
+
+        parser.add_argument('--libyaml', action='store_true', dest='libyaml',
+                            help='use libyaml C implementation if available')
+
+        parser.add_argument('--binary', action='store_true', dest='binary',
+                            help='store persistence data in binary format')
+
+        parser.add_argument('--compression', metavar='name', dest='compression',
+                            choices=[x.value for x in Compression],
+                            help='binary persistence data compression [none]')
+
+        parser.add_argument('--load-workers', metavar='count', dest='load_workers',
+                            help='load persistence data with \'count\' workers [0]')
+
+        parser.add_argument('--load-processes', action='store_true', dest='load_processes',
+                            help='load persistence data with processes instead of threads')
+
+        parser.add_argument('--lazy-users', action='store_true', dest='lazy_users',
+                            help='load user data on first access')
+
+        parser.add_argument('--cache-size', metavar='count', dest='cache_size',
+                            help='keep at most \'count\' users in memory '
+                                 '(--lazy-users only) [0, i.e. unlimited]')
+
+        parser.add_argument('--chat-cache-ttl', metavar='seconds', dest='chat_cache_ttl',
+                            help='keep Telegram chats info in cache for \'seconds\' '
+                                 '[600, 0 to disable]')
+
+        parser.add_argument('--flush-interval', metavar='ms', dest='flush_interval',
+                            help='write persistence data in background every \'ms\' '
+                                 'milliseconds [0, i.e. synchronously]')
+
+        parser.add_argument('--flush-changes', metavar='count', dest='flush_changes',
+                            help='write persistence data in background after '
+                                 '\'count\' updates [0, i.e. disabled]')
+
+        parser.add_argument('--write-queue', metavar='count', dest='write_queue',
+                            help='write persistence data by a writer thread with '
+                                 'at most \'count\' queued records [0, i.e. disabled]')
+
+        parser.add_argument('--durability', metavar='policy', dest='durability',
+                            choices=[x.value for x in Durability],
+                            help='persistence files fsync policy [none]')
+
+        parser.add_argument('--commit-interval', metavar='ms', dest='commit_interval',
+                            help='fsync persistence files in groups every \'ms\' '
+                                 'milliseconds (\'group-commit\' policy only)')
+
+        parser.add_argument('--journal-ratio', metavar='ratio', dest='journal_ratio',
+                            help='compact conversations journal once it is \'ratio\' '
+                                 'times bigger than snapshot [4.0]')
         args = parser.parse_args()
         return args if args else {}
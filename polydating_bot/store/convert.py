@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Convert persistence directory between YAML and binary formats.
+
+    python -m polydating_bot.store.convert path --to binary [--compression lzma]
+    python -m polydating_bot.store.convert path --to yaml
+"""
+
+import argparse
+import io
+import logging
+import os
+
+from typing import (
+    Any,
+    Iterator,
+    Tuple
+)
+
+from polydating_bot import (
+    PersistenceError
+)
+from polydating_bot.store import (
+    binarycodec,
+    yamlcodec
+)
+from polydating_bot.store.atomicfile import (
+    AtomicWriter
+)
+from polydating_bot.store.binarycodec import (
+    Compression
+)
+
+logger = logging.getLogger(__name__)
+
+# Conversations snapshot and journal are always YAML
+_NAMES = ('data', 'nav', 'manifest', 'names')
+_YAML_SUFFIX = '.yaml'
+_BINARY_SUFFIX = '.bin'
+
+def _source_files(directory: str, binary: bool) -> Iterator[Tuple[str, str]]:
+    """Iterate over files to convert and their target paths."""
+    source, target = (_YAML_SUFFIX, _BINARY_SUFFIX) if binary else (_BINARY_SUFFIX, _YAML_SUFFIX)
+    for root, _, files in os.walk(directory):
+        for filename in sorted(files):
+            name, suffix = os.path.splitext(filename)
+            if name in _NAMES and suffix == source:
+                yield os.path.join(root, filename), os.path.join(root, name + target)
+
+def _load(path: str) -> Any:
+    if path.endswith(_BINARY_SUFFIX):
+        with open(path, 'rb') as f:
+            return binarycodec.load(f)
+    with open(path, 'r') as f:
+        return yamlcodec.load(f)
+
+def _verify(data: Any, encoded: bytes, binary: bool) -> None:
+    """Check that encoded data is decoded back to the same data."""
+    if binary:
+        decoded = binarycodec.loads(encoded)
+    else:
+        decoded = yamlcodec.load(io.StringIO(encoded.decode()))
+    if yamlcodec.dump(decoded) != yamlcodec.dump(data):
+        raise PersistenceError('Round-trip mismatch')
+
+def convert_directory(
+    directory: str,
+    binary: bool,
+    compression: Compression = Compression.NONE,
+) -> int:
+    """Convert all data files of persistence directory to binary or YAML
+    format. Every converted file is verified to round-trip before the source
+    file is removed. Returns number of converted files."""
+    writer = AtomicWriter()
+    count = 0
+    for path, target in _source_files(directory, binary):
+        try:
+            data = _load(path)
+        except (OSError, PersistenceError) as exc:
+            raise PersistenceError(f'Can\'t load file: {path}: {exc}') from exc
+
+        if binary:
+            encoded = binarycodec.dumps(data, compression)
+        else:
+            encoded = yamlcodec.dump(data).encode()
+        try:
+            _verify(data, encoded, binary)
+        except PersistenceError as exc:
+            raise PersistenceError(f'Can\'t convert file: {path}: {exc}') from exc
+
+        writer.write(target, lambda f, x=encoded: f.write(x), binary=True)
+        try:
+            os.remove(path)
+        except OSError as exc:
+            raise PersistenceError(f'Can\'t remove file: {path}') from exc
+        logger.debug(f'File converted: {path} -> {target}')
+        count += 1
+
+    logger.info(f'Directory converted: {directory}: {count} files')
+    return count
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory', help='persistence directory')
+    parser.add_argument('--to', dest='format', choices=('yaml', 'binary'), required=True,
+                        help='target format')
+    parser.add_argument('--compression', choices=[x.value for x in Compression],
+                        default=Compression.NONE.value,
+                        help='binary records compression [none]')
+    parser.add_argument('--libyaml', action='store_true',
+                        help='use libyaml C implementation if available')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s - %(message)s', level=logging.INFO)
+    yamlcodec.use_libyaml(args.libyaml)
+    convert_directory(args.directory, args.format == 'binary', Compression(args.compression))
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""Append-only journal of conversation states."""
+
+from __future__ import annotations
+
+import os
+import logging
+import threading
+
+from typing import (
+    Any,
+    Dict,
+    IO,
+    Optional,
+    Tuple
+)
+
+import yaml
+
+from polydating_bot import (
+    PersistenceError
+)
+from polydating_bot.store import (
+    yamlcodec
+)
+from polydating_bot.store.atomicfile import (
+    AtomicWriter,
+    Durability,
+    _fsync_path
+)
+
+logger = logging.getLogger(__name__)
+
+Conversations = Dict[str, Dict[Tuple, Any]]
+
+class ConversationJournal:
+    """Conversation states stored as a snapshot file and a journal of state
+    changes appended to it, so a state change costs a single line write
+    instead of a rewrite of all conversations.
+
+    Every record is a one-line YAML document '[name, key, state]'. At startup
+    records are replayed over the snapshot; a truncated trailing record (e.g.
+    after a crash) is dropped. As soon as the journal outgrows 'ratio' times
+    the snapshot size (and 'min_size' bytes), a background thread compacts it:
+    the journal is rotated, current states are written to a new snapshot and
+    the rotated journal is removed. A crash at any step loses no records: the
+    rotated journal is replayed before the current one.
+
+    'durability' selects fsync policy of the journal: with 'per-write' every
+    record is fsynced, with 'group-commit' records are fsynced on 'commit()'.
+    """
+    _JOURNAL_SUFFIX = '.journal'
+    _ROTATED_SUFFIX = '.journal.old'
+
+    def __init__(
+        self,
+        path: str,
+        durability: Durability = Durability.NONE,
+        ratio: float = 4.0,
+        min_size: int = 64 * 1024,
+    ):
+        self._path = path
+        self._journal_path = path + self._JOURNAL_SUFFIX
+        self._rotated_path = path + self._ROTATED_SUFFIX
+        self._durability = durability
+        self._ratio = ratio
+        self._min_size = min_size
+        # Snapshot is written once per compaction: make it durable right away
+        self._writer = AtomicWriter(
+            Durability.NONE if durability == Durability.NONE else Durability.PER_WRITE
+        )
+
+        self._conversations: Conversations = {}
+        self._file: Optional[IO] = None
+        self._size: int = 0
+        self._snapshot_size: int = 0
+        self._synced: bool = True
+
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def size(self) -> int:
+        """Current journal size (bytes)."""
+        return self._size
+
+    def _replay(self, path: str) -> int:
+        try:
+            with open(path, 'r') as f:
+                lines = f.readlines()
+        except OSError:
+            return 0
+
+        count = 0
+        for number, line in enumerate(lines, 1):
+            try:
+                if not line.endswith('\n'):
+                    raise ValueError('truncated record')
+                name, key, state = yamlcodec.load(line)
+            except (yaml.YAMLError, ValueError, TypeError) as exc:
+                logger.warning(f'Journal replay stopped: {path}:{number}: {exc}')
+                break
+            self._apply(name, key, state)
+            count += 1
+        return count
+
+    def _apply(self, name: str, key: Tuple, state: Optional[object]) -> None:
+        states = self._conversations.setdefault(name, {})
+        if state is None:
+            states.pop(key, None)
+        else:
+            states[key] = state
+
+    def _read(self) -> None:
+        with self._lock:
+            try:
+                with open(self._path, 'r') as f:
+                    data = yamlcodec.load(f)
+                self._snapshot_size = os.path.getsize(self._path)
+            except OSError:
+                logger.warning(f'File \'{self._path}\' is missing.')
+                data = None
+            except yaml.YAMLError as exc:
+                mark = getattr(exc, 'problem_mark')
+                raise PersistenceError(f'Incorrect YAML: {self._path}: {mark}') from exc
+            self._conversations = data if data else {}
+
+            count = self._replay(self._rotated_path) + self._replay(self._journal_path)
+            logger.info(f'Conversations loaded successfully: {self._path}: {count} records replayed')
+
+    @classmethod
+    def read(cls, path: str) -> Conversations:
+        """Read conversations of the snapshot and the journal without
+        changing any file, e.g. while the bot is using them."""
+        journal = cls(path)
+        journal._read()
+        return journal._conversations
+
+    def load(self) -> Conversations:
+        """Load snapshot and replay journal over it. Returns conversations
+        dictionary which is kept up to date by 'append()'."""
+        self._read()
+
+        # Start from a clean journal, partial records must not stay in it
+        if os.path.exists(self._rotated_path) or os.path.exists(self._journal_path):
+            self._compact()
+        return self._conversations
+
+    def append(self, name: str, key: Tuple[int, ...], state: Optional[object]) -> None:
+        """Append state change record to the journal."""
+        line = yamlcodec.dump_line([name, tuple(key), state])
+        with self._lock:
+            self._apply(name, tuple(key), state)
+            try:
+                if not self._file:
+                    os.makedirs(os.path.dirname(self._journal_path), exist_ok=True)
+                    self._file = open(self._journal_path, 'a')
+                self._file.write(line)
+                self._file.flush()
+                if self._durability == Durability.PER_WRITE:
+                    os.fsync(self._file.fileno())
+                else:
+                    self._synced = False
+            except OSError as exc:
+                raise PersistenceError(f'Can\'t write file: {self._journal_path}') from exc
+            self._size += len(line)
+
+            if self._size > max(self._min_size, self._ratio * self._snapshot_size):
+                self._start_compaction()
+
+    def replace(self, conversations: Conversations) -> None:
+        """Replace all conversations with new ones, e.g. on import."""
+        with self._lock:
+            self._conversations = conversations
+        self._compact()
+
+    def commit(self) -> None:
+        """Make appended records durable."""
+        with self._lock:
+            if self._synced or not self._file:
+                return
+            try:
+                os.fsync(self._file.fileno())
+            except OSError as exc:
+                raise PersistenceError(f'Can\'t sync file: {self._journal_path}') from exc
+            self._synced = True
+
+    def _start_compaction(self) -> None:
+        if not self._thread:
+            self._thread = threading.Thread(
+                target=self._run, name='ConversationJournalCompact', daemon=True
+            )
+            self._thread.start()
+        self._event.set()
+
+    def _run(self) -> None:
+        while True:
+            self._event.wait()
+            self._event.clear()
+            try:
+                self._compact()
+            except PersistenceError as exc:
+                logger.error(f'Journal compaction failed: {exc}')
+
+    def _rotate(self) -> Conversations:
+        """Move journal aside and take a snapshot of current states."""
+        with self._lock:
+            try:
+                if self._file:
+                    self._file.close()
+                    self._file = None
+                if os.path.exists(self._rotated_path):
+                    # Previous compaction failed: keep its records first
+                    with open(self._journal_path, 'r') as src, \
+                            open(self._rotated_path, 'a') as dst:
+                        dst.write(src.read())
+                    os.remove(self._journal_path)
+                else:
+                    os.replace(self._journal_path, self._rotated_path)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                raise PersistenceError(f'Can\'t rotate file: {self._journal_path}') from exc
+            self._size = 0
+            self._synced = True
+            return {k: dict(v) for k, v in self._conversations.items()}
+
+    def _compact(self) -> None:
+        with self._compact_lock:
+            data = self._rotate()
+            self._writer.write(self._path, lambda f: yamlcodec.dump(data, f))
+            try:
+                if os.path.exists(self._rotated_path):
+                    os.remove(self._rotated_path)
+                    if self._durability != Durability.NONE:
+                        _fsync_path(os.path.dirname(self._path))
+                self._snapshot_size = os.path.getsize(self._path)
+            except OSError as exc:
+                raise PersistenceError(f'Can\'t remove file: {self._rotated_path}') from exc
+            logger.debug(f'Journal compacted: {self._path}: {self._snapshot_size} bytes')
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Persistence directory layout module.
+
+Records of users and chats are stored by ID only, in shard directories named
+after one byte hash of the ID: '{type}/{shard}/{id}', see Data.directory.
+Legacy '{type}/{id}_{name_id}' directories are migrated with:
+
+    python -m polydating_bot.store.layout path
+"""
+
+import argparse
+import heapq
+import logging
+import os
+import re
+import shutil
+
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple
+)
+
+from polydating_bot import (
+    PersistenceError
+)
+from polydating_bot.data import (
+    Data,
+    DataType
+)
+
+logger = logging.getLogger(__name__)
+
+_SHARD_RE = re.compile(r'^[0-9a-f]{2}$')
+_RECORD_RE = re.compile(r'^-?\d+$')
+_LEGACY_RE = re.compile(r'^(-?\d+)_')
+
+RECORD_TYPES = (DataType.USER, DataType.CHAT)
+
+def iter_record_directories(type_dir: str, start: Optional[str] = None) -> Iterator[str]:
+    """Iterate over record directories of data type directory, relative to
+    it, in sorted order. Only directories after 'start' are yielded. Just one
+    shard is listed at a time."""
+    try:
+        with os.scandir(type_dir) as shards:
+            shard_names = sorted(x.name for x in shards if x.is_dir() and _SHARD_RE.match(x.name))
+    except FileNotFoundError:
+        return
+
+    for shard in shard_names:
+        # Shard names are of the same length, so order of shards and order of
+        # paths agree
+        if start and shard < start[:len(shard)]:
+            continue
+        with os.scandir(os.path.join(type_dir, shard)) as entries:
+            paths = sorted(
+                os.path.join(shard, x.name)
+                for x in entries if x.is_dir() and _RECORD_RE.match(x.name)
+            )
+        for path in paths:
+            if not start or path > start:
+                yield path
+
+def record_directories(type_dir: str) -> List[str]:
+    """Get sorted record directories of data type directory, relative to it."""
+    # Sort paths so records are always loaded in the same order
+    return list(iter_record_directories(type_dir))
+
+def _legacy_directories(type_dir: str) -> Dict[int, List[str]]:
+    legacy: Dict[int, List[str]] = {}
+    try:
+        with os.scandir(type_dir) as entries:
+            for entry in entries:
+                match = _LEGACY_RE.match(entry.name)
+                if entry.is_dir() and match:
+                    legacy.setdefault(int(match.group(1)), []).append(entry.path)
+    except FileNotFoundError:
+        pass
+    return legacy
+
+def record_mtime(path: str) -> float:
+    """Modification time of the newest file in the directory."""
+    with os.scandir(path) as entries:
+        times = [x.stat().st_mtime for x in entries if x.is_file()]
+    return max(times, default=0.0)
+
+def iter_record_paths(
+    type_dir: str, start: Optional[str] = None
+) -> Iterator[Tuple[str, str]]:
+    """Iterate over record directories of data type directory of any layout
+    without changing it, as positions in sharded layout with full paths, in
+    sorted order. Only positions after 'start' are yielded. Of several
+    directories of the same ID the one 'migrate_layout' keeps is yielded."""
+    legacy = {
+        os.path.join(Data.shard(var_id), str(var_id)): paths
+        for var_id, paths in _legacy_directories(type_dir).items()
+    }
+    legacy_positions = sorted(x for x in legacy if not start or x > start)
+
+    last = None
+    for position in heapq.merge(iter_record_directories(type_dir, start), legacy_positions):
+        if position == last:
+            continue
+        last = position
+
+        path = os.path.join(type_dir, position)
+        if position in legacy:
+            paths = legacy[position] + ([path] if os.path.isdir(path) else [])
+            try:
+                path = max(paths, key=record_mtime)
+            except FileNotFoundError:
+                continue
+        yield position, path
+
+def needs_migration(directory: str) -> bool:
+    """Check if persistence directory has legacy record directories."""
+    return any(
+        _legacy_directories(os.path.join(directory, x.value)) for x in RECORD_TYPES
+    )
+
+def migrate_layout(directory: str) -> int:
+    """Move legacy '{id}_{name_id}' record directories to sharded layout.
+    If there are several directories of the same ID, e.g. after renames,
+    the one with the newest files wins and the others are removed. Returns
+    number of migrated records."""
+    count = 0
+    for data_type in RECORD_TYPES:
+        type_dir = os.path.join(directory, data_type.value)
+        legacy = _legacy_directories(type_dir)
+        for var_id, paths in sorted(legacy.items()):
+            target = os.path.join(type_dir, Data.shard(var_id), str(var_id))
+            if os.path.exists(target):
+                paths.append(target)
+
+            try:
+                paths.sort(key=record_mtime, reverse=True)
+                newest, orphans = paths[0], paths[1:]
+                if newest != target:
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    if os.path.exists(target):
+                        shutil.rmtree(target)
+                        orphans.remove(target)
+                    os.replace(newest, target)
+                for path in orphans:
+                    logger.info(f'Orphaned directory removed: {path}')
+                    shutil.rmtree(path)
+            except OSError as exc:
+                raise PersistenceError(f'Can\'t migrate directory: {var_id}: {exc}') from exc
+            count += 1
+
+        if legacy:
+            # Manifest refers to old directories: it is rebuilt on load
+            for name in os.listdir(type_dir):
+                if name.startswith('manifest.'):
+                    os.remove(os.path.join(type_dir, name))
+
+    if count:
+        logger.info(f'Directory layout migrated: {directory}: {count} records')
+    return count
+
+def _main():
+    parser = argparse.ArgumentParser(description='Migrate persistence directory layout.')
+    parser.add_argument('directory', help='persistence directory')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s - %(message)s', level=logging.INFO)
+    migrate_layout(args.directory)
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# pylint: disable=R0913
+"""SQLite persistence module."""
+
+import json
+import logging
+import sqlite3
+import threading
+
+from collections import (
+    defaultdict
+)
+from typing import (
+    Any,
+    DefaultDict,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple
+)
+
+import yaml
+
+from telegram.ext import (
+    BasePersistence
+)
+from telegram.utils.types import (
+    ConversationDict
+)
+
+from polydating_bot import (
+    PersistenceError
+)
+from polydating_bot.data import (
+    Data,
+    DataType
+)
+from polydating_bot.store import (
+    yamlcodec
+)
+from polydating_bot.store.versions import (
+    VersionTracker
+)
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS user '
+    '(id INTEGER PRIMARY KEY, name_id TEXT, data TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS user_name_id ON user (name_id)',
+    'CREATE TABLE IF NOT EXISTS chat '
+    '(id INTEGER PRIMARY KEY, name_id TEXT, data TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS chat_name_id ON chat (name_id)',
+    'CREATE TABLE IF NOT EXISTS bot '
+    '(id INTEGER PRIMARY KEY CHECK (id = 0), data TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS conversations '
+    '(name TEXT NOT NULL, key TEXT NOT NULL, state TEXT, PRIMARY KEY (name, key))',
+)
+
+_UPSERT_BOT = (
+    'INSERT INTO bot (id, data) VALUES (0, ?) '
+    'ON CONFLICT (id) DO UPDATE SET data = excluded.data'
+)
+_UPSERT_RECORD = (
+    'INSERT INTO {table} (id, name_id, data) VALUES (?, ?, ?) '
+    'ON CONFLICT (id) DO UPDATE SET '
+    'name_id = excluded.name_id, data = excluded.data'
+)
+_UPSERT_CONV = (
+    'INSERT INTO conversations (name, key, state) VALUES (?, ?, ?) '
+    'ON CONFLICT (name, key) DO UPDATE SET state = excluded.state'
+)
+_DELETE_CONV = 'DELETE FROM conversations WHERE name = ? AND key = ?'
+
+# Rows are read in batches by key, so no transaction stays open between them
+_BATCH_SIZE = 500
+_MIN_ID = -2 ** 63
+
+class SqlitePersistence(BasePersistence):
+    """SQLite persistence class. All data is stored in a single WAL-mode
+    database file: a table per data type and a conversations table keyed by
+    (name, key). Records are encoded with the same YAML mapping as in
+    YamlPersistence, so data can be moved between backends as is.
+
+    Records can be streamed out of and into the database in batches, see
+    'iter_records' and 'import_records'.
+
+    Loaded data is handed over to the dispatcher without copies; changed
+    records are detected by data versions.
+    """
+    def __init__(
+        self,
+        filename: str,
+        store_user_data: bool = True,
+        store_chat_data: bool = True,
+        store_bot_data: bool = True,
+    ):
+        super().__init__(
+            store_user_data=store_user_data,
+            store_chat_data=store_chat_data,
+            store_bot_data=store_bot_data,
+        )
+        self._filename = filename
+        self._versions = VersionTracker()
+        self._conversations: Optional[Dict[str, Dict[Tuple, Any]]] = None
+
+        self._lock = threading.RLock()
+        try:
+            self._conn = sqlite3.connect(filename, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            with self._conn:
+                for statement in _SCHEMA:
+                    self._conn.execute(statement)
+        except sqlite3.Error as exc:
+            raise PersistenceError(f'Can\'t open database: {filename}') from exc
+
+    @staticmethod
+    def _encode(data: Any) -> str:
+        return yamlcodec.dump(data)
+
+    @staticmethod
+    def _decode(text: Optional[str]) -> Any:
+        if text is None:
+            return None
+        try:
+            return yamlcodec.load(text)
+        except yaml.YAMLError as exc:
+            raise PersistenceError(f'Incorrect YAML record: {exc}') from exc
+
+    def _execute(self, statement: str, args: Tuple = ()) -> List[Tuple]:
+        try:
+            with self._lock, self._conn:
+                return self._conn.execute(statement, args).fetchall()
+        except sqlite3.Error as exc:
+            raise PersistenceError(f'Database error: {exc}') from exc
+
+    def _executemany(self, statement: str, args: Iterable[Tuple]) -> None:
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(statement, args)
+        except sqlite3.Error as exc:
+            raise PersistenceError(f'Database error: {exc}') from exc
+
+    def _load_table(self, data_type: DataType) -> DefaultDict[int, Dict]:
+        data = defaultdict(dict)
+        rows = self._execute(f'SELECT data FROM {data_type.value}')
+        for (text,) in rows:
+            data_item: Data = self._decode(text)
+            data_item.update_dict(data, data_item.id)
+            data_item.index()
+
+        logger.info(f'Table loaded successfully: {data_type.value}: {len(rows)} rows')
+        return data
+
+    def _dump_data(self, data: Dict) -> None:
+        logger.debug(f'Dumping data: {data}')
+        data = Data.from_dict(data)
+        table = data.data_type().value
+
+        if data.data_type() == DataType.BOT:
+            self._execute(_UPSERT_BOT, (self._encode(data),))
+        else:
+            self._execute(
+                _UPSERT_RECORD.format(table=table),
+                (data.id, data.name_id, self._encode(data))
+            )
+
+    @staticmethod
+    def _encode_key(key: Tuple[int, ...]) -> str:
+        return json.dumps(list(key))
+
+    @staticmethod
+    def _decode_key(text: str) -> Tuple[int, ...]:
+        return tuple(json.loads(text))
+
+    def _load_conv(self) -> Dict[str, Dict[Tuple, Any]]:
+        data: Dict[str, Dict[Tuple, Any]] = {}
+        rows = self._execute('SELECT name, key, state FROM conversations')
+        for (name, key, state) in rows:
+            data.setdefault(name, {})[self._decode_key(key)] = self._decode(state)
+        return data
+
+    def _dump_conv(self, name: str, key: Tuple[int, ...], state: Optional[object]) -> None:
+        # Ended conversations have no state: their rows are dropped
+        if state is None:
+            self._execute(_DELETE_CONV, (name, self._encode_key(key)))
+        else:
+            self._execute(_UPSERT_CONV, (name, self._encode_key(key), self._encode(state)))
+
+    def insert_bot(self, obj: object) -> object:
+        # Data keeps bot instance as class attribute: nothing to insert
+        return obj
+
+    @classmethod
+    def replace_bot(cls, obj: object) -> object:
+        # Records are encoded right away, no copy is needed
+        return obj
+
+    def get_chat_data(self) -> DefaultDict[int, Dict[Any, Any]]:
+        return self._load_table(DataType.CHAT)
+
+    def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        logger.debug(f'Update chat data: {locals()}')
+        if self._versions.changed(DataType.CHAT, chat_id, data):
+            self._dump_data(data)
+
+    def get_user_data(self) -> DefaultDict[int, Dict[Any, Any]]:
+        return self._load_table(DataType.USER)
+
+    def update_user_data(self, user_id: int, data: Dict) -> None:
+        logger.debug(f'Update user data: {locals()}')
+        if self._versions.changed(DataType.USER, user_id, data):
+            self._dump_data(data)
+
+    def get_bot_data(self) -> Dict[Any, Any]:
+        rows = self._execute('SELECT data FROM bot WHERE id = 0')
+        bot_data = {}
+        if rows:
+            self._decode(rows[0][0]).update_dict(bot_data)
+        return bot_data
+
+    def update_bot_data(self, data: Dict) -> None:
+        logger.debug(f'Update bot data: {locals()}')
+        if self._versions.changed(DataType.BOT, None, data):
+            self._dump_data(data)
+
+    def get_conversations(self, name: str) -> ConversationDict:
+        if not self._conversations:
+            self._conversations = self._load_conv()
+
+        # Conversation handler updates its dictionary before persistence
+        return dict(self._conversations.get(name, {}))
+
+    def update_conversation(
+        self, name: str, key: Tuple[int, ...], new_state: Optional[object]
+    ) -> None:
+        if not self._conversations:
+            self._conversations = {}
+        states = self._conversations.setdefault(name, {})
+        if states.get(key) == new_state:
+            return
+        if new_state is None:
+            states.pop(key, None)
+        else:
+            states[key] = new_state
+        self._dump_conv(name, key, new_state)
+
+    def flush(self) -> None:
+        try:
+            with self._lock:
+                self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        except sqlite3.Error as exc:
+            raise PersistenceError(f'Database error: {exc}') from exc
+
+    def iter_records(
+        self,
+        data_type: DataType,
+        start: Optional[int] = None,
+        since: Optional[float] = None, # pylint: disable=W0613
+    ) -> Iterator[Tuple[Optional[int], Data]]:
+        """Iterate over stored records of data type one at a time with their
+        IDs as positions, in ID order. Iteration resumes after 'start' ID.
+        'since' is accepted for compatibility with YamlPersistence: rows keep
+        no modification time, so all of them are yielded."""
+        if data_type == DataType.BOT:
+            rows = self._execute('SELECT data FROM bot WHERE id = 0')
+            if rows:
+                yield None, self._decode(rows[0][0])
+            return
+
+        start = _MIN_ID if start is None else start
+        while True:
+            rows = self._execute(
+                f'SELECT id, data FROM {data_type.value} WHERE id > ? ORDER BY id LIMIT ?',
+                (start, _BATCH_SIZE)
+            )
+            for (var_id, text) in rows:
+                yield var_id, self._decode(text)
+            if len(rows) < _BATCH_SIZE:
+                return
+            start = rows[-1][0]
+
+    def iter_record_ids(self, data_type: DataType) -> Iterator[int]:
+        """Iterate over IDs of stored records of data type in ID order."""
+        start = _MIN_ID
+        while True:
+            rows = self._execute(
+                f'SELECT id FROM {data_type.value} WHERE id > ? ORDER BY id LIMIT ?',
+                (start, _BATCH_SIZE)
+            )
+            for (var_id,) in rows:
+                yield var_id
+            if len(rows) < _BATCH_SIZE:
+                return
+            start = rows[-1][0]
+
+    def iter_conversations(self) -> Iterator[Tuple[str, Tuple, Any]]:
+        """Iterate over stored conversation states."""
+        rows = self._execute(
+            'SELECT name, key, state FROM conversations ORDER BY name, key LIMIT ?',
+            (_BATCH_SIZE,)
+        )
+        while rows:
+            for (name, key, state) in rows:
+                yield name, self._decode_key(key), self._decode(state)
+            if len(rows) < _BATCH_SIZE:
+                return
+            rows = self._execute(
+                'SELECT name, key, state FROM conversations WHERE (name, key) > (?, ?) '
+                'ORDER BY name, key LIMIT ?',
+                (rows[-1][0], rows[-1][1], _BATCH_SIZE)
+            )
+
+    def import_records(self, records: Iterable[Data]) -> int:
+        """Write records as they are, replacing stored ones. Records of a table
+        are written in a single transaction. Returns number of written
+        records."""
+        rows: Dict[DataType, List[Tuple]] = {x: [] for x in DataType}
+        for data in records:
+            if data.data_type() == DataType.BOT:
+                rows[DataType.BOT].append((self._encode(data),))
+            else:
+                rows[data.data_type()].append((data.id, data.name_id, self._encode(data)))
+
+        for data_type, args in rows.items():
+            if not args:
+                continue
+            if data_type == DataType.BOT:
+                self._executemany(_UPSERT_BOT, args)
+            else:
+                self._executemany(_UPSERT_RECORD.format(table=data_type.value), args)
+        return sum(len(x) for x in rows.values())
+
+    def remove_records(self, data_type: DataType, ids: Iterable[int]) -> int:
+        """Remove stored records of data type by IDs in a single transaction.
+        Returns number of removed records."""
+        try:
+            with self._lock, self._conn:
+                cursor = self._conn.executemany(
+                    f'DELETE FROM {data_type.value} WHERE id = ?', ((x,) for x in ids)
+                )
+                return cursor.rowcount
+        except sqlite3.Error as exc:
+            raise PersistenceError(f'Database error: {exc}') from exc
+
+    def import_conversations(self, conversations: Iterable[Tuple[str, Tuple, Any]]) -> None:
+        """Replace stored conversation states."""
+        rows = (
+            (name, self._encode_key(key), self._encode(state))
+            for name, key, state in conversations
+        )
+        try:
+            with self._lock, self._conn:
+                self._conn.execute('DELETE FROM conversations')
+                self._conn.executemany(_UPSERT_CONV, rows)
+        except sqlite3.Error as exc:
+            raise PersistenceError(f'Database error: {exc}') from exc
+        self._conversations = None
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Data versions tracking module."""
+
+import threading
+
+from typing import (
+    Dict,
+    Optional,
+    Tuple
+)
+
+from polydating_bot import (
+    MissingDataError
+)
+from polydating_bot.data import (
+    Data,
+    DataType
+)
+
+class VersionTracker:
+    """Tracks the last seen version of every data record to detect changes
+    with a single integer comparison. Loaded records have zero version, any
+    new or changed record has a bigger one."""
+    def __init__(self):
+        self._versions: Dict[Tuple[DataType, Optional[int]], Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def changes(
+        self, data_type: DataType, var_id: Optional[int], data: Dict
+    ) -> Tuple[bool, bool]:
+        """Check versions of the record and of its detached sections and
+        remember them. Returns whether each of them is changed."""
+        try:
+            versions = Data.from_dict(data).versions()
+        except MissingDataError:
+            return (False, False)
+
+        key = (data_type, var_id)
+        with self._lock:
+            old = self._versions.get(key, (0, 0))
+            if old == versions:
+                return (False, False)
+            self._versions[key] = versions
+        return (old[0] != versions[0], old[1] != versions[1])
+
+    def changed(self, data_type: DataType, var_id: Optional[int], data: Dict) -> bool:
+        """Check record version and remember it if changed."""
+        return any(self.changes(data_type, var_id, data))
+
+    def forget(self, data_type: DataType, var_id: Optional[int]) -> None:
+        """Forget record version, e.g. when it is reloaded from persistence."""
+        with self._lock:
+            self._versions.pop((data_type, var_id), None)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Lazy, bounded working set of persistence data."""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+
+from collections import (
+    OrderedDict,
+    defaultdict
+)
+from contextlib import (
+    contextmanager
+)
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional
+)
+
+logger = logging.getLogger(__name__)
+
+class WorkingSet(defaultdict):
+    """Dictionary of data records which are loaded on first access.
+
+    Only IDs of known records are kept in memory at startup; a record is
+    loaded with 'loader' callback once it is requested by ID. If 'capacity'
+    is set, least recently used records above it are dropped after 'evict'
+    callback has been called for them, e.g. to write changed state.
+
+    Records accessed within 'pinned()' block are never evicted till the block
+    is left: a handler keeps record it got till the update is processed, and
+    a record reloaded meanwhile would be a separate copy losing its changes.
+
+    Iteration, 'len()' and 'keys()' cover loaded records only.
+    """
+    def __init__(
+        self,
+        loader: Callable[[int], Optional[Dict]],
+        evict: Callable[[int, Dict], None],
+        known: Iterable[int] = (),
+        capacity: int = 0,
+    ):
+        super().__init__(dict)
+        self._loader = loader
+        self._evict = evict
+        self._known = set(known)
+        self._capacity = capacity
+        self._lru: OrderedDict = OrderedDict()
+        self._pins: Dict[int, int] = {}
+        self._local = threading.local()
+        self._lock = threading.RLock()
+
+    def __copy__(self):
+        # Working set is shared, never copied: copies would miss lazy records
+        raise TypeError('WorkingSet can not be copied.')
+
+    copy = __copy__
+
+    def __reduce__(self):
+        raise TypeError('WorkingSet can not be pickled.')
+
+    def __missing__(self, key: int) -> Dict:
+        with self._lock:
+            if key in self._known:
+                value = self._loader(key)
+                if value is not None:
+                    dict.__setitem__(self, key, value)
+                    return value
+            return super().__missing__(key)
+
+    def __getitem__(self, key: int) -> Dict:
+        with self._lock:
+            value = super().__getitem__(key)
+            self._touch(key)
+            return value
+
+    def __setitem__(self, key: int, value: Dict) -> None:
+        with self._lock:
+            super().__setitem__(key, value)
+            self._touch(key)
+
+    def __delitem__(self, key: int) -> None:
+        with self._lock:
+            super().__delitem__(key)
+            self._known.discard(key)
+            self._lru.pop(key, None)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._known or super().__contains__(key)
+
+    @contextmanager
+    def pinned(self) -> Iterator[None]:
+        """Keep records accessed by the current thread within the block loaded,
+        e.g. while an update is processed. Nested blocks pin nothing more."""
+        if getattr(self._local, 'keys', None) is not None:
+            yield
+            return
+
+        self._local.keys = set()
+        try:
+            yield
+        finally:
+            keys, self._local.keys = self._local.keys, None
+            with self._lock:
+                for key in keys:
+                    self._pins[key] -= 1
+                    if not self._pins[key]:
+                        del self._pins[key]
+                self._trim()
+
+    def _touch(self, key: int) -> None:
+        self._known.add(key)
+        self._lru[key] = None
+        self._lru.move_to_end(key)
+
+        keys = getattr(self._local, 'keys', None)
+        if keys is not None and key not in keys:
+            keys.add(key)
+            self._pins[key] = self._pins.get(key, 0) + 1
+        self._trim()
+
+    def _trim(self) -> None:
+        if not self._capacity or len(self._lru) <= self._capacity:
+            return
+        # Pinned records stay in place, the oldest unpinned ones are evicted
+        excess = len(self._lru) - self._capacity
+        for old_key in list(itertools.islice(
+                (x for x in self._lru if x not in self._pins), excess)):
+            try:
+                self._evict(old_key, dict.get(self, old_key, {}))
+            except Exception: # pylint: disable=W0703
+                # Keep record in memory: dropping it would lose its state
+                logger.exception(f'Could not evict record: {old_key}')
+                break
+            del self._lru[old_key]
+            dict.pop(self, old_key, None)
+            logger.debug(f'Record evicted: {old_key}')
+
+    @property
+    def known(self) -> int:
+        """Number of known records including not loaded ones."""
+        return len(self._known)
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of loaded records. Zero for no limit."""
+        return self._capacity
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Bounded, coalescing write queue served by a dedicated writer thread."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+from collections import (
+    OrderedDict
+)
+from contextlib import (
+    nullcontext
+)
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Hashable,
+    Optional
+)
+
+from polydating_bot import (
+    PersistenceError
+)
+
+logger = logging.getLogger(__name__)
+
+class WriteQueue:
+    """Queue of records to write by a dedicated thread.
+
+    Records are keyed: a record put while another one with the same key is
+    still queued is merged into it with 'merge(new, old)' callback and
+    keeps its place in the queue. At most 'maxsize' records are queued: 'put'
+    of a new key blocks until the writer makes room for it.
+
+    The writer takes records in order and passes them to 'write(key, item)'
+    callback holding 'lock' (if any), so writes can be serialized with other
+    writers of the same records. A failed record is merged back at the end
+    of the queue, so it does not hold other records back. The writer pauses
+    after a failure: for 'retry_interval' seconds, doubled on every next
+    failure in a row up to 'max_retry_interval'.
+    """
+    def __init__(
+        self,
+        write: Callable[[Hashable, Any], None],
+        maxsize: int,
+        merge: Callable[[Any, Any], Any] = lambda new, old: new,
+        lock: Optional[ContextManager] = None,
+        retry_interval: float = 1.0,
+        max_retry_interval: float = 60.0,
+    ):
+        if maxsize <= 0:
+            raise ValueError('Write queue requires positive size.')
+        self._write = write
+        self._maxsize = maxsize
+        self._merge = merge
+        self._lock = lock or nullcontext()
+        self._retry_interval = retry_interval
+        self._max_retry_interval = max_retry_interval
+        # Failures in a row
+        self._streak: int = 0
+
+        self._pending: OrderedDict = OrderedDict()
+        self._busy: bool = False
+        self._cond = threading.Condition()
+
+        self._max_depth: int = 0
+        self._writes: int = 0
+        self._failures: int = 0
+        self._coalesced: int = 0
+        self._blocked: int = 0
+        self._latency_total: float = 0.0
+        self._latency_max: float = 0.0
+
+        self._thread = threading.Thread(target=self._run, name='WriteQueue', daemon=True)
+        self._thread.start()
+
+    def put(self, key: Hashable, item: Any, retry: bool = False) -> None:
+        """Queue record; blocks while the queue is full. A record to 'retry',
+        i.e. taken from the queue before, never blocks and never overrides
+        a newer queued one."""
+        with self._cond:
+            if key in self._pending:
+                if retry:
+                    self._pending[key] = self._merge(self._pending[key], item)
+                else:
+                    self._pending[key] = self._merge(item, self._pending[key])
+                self._coalesced += 1
+                return
+
+            if not retry and len(self._pending) >= self._maxsize:
+                self._blocked += 1
+                self._cond.wait_for(lambda: len(self._pending) < self._maxsize)
+                # Record could be queued by another producer meanwhile
+                if key in self._pending:
+                    self._pending[key] = self._merge(item, self._pending[key])
+                    self._coalesced += 1
+                    return
+
+            self._pending[key] = item
+            self._max_depth = max(self._max_depth, len(self._pending))
+            self._cond.notify_all()
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Remove queued record, e.g. to write it right away. Must be called
+        holding the writer lock not to race with the record being written."""
+        with self._cond:
+            item = self._pending.pop(key, None)
+            self._cond.notify_all()
+            return item
+
+    def drain(self) -> Dict[Hashable, Any]:
+        """Remove and return all queued records, e.g. to write them right away.
+        Must be called holding the writer lock."""
+        with self._cond:
+            pending = dict(self._pending)
+            self._pending.clear()
+            self._cond.notify_all()
+            return pending
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait for all queued records to be written or failed once. Returns
+        'False' on timeout."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._pending and not self._busy, timeout
+            )
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+
+            failed = False
+            with self._lock:
+                with self._cond:
+                    if not self._pending:
+                        continue
+                    key, item = self._pending.popitem(last=False)
+                    self._busy = True
+                    self._cond.notify_all()
+
+                start = time.monotonic()
+                try:
+                    self._write(key, item)
+                except PersistenceError as exc:
+                    logger.error(f'Queued write failed: {key}: {exc}')
+                    failed = True
+                except Exception: # pylint: disable=W0703
+                    # Writer thread must survive any error, or 'put' blocks forever
+                    logger.exception(f'Queued write failed: {key}')
+                    failed = True
+                latency = time.monotonic() - start
+
+            with self._cond:
+                self._busy = False
+                if failed:
+                    # Newer record queued meanwhile wins over the failed one
+                    newer = self._pending.pop(key, None)
+                    self._pending[key] = self._merge(newer, item) if newer else item
+                    self._failures += 1
+                    self._streak += 1
+                else:
+                    self._streak = 0
+                    self._writes += 1
+                    self._latency_total += latency
+                    self._latency_max = max(self._latency_max, latency)
+                self._cond.notify_all()
+
+            if failed:
+                delay = min(
+                    self._retry_interval * 2 ** (self._streak - 1),
+                    self._max_retry_interval
+                )
+                logger.warning(
+                    f'Write queue paused for {delay:.1f}s: {self._streak} failures in a row'
+                )
+                time.sleep(delay)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Queue metrics: current and maximum depth, written, failed and
+        coalesced records, blocked puts and write latency (ms)."""
+        with self._cond:
+            writes = self._writes
+            return {
+                'depth': len(self._pending),
+                'max_depth': self._max_depth,
+                'writes': writes,
+                'failures': self._failures,
+                'coalesced': self._coalesced,
+                'blocked': self._blocked,
+                'latency_avg_ms': self._latency_total / writes * 1000 if writes else 0.0,
+                'latency_max_ms': self._latency_max * 1000,
+            }
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""YAML loader and dumper selection module."""
+
+import logging
+
+from typing import (
+    Any,
+    IO,
+    Optional
+)
+
+import yaml
+
+from polydating_bot.data import (
+    register_yaml_types
+)
+
+logger = logging.getLogger(__name__)
+
+_LOADER = yaml.Loader
+_DUMPER = yaml.Dumper
+_MAX_WIDTH = 2 ** 31 - 1
+
+# Data tags are registered explicitly: C{Loader,Dumper} do not inherit
+# 'yaml_tag' registration from YAMLObject
+register_yaml_types(yaml.Loader, yaml.Dumper)
+if yaml.__with_libyaml__:
+    register_yaml_types(yaml.CLoader, yaml.CDumper)
+
+def use_libyaml(enable: bool = True) -> bool:
+    """Select libyaml based loader and dumper if available. Returns 'True' if
+    C implementation is used."""
+    global _LOADER, _DUMPER # pylint: disable=W0603
+
+    if enable and not yaml.__with_libyaml__:
+        logger.warning('libyaml is not available; using pure Python YAML.')
+        enable = False
+
+    if enable:
+        _LOADER, _DUMPER = yaml.CLoader, yaml.CDumper
+    else:
+        _LOADER, _DUMPER = yaml.Loader, yaml.Dumper
+    logger.info(f'YAML implementation: {_LOADER.__name__}, {_DUMPER.__name__}')
+    return enable
+
+def load(stream: Any) -> Any:
+    """Load YAML document with selected loader."""
+    return yaml.load(stream, Loader=_LOADER)
+
+def dump(data: Any, stream: Optional[IO] = None) -> Any:
+    """Dump YAML document with selected dumper."""
+    return yaml.dump(data, stream, Dumper=_DUMPER)
+
+def dump_line(data: Any) -> str:
+    """Dump YAML document as a single flow style line."""
+    # Double quoted scalars escape line breaks, so the document never spans lines
+    return yaml.dump(
+        data, Dumper=_DUMPER, default_flow_style=True, default_style='"', width=_MAX_WIDTH
+    )
@@ -2,30 +2,39 @@
 # pylint: disable=R0913,C0103
 """Custom persistence module."""
 
+from __future__ import annotations
+
 import os
 import logging
+import shutil
+import threading
+import time
 
+from functools import (
+    partial
+)
 from collections import (
     defaultdict
 )
-from copy import (
-    deepcopy
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor
 )
 from typing import (
     Any,
+    Callable,
     DefaultDict,
     Dict,
+    Iterable,
+    Iterator,
+    List,
     Optional,
+    Set,
     Tuple
 )
 
 import yaml
 
-# Do not import C{Dumper,Loader} as they fail to inherit 'yaml_tag' from YAMLObject
-from yaml import (
-    Loader,
-    Dumper
-)
 from telegram.ext import (
     BasePersistence
 )
@@ -38,15 +47,148 @@ from polydating_bot import (
 )
 from polydating_bot.data import (
     Data,
-    DataType
+    DataType,
+    Form,
+    FormStatus
+)
+from polydating_bot.store.atomicfile import (
+    AtomicWriter,
+    Durability,
+    remove_stale
+)
+from polydating_bot.store.binarycodec import (
+    Compression
+)
+from polydating_bot.store import (
+    binarycodec,
+    yamlcodec
+)
+from polydating_bot.store.journal import (
+    ConversationJournal
+)
+from polydating_bot.store.layout import (
+    RECORD_TYPES,
+    iter_record_paths,
+    migrate_layout,
+    record_directories,
+    record_mtime
+)
+from polydating_bot.store.versions import (
+    VersionTracker
+)
+from polydating_bot.store.workingset import (
+    WorkingSet
+)
+from polydating_bot.store.writequeue import (
+    WriteQueue
 )
 
 logger = logging.getLogger(__name__)
 
+# Directory, data record and detached state of a record to write
+_DirtyEntry = Tuple[str, Optional[Dict], Optional[Dict]]
+
+class _Flusher(threading.Thread):
+    """Background thread writing dirty records of the persistence. After a
+    failure the interval is doubled on every next failure in a row up to
+    'max_interval'."""
+    def __init__(self, persistence: YamlPersistence, interval: float, max_interval: float = 60.0):
+        super().__init__(name='YamlPersistenceFlusher', daemon=True)
+        self._persistence = persistence
+        self._interval = interval
+        self._max_interval = max(interval, max_interval)
+        self._event = threading.Event()
+        # Failures in a row
+        self._streak: int = 0
+
+    def run(self) -> None:
+        while True:
+            interval = self._interval
+            if self._streak:
+                interval = min(self._interval * 2 ** self._streak, self._max_interval)
+            self._event.wait(interval)
+            self._event.clear()
+            try:
+                self._persistence.write_dirty()
+                self._streak = 0
+            except PersistenceError as exc:
+                self._streak += 1
+                logger.error(f'Background flush failed: {exc}')
+            except Exception: # pylint: disable=W0703
+                # Thread must survive any error not to stop writes for good
+                self._streak += 1
+                logger.exception('Background flush failed')
+
+    def wake(self) -> None:
+        """Write dirty records without waiting for the interval to expire."""
+        self._event.set()
+
 class YamlPersistence(BasePersistence):
-    """Custom persistence class."""
+    """Custom persistence class.
+
+    Records are written in one of four modes:
+      * synchronously on every update (default);
+      * write-behind: if 'flush_interval' (ms) is set, updated records are
+        marked dirty and written by a background thread every 'flush_interval'
+        ms or as soon as 'flush_changes' updates are collected;
+      * write queue: if 'write_queue' is set, updated records are written by
+        a dedicated writer thread as soon as possible, see WriteQueue; at most
+        'write_queue' records are queued, updates wait for the writer above;
+      * on flush only: if 'on_flush' is set, dirty records are written on
+        'flush()' call.
+    In any mode 'flush()' writes only records which are still dirty.
+
+    Files are replaced atomically; 'durability' and 'commit_interval' (ms)
+    select fsync policy, see AtomicWriter. Conversation journal is committed
+    together with files.
+
+    Data directories are parsed by a pool of 'load_workers' threads (or
+    processes if 'load_processes' is set) at startup.
+
+    If 'lazy' is set, only a compact users manifest (ID to directory, status
+    and username) is read at startup. User data is loaded on first access and
+    if 'cache_size' is set, idle users above it are written (if dirty) and
+    dropped from memory.
+
+    Conversation states are appended to a journal next to 'conv.yaml' right
+    away in any mode; the journal is compacted into 'conv.yaml' in background
+    once it is 'journal_ratio' times bigger, see ConversationJournal.
+
+    Users and chats are stored by ID in directories sharded by ID hash, see
+    Data.directory; legacy '{id}_{name_id}' directories are migrated on first
+    load. 'names.yaml' index of every data type maps IDs to usernames/titles.
+    Indexes (names and manifest) are written along with dirty records by the
+    flusher or 'flush()' only; manifest entries of records written after it
+    are loaded again at startup.
+
+    Detached sections of data (e.g. navigation state of users) are stored in
+    'nav.yaml' next to 'data.yaml' and override the values of the latter on
+    load, so changes of them do not rewrite the whole record.
+
+    If 'binary' is set, data records, detached sections and manifest are
+    stored with the binary codec ('*.bin' files, optionally compressed with
+    'compression') instead of YAML. Files of the other format are still read
+    if a record has no file of the selected one; see 'convert' module to
+    convert the whole directory.
+
+    Records can be streamed out of and into the store one at a time, see
+    'iter_records' and 'import_records' and 'export' module.
+
+    If 'cleanup' is set, temporary files left by an interrupted run are
+    removed at start. Only the store owner may set it: files being written by
+    another process, e.g. the bot while its store is exported, are removed
+    as well.
+
+    Loaded data is handed over to the dispatcher without copies and is not
+    kept by persistence: changes are detected by data versions, and only
+    changed records are copied until they are written.
+    """
     _DATA_FILENAME = "data.yaml"
     _CONV_FILENAME = "conv.yaml"
+    _NAV_FILENAME = "nav.yaml"
+    _MANIFEST_FILENAME = "manifest.yaml"
+    _NAMES_FILENAME = "names.yaml"
+    _BINARY_SUFFIX = ".bin"
 
     def __init__(
         self,
@@ -55,6 +197,19 @@ class YamlPersistence(BasePersistence):
         store_chat_data: bool = True,
         store_bot_data: bool = True,
         on_flush: bool = False,
+        flush_interval: int = 0,
+        flush_changes: int = 0,
+        durability: Durability = Durability.NONE,
+        commit_interval: int = 0,
+        load_workers: int = 0,
+        load_processes: bool = False,
+        lazy: bool = False,
+        cache_size: int = 0,
+        journal_ratio: float = 4.0,
+        binary: bool = False,
+        compression: Compression = Compression.NONE,
+        write_queue: int = 0,
+        cleanup: bool = False,
     ):
         super().__init__(
             store_user_data=store_user_data,
@@ -63,17 +218,68 @@ class YamlPersistence(BasePersistence):
         )
         self._directory = directory
         self._on_flush = on_flush
-        self._user_data: Optional[DefaultDict[int, Dict]] = None
-        self._chat_data: Optional[DefaultDict[int, Dict]] = None
-        self._bot_data: Optional[Dict] = None
+        self._binary = binary
+        self._compression = compression
+        if cleanup:
+            # Writes interrupted by previous run are never committed
+            remove_stale(directory)
+        self._load_workers = load_workers
+        self._load_processes = load_processes
+        self._load_stats: Dict[str, Tuple[int, float]] = {}
         self._conversations: Optional[Dict[str, Dict[Tuple, Any]]] = None
-
-    @staticmethod
-    def _load_file(filename: str, default: Any = None) -> Any:
+        self._journal = ConversationJournal(
+            os.path.join(directory, DataType.BOT.value, self._CONV_FILENAME),
+            durability,
+            journal_ratio
+        )
+        # Journal is made durable together with data files in any mode
+        self._writer = AtomicWriter(durability, commit_interval, self._journal.commit)
+
+        self._lazy = lazy
+        self._cache_size = cache_size
+        self._working_set: Optional[WorkingSet] = None
+        self._manifest: Dict[int, List] = {}
+        self._manifest_dirty: bool = False
+        self._migrated: bool = False
+        self._names: Dict[DataType, Dict[int, Optional[str]]] = {x: {} for x in RECORD_TYPES}
+        self._names_dirty: Set[DataType] = set()
+
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._versions = VersionTracker()
+        self._dirty: Dict[DataType, Dict[Optional[int], _DirtyEntry]] = {
+            x: {} for x in DataType
+        }
+        self._changes: int = 0
+        self._flush_changes = flush_changes
+
+        self._queue: Optional[WriteQueue] = None
+        self._flusher: Optional[_Flusher] = None
+        if write_queue and not on_flush:
+            self._queue = WriteQueue(
+                self._write_queued,
+                write_queue,
+                self._merge_entries,
+                self._write_lock
+            )
+        elif flush_interval and not on_flush:
+            self._flusher = _Flusher(self, flush_interval / 1000)
+            self._flusher.start()
+
+    @classmethod
+    def _binary_path(cls, filename: str) -> str:
+        return os.path.splitext(filename)[0] + cls._BINARY_SUFFIX
+
+    @classmethod
+    def _load_file(cls, filename: str, default: Any = None) -> Any:
         try:
-            with open(filename, "r") as f:
-                data = yaml.load(f, Loader=Loader)
-                logger.debug(f'Loaded file successfully: {filename}')
+            if filename.endswith(cls._BINARY_SUFFIX):
+                with open(filename, "rb") as f:
+                    data = binarycodec.load(f)
+            else:
+                with open(filename, "r") as f:
+                    data = yamlcodec.load(f)
+            logger.debug(f'Loaded file successfully: {filename}')
         except OSError:
             logger.warning(f'File \'{filename}\' is missing.')
             data = default
@@ -87,127 +293,584 @@ class YamlPersistence(BasePersistence):
         """Load YAML file."""
         return YamlPersistence._load_file(filename, default)
 
+    @classmethod
+    def _load_stored(cls, filename: str, binary: bool, default: Any = None) -> Any:
+        """Load file of the selected format or of the other one if missing.
+        'filename' is a YAML file name."""
+        paths = [filename, cls._binary_path(filename)]
+        if binary:
+            paths.reverse()
+        if not os.path.exists(paths[0]) and os.path.exists(paths[1]):
+            paths.reverse()
+        return cls._load_file(paths[0], default)
+
+    @classmethod
+    def _load_record_directory(cls, path: str, binary: bool = False) -> Optional[Data]:
+        data_item: Data = cls._load_stored(os.path.join(path, cls._DATA_FILENAME), binary)
+        if not data_item or not data_item.detached_mapping():
+            return data_item
+
+        nav_path = os.path.join(path, cls._NAV_FILENAME)
+        if os.path.exists(nav_path) or os.path.exists(cls._binary_path(nav_path)):
+            data_item.restore_detached(cls._load_stored(nav_path, binary, {}) or {})
+        return data_item
+
+    def _load_files(
+        self,
+        paths: List[str],
+        loader: Callable[[str], Any] = None
+    ) -> Iterable[Any]:
+        loader = loader or self._load_file
+        if self._load_workers <= 1 or len(paths) <= 1:
+            return map(loader, paths)
+
+        if self._load_processes:
+            executor = ProcessPoolExecutor(max_workers=self._load_workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=self._load_workers)
+        with executor:
+            # Results are in order of paths regardless of completion order
+            return list(executor.map(loader, paths, chunksize=64))
+
+    def _migrate_layout(self) -> None:
+        with self._lock:
+            if not self._migrated:
+                migrate_layout(self._directory)
+                self._migrated = True
+
     def _load_data_directory(self, data_type: str) -> Dict:
         data = defaultdict(dict)
         directory = os.path.join(self._directory, data_type)
         if not os.path.exists(directory):
             return data
 
-        logger.debug(f'Files found in \'{directory}\':')
-        for path in os.listdir(directory):
-            path = os.path.join(directory, path, self._DATA_FILENAME)
-            data_item: Data = self._load_file(path)
+        self._migrate_layout()
+        start = time.monotonic()
+        paths = [os.path.join(directory, x) for x in record_directories(directory)]
 
+        names = {}
+        loader = partial(self._load_record_directory, binary=self._binary)
+        for data_item in self._load_files(paths, loader):
+            # Record could be never committed before crash
+            if not data_item:
+                continue
             data_item.update_dict(data, data_item.id)
-
-        logger.info(f'Directory loaded successfully: {directory}')
+            data_item.index()
+            names[data_item.id] = data_item.name_id
+        self._load_names(DataType(data_type), names)
+
+        elapsed = time.monotonic() - start
+        self._load_stats[data_type] = (len(paths), elapsed)
+        logger.info(
+            f'Directory loaded successfully: {directory}: '
+            f'{len(paths)} files in {elapsed:.3f}s'
+        )
         return data
 
+    @property
+    def load_stats(self) -> Dict[str, Tuple[int, float]]:
+        """Files count and load time (s) of every loaded data directory."""
+        return dict(self._load_stats)
+
     @staticmethod
-    def _dump_file(path: str, data: Any) -> None:
+    def _manifest_entry(data: Data, dirname: str) -> List:
+        # Data may be a snapshot: its status must not change the index
+        return [dirname, data.derived_status.name, data.name_id]
+
+    @classmethod
+    def _stored_mtime(cls, filename: str) -> Optional[float]:
+        """Modification time of file of any format, 'None' if missing."""
+        times = []
+        for path in (filename, cls._binary_path(filename)):
+            try:
+                times.append(os.path.getmtime(path))
+            except OSError:
+                pass
+        return max(times, default=None)
+
+    @staticmethod
+    def _changed_since(path: str, since: Optional[float]) -> bool:
+        # Files are replaced by rename, which updates directory time
         try:
-            os.makedirs(os.path.dirname(path))
+            return since is None or os.path.getmtime(path) >= since
         except OSError:
-            pass
+            return True
+
+    def _load_manifest(self) -> Dict[int, List]:
+        directory = os.path.join(self._directory, DataType.USER.value)
+        if not os.path.exists(directory):
+            return {}
+
+        self._migrate_layout()
+        start = time.monotonic()
+        path = os.path.join(directory, self._MANIFEST_FILENAME)
+        manifest = self._load_stored(path, self._binary, {}) or {}
+
+        dirnames = set(record_directories(directory))
+
+        # Drop removed directories and load ones unknown to manifest. Manifest
+        # is written on flush only: records written since, e.g. till a crash,
+        # are loaded again
+        since = self._stored_mtime(path)
+        manifest = {
+            k: v for k, v in manifest.items()
+            if v[0] in dirnames and not self._changed_since(os.path.join(directory, v[0]), since)
+        }
+        missing = sorted(dirnames - {x[0] for x in manifest.values()})
+        paths = [os.path.join(directory, x, self._DATA_FILENAME) for x in missing]
+
+        loader = partial(self._load_stored, binary=self._binary)
+        for dirname, data_item in zip(missing, self._load_files(paths, loader)):
+            if not data_item:
+                continue
+            manifest[data_item.id] = self._manifest_entry(data_item, dirname)
+        if missing:
+            self._manifest_dirty = True
+
+        # Users are not loaded: indexes are set from manifest
+        status_index = Form.status_index()
+        for var_id, entry in manifest.items():
+            Data.index_name(DataType.USER, var_id, entry[2])
+            status_index.update(var_id, FormStatus[entry[1]])
+        self._load_names(DataType.USER, {k: v[2] for k, v in manifest.items()})
+
+        elapsed = time.monotonic() - start
+        self._load_stats[DataType.USER.value] = (len(paths), elapsed)
+        logger.info(
+            f'Manifest loaded successfully: {path}: {len(manifest)} users, '
+            f'{len(paths)} files loaded in {elapsed:.3f}s'
+        )
+        return manifest
+
+    def _write_manifest(self) -> None:
+        with self._lock:
+            if not self._manifest_dirty:
+                return
+            manifest = dict(self._manifest)
+            self._manifest_dirty = False
 
+        path = os.path.join(self._directory, DataType.USER.value, self._MANIFEST_FILENAME)
         try:
-            with open(path, 'w') as f:
-                yaml.dump(data, f, Dumper=Dumper)
-        except OSError as exc:
-            raise PersistenceError('Can\'t write file: {path}') from exc
+            self._dump_file(path, manifest)
+        except PersistenceError:
+            with self._lock:
+                self._manifest_dirty = True
+            raise
+
+    def _load_names(self, data_type: DataType, names: Dict[int, Optional[str]]) -> None:
+        """Keep names of loaded data; index file is rewritten if stale."""
+        path = os.path.join(self._directory, data_type.value, self._NAMES_FILENAME)
+        stored = self._load_stored(path, self._binary, {}) if names else {}
+        with self._lock:
+            self._names[data_type] = names
+            if stored != names:
+                self._names_dirty.add(data_type)
+
+    def _update_name(self, data: Data) -> None:
+        data_type = data.data_type()
+        if data_type not in RECORD_TYPES:
+            return
+        with self._lock:
+            names = self._names[data_type]
+            if data.id not in names or names[data.id] != data.name_id:
+                names[data.id] = data.name_id
+                self._names_dirty.add(data_type)
+
+    def _write_names(self) -> None:
+        with self._lock:
+            dirty = self._names_dirty
+            self._names_dirty = set()
+            indexes = {x: dict(self._names[x]) for x in dirty}
+
+        for data_type, names in indexes.items():
+            path = os.path.join(self._directory, data_type.value, self._NAMES_FILENAME)
+            try:
+                self._dump_file(path, names)
+            except PersistenceError:
+                with self._lock:
+                    self._names_dirty.add(data_type)
+                raise
+
+    def _write_indexes(self) -> None:
+        """Write manifest and names indexes if changed."""
+        self._write_manifest()
+        self._write_names()
+
+    def name_ids(self, data_type: DataType) -> Dict[int, Optional[str]]:
+        """Get usernames/titles index of stored users or chats by ID."""
+        with self._lock:
+            return dict(self._names.get(data_type, {}))
+
+    def _load_record(self, user_id: int) -> Optional[Dict]:
+        with self._lock:
+            entry = self._manifest.get(user_id)
+        if not entry:
+            return None
+
+        path = os.path.join(self._directory, DataType.USER.value, entry[0])
+        data_item = self._load_record_directory(path, self._binary)
+        if not data_item:
+            return None
+
+        data = {}
+        data_item.update_dict(data)
+        logger.debug(f'User data loaded: {user_id}')
+        return data
 
+    def _evict_record(self, user_id: int, data: Dict) -> None:
+        # Serialize with background flush not to drop record being written
+        with self._write_lock:
+            entry = self._dirty_entry(DataType.USER, user_id, data, snapshot=False)
+            with self._lock:
+                pending = self._dirty[DataType.USER].pop(user_id, None)
+            if self._queue:
+                pending = self._merge_entries(
+                    self._queue.pop((DataType.USER, user_id)), pending
+                )
+            entry = self._merge_entries(entry, pending)
+            # Record is reloaded with initial version
+            self._versions.forget(DataType.USER, user_id)
+
+            if entry:
+                try:
+                    self._write_entry(entry)
+                except PersistenceError:
+                    self._update_dirty(DataType.USER, user_id, entry, retry=True)
+                    raise
+
+    def insert_bot(self, obj: object) -> object:
+        # Data keeps bot instance as class attribute: nothing to insert
+        return obj
+
+    @classmethod
+    def replace_bot(cls, obj: object) -> object:
+        # Changed records are copied on update, see _update()
+        return obj
+
+    def _dump_file(self, path: str, data: Any) -> None:
+        """Write file in the selected format. 'path' is a YAML file name."""
+        if self._binary:
+            self._writer.write(
+                self._binary_path(path),
+                lambda f: binarycodec.dump(data, f, self._compression),
+                binary=True
+            )
+        else:
+            self._writer.write(path, lambda f: yamlcodec.dump(data, f))
 
     def _dump_data(self, data: Dict) -> None:
         logger.debug(f'Dumping data: {data}')
         data = Data.from_dict(data)
-        path = os.path.join(data.directory(self._directory), self._DATA_FILENAME)
-        self._dump_file(path, data)
+        directory = data.directory(self._directory)
+        self._dump_file(os.path.join(directory, self._DATA_FILENAME), data)
+        self._update_name(data)
+
+        if self._lazy and data.data_type() == DataType.USER:
+            type_dir = os.path.join(self._directory, DataType.USER.value)
+            entry = self._manifest_entry(data, os.path.relpath(directory, type_dir))
+            with self._lock:
+                if self._manifest.get(data.id) != entry:
+                    self._manifest[data.id] = entry
+                    self._manifest_dirty = True
+
+    def _dump_detached(self, directory: str, state: Dict) -> None:
+        logger.debug(f'Dumping detached state: {directory}: {state}')
+        self._dump_file(os.path.join(directory, self._NAV_FILENAME), state)
+
+    def _dirty_entry(
+        self,
+        data_type: DataType,
+        var_id: Optional[int],
+        data: Dict,
+        snapshot: bool = True
+    ) -> Optional[_DirtyEntry]:
+        """Get record parts to write if changed: data record and its detached
+        state. Data record is copied if 'snapshot' is set."""
+        changed, detached = self._versions.changes(data_type, var_id, data)
+        if not changed and not detached:
+            return None
+
+        data_item = Data.from_dict(data)
+        if changed and snapshot:
+            # Only the data object is written: it is copied alone, never walking
+            # live objects as 'replace_bot' does
+            data = {}
+            data_item.snapshot().update_dict(data)
+        return (
+            data_item.directory(self._directory),
+            data if changed else None,
+            data_item.detached_state() if detached else None,
+        )
 
-    def _load_conv(self) -> Dict:
-        path = os.path.join(self._directory, DataType.BOT.value, self._CONV_FILENAME)
-        data = self._load_file(path)
-        return data if data else {}
+    @staticmethod
+    def _merge_entries(
+        entry: Optional[_DirtyEntry],
+        older: Optional[_DirtyEntry]
+    ) -> Optional[_DirtyEntry]:
+        if not entry or not older:
+            return entry or older
+        return (
+            entry[0],
+            entry[1] if entry[1] is not None else older[1],
+            entry[2] if entry[2] is not None else older[2],
+        )
 
-    def _dump_conv(self) -> None:
-        path = os.path.join(self._directory, DataType.BOT.value, self._CONV_FILENAME)
-        self._dump_file(path, self._conversations)
+    def _write_entry(self, entry: _DirtyEntry) -> None:
+        directory, data, state = entry
+        if data is not None:
+            self._dump_data(data)
+        if state is not None:
+            self._dump_detached(directory, state)
 
     def get_chat_data(self) -> DefaultDict[int, Dict[Any, Any]]:
-        if not self._chat_data:
-            self._chat_data = self._load_data_directory(DataType.CHAT.value)
-
-        return deepcopy(self._chat_data)
+        return self._load_data_directory(DataType.CHAT.value)
 
     def update_chat_data(self, chat_id: int, data: Dict) -> None:
         logger.debug(f'Update chat data: {locals()}')
-        if self._chat_data.get(chat_id) == data:
-            return
-        self._chat_data[chat_id] = data
-
-        if not self._on_flush:
-            self._dump_data(data)
+        self._update(DataType.CHAT, chat_id, data)
 
     def get_user_data(self) -> DefaultDict[int, Dict[Any, Any]]:
-        if not self._user_data:
-            self._user_data = self._load_data_directory(DataType.USER.value)
-
-        return deepcopy(self._user_data)
+        if not self._lazy:
+            return self._load_data_directory(DataType.USER.value)
+
+        if self._working_set is None:
+            self._manifest = self._load_manifest()
+            self._working_set = WorkingSet(
+                self._load_record,
+                self._evict_record,
+                self._manifest,
+                self._cache_size
+            )
+        return self._working_set
 
     def update_user_data(self, user_id: int, data: Dict) -> None:
         logger.debug(f'Update user data: {locals()}')
-        if self._user_data.get(user_id) == data:
-            return
-        self._user_data[user_id] = data
-
-        if not self._on_flush:
-            self._dump_data(data)
+        self._update(DataType.USER, user_id, data)
 
     def get_bot_data(self) -> Dict[Any, Any]:
-        if not self._bot_data:
-            path = os.path.join(self._directory, DataType.BOT.value, self._DATA_FILENAME)
-            data = self._load_file(path)
-            self._bot_data = {}
-            if data:
-                data.update_dict(self._bot_data)
-        return deepcopy(self._bot_data)
+        path = os.path.join(self._directory, DataType.BOT.value, self._DATA_FILENAME)
+        data = self._load_stored(path, self._binary)
+        bot_data = {}
+        if data:
+            data.update_dict(bot_data)
+        return bot_data
 
     def update_bot_data(self, data: Dict) -> None:
         logger.debug(f'Update bot data: {locals()}')
-        if self._bot_data == data:
-            return
-        self._bot_data = data
-
-        logger.debug(data)
-        if not self._on_flush:
-            self._dump_data(data)
+        self._update(DataType.BOT, None, data)
 
     def get_conversations(self, name: str) -> ConversationDict:
-        if not self._conversations:
-            self._conversations = self._load_conv()
+        with self._lock:
+            if self._conversations is None:
+                self._conversations = self._journal.load()
 
-        return deepcopy(self._conversations.get(name, {}))
+            # Conversation handler updates its dictionary before persistence
+            return dict(self._conversations.get(name, {}))
 
     def update_conversation(
         self, name: str, key: Tuple[int, ...], new_state: Optional[object]
     ) -> None:
-        if not self._conversations:
-            self._conversations = {}
-        if self._conversations.setdefault(name, {}).get(key) == new_state:
+        with self._lock:
+            if self._conversations is None:
+                self._conversations = self._journal.load()
+            if self._conversations.get(name, {}).get(key) == new_state:
+                return
+        # Journal keeps conversations dictionary up to date
+        self._journal.append(name, key, new_state)
+
+    def _update(self, data_type: DataType, var_id: Optional[int], data: Dict) -> None:
+        """Write changed parts of the record or mark them dirty."""
+        sync = not self._on_flush and not self._flusher and not self._queue
+        # Record written later needs a snapshot
+        entry = self._dirty_entry(data_type, var_id, data, snapshot=not sync)
+        if not entry:
             return
-        self._conversations[name][key] = new_state
 
-        if not self._on_flush:
-            self._dump_conv()
+        if sync:
+            # Indexes hold all records: they are written on flush only
+            self._write_entry(entry)
+            return
+
+        changes = self._update_dirty(data_type, var_id, entry)
+        if self._flusher and self._flush_changes and changes >= self._flush_changes:
+            self._flusher.wake()
+
+    def _update_dirty(
+        self,
+        data_type: DataType,
+        var_id: Optional[int],
+        entry: _DirtyEntry,
+        retry: bool = False
+    ) -> int:
+        """Mark record parts dirty. Parts to 'retry' do not override ones
+        updated since."""
+        if self._queue:
+            self._queue.put((data_type, var_id), entry, retry)
+            return 0
+
+        with self._lock:
+            dirty = self._dirty[data_type]
+            if retry:
+                dirty[var_id] = self._merge_entries(dirty.get(var_id), entry)
+            else:
+                dirty[var_id] = self._merge_entries(entry, dirty.get(var_id))
+            self._changes += 1
+            return self._changes
+
+    def _write_queued(self, key: Tuple[DataType, Optional[int]], entry: _DirtyEntry) -> None:
+        logger.debug(f'Writing queued record: {key}')
+        self._write_entry(entry)
+
+    @property
+    def write_stats(self) -> Dict[str, Any]:
+        """Write queue metrics, see WriteQueue.stats. Empty if no queue is used."""
+        return self._queue.stats if self._queue else {}
+
+    def write_dirty(self) -> None:
+        """Write all records marked as dirty."""
+        with self._write_lock:
+            self._write_dirty()
+
+    def _write_dirty(self) -> None:
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = {x: {} for x in DataType}
+            self._changes = 0
+
+        # Queued records are written right away, writer waits for the lock
+        if self._queue:
+            for (data_type, var_id), entry in self._queue.drain().items():
+                dirty[data_type][var_id] = entry
+
+        error: Optional[Exception] = None
+        for data_type, records in dirty.items():
+            for var_id, entry in records.items():
+                try:
+                    self._write_entry(entry)
+                except Exception as exc: # pylint: disable=W0703
+                    # Keep record dirty to retry it on the next flush unless
+                    # it is updated already; the rest of records go on
+                    if not isinstance(exc, PersistenceError):
+                        logger.exception(f'Can\'t write record: {data_type.value}: {var_id}')
+                    error = exc
+                    self._update_dirty(data_type, var_id, entry, retry=True)
+
+        try:
+            self._write_indexes()
+        except PersistenceError as exc:
+            error = exc
+
+        if isinstance(error, PersistenceError):
+            raise error
+        if error:
+            raise PersistenceError(f'Can\'t write dirty records: {error}') from error
+        count = sum(len(x) for x in dirty.values())
+        if count:
+            logger.debug(f'Dirty records written: {count}')
 
     def flush(self) -> None:
-        for data in self._user_data.values():
-            self._dump_data(data)
+        self.write_dirty()
+        self._writer.commit()
 
-        for data in self._chat_data.values():
-            self._dump_data(data)
+    def iter_records(
+        self,
+        data_type: DataType,
+        start: Optional[str] = None,
+        since: Optional[float] = None,
+    ) -> Iterator[Tuple[Optional[str], Data]]:
+        """Iterate over stored records of data type one at a time with their
+        positions, in stable order. Iteration resumes after 'start' position;
+        if 'since' timestamp is set, only records modified after it are
+        loaded. Files are not changed, so the bot may keep running."""
+        if data_type == DataType.BOT:
+            path = os.path.join(self._directory, DataType.BOT.value, self._DATA_FILENAME)
+            data = self._load_stored(path, self._binary)
+            if data:
+                yield None, data
+            return
 
-        if self._bot_data:
-            self._dump_data(self._bot_data)
+        # Legacy directories are read in place: source store must stay intact
+        type_dir = os.path.join(self._directory, data_type.value)
+        for dirname, path in iter_record_paths(type_dir, start):
+            try:
+                if since is not None and record_mtime(path) < since:
+                    continue
+            except FileNotFoundError:
+                continue
+            data = self._load_record_directory(path, self._binary)
+            if data:
+                yield dirname, data
+
+    def iter_record_ids(self, data_type: DataType) -> Iterator[int]:
+        """Iterate over IDs of stored records of data type without loading
+        them or changing files."""
+        type_dir = os.path.join(self._directory, data_type.value)
+        for position, _ in iter_record_paths(type_dir):
+            yield int(os.path.basename(position))
 
-        if self._conversations:
-            self._dump_conv()
+    def iter_conversations(self) -> Iterator[Tuple[str, Tuple, Any]]:
+        """Iterate over stored conversation states without changing files."""
+        path = os.path.join(self._directory, DataType.BOT.value, self._CONV_FILENAME)
+        for name, states in ConversationJournal.read(path).items():
+            for key, state in states.items():
+                yield name, key, state
+
+    @classmethod
+    def _remove_stored(cls, filename: str) -> None:
+        """Remove file of both formats. 'filename' is a YAML file name."""
+        for path in (filename, cls._binary_path(filename)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                raise PersistenceError(f'Can\'t remove file: {path}') from exc
+
+    def import_records(self, records: Iterable[Data]) -> int:
+        """Write records as they are, replacing stored ones along with their
+        detached sections. Indexes are rebuilt on the next load. Returns number
+        of written records."""
+        with self._write_lock:
+            for data_type in RECORD_TYPES:
+                type_dir = os.path.join(self._directory, data_type.value)
+                self._remove_stored(os.path.join(type_dir, self._MANIFEST_FILENAME))
+                self._remove_stored(os.path.join(type_dir, self._NAMES_FILENAME))
+
+            count = 0
+            for data in records:
+                directory = data.directory(self._directory)
+                self._dump_file(os.path.join(directory, self._DATA_FILENAME), data)
+                self._remove_stored(os.path.join(directory, self._NAV_FILENAME))
+                count += 1
+            return count
+
+    def remove_records(self, data_type: DataType, ids: Iterable[int]) -> int:
+        """Remove stored records of data type by IDs along with their detached
+        sections. Indexes are rebuilt on the next load. Returns number of
+        removed records."""
+        self._migrate_layout()
+        type_dir = os.path.join(self._directory, data_type.value)
+        with self._write_lock:
+            self._remove_stored(os.path.join(type_dir, self._MANIFEST_FILENAME))
+            self._remove_stored(os.path.join(type_dir, self._NAMES_FILENAME))
+
+            count = 0
+            for var_id in ids:
+                path = os.path.join(type_dir, Data.shard(var_id), str(var_id))
+                try:
+                    shutil.rmtree(path)
+                except FileNotFoundError:
+                    continue
+                except OSError as exc:
+                    raise PersistenceError(f'Can\'t remove directory: {path}') from exc
+                count += 1
+            return count
+
+    def import_conversations(self, conversations: Iterable[Tuple[str, Tuple, Any]]) -> None:
+        """Replace stored conversation states."""
+        data: Dict[str, Dict[Tuple, Any]] = {}
+        for name, key, state in conversations:
+            data.setdefault(name, {})[tuple(key)] = state
+        with self._lock:
+            self._conversations = data
+            self._journal.replace(data)
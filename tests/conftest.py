@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Common fixtures of tests: synthetic stores from benchmarks generator."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'benchmarks'))
+
+# pylint: disable=C0413
+from polydating_bot.store import (
+    YamlPersistence
+)
+from generator import (
+    generate,
+    load_questions
+)
+from store import (
+    FakeBot
+)
+
+USERS = 10
+
+@pytest.fixture(autouse=True)
+def questions():
+    """Form questions of generated users."""
+    load_questions()
+
+@pytest.fixture
+def directory(tmp_path):
+    """Persistence directory with generated users, chats and bot data."""
+    path = str(tmp_path / 'store')
+    generate(path, USERS)
+    return path
+
+@pytest.fixture
+def open_store():
+    """Open YAML persistence bound to a fake bot; opened ones are flushed
+    at the end of test, so no background thread writes after it."""
+    opened = []
+
+    def _open(path, **kwargs):
+        persistence = YamlPersistence(directory=path, **kwargs)
+        persistence.set_bot(FakeBot())
+        opened.append(persistence)
+        return persistence
+
+    yield _open
+    for persistence in opened:
+        persistence.flush()
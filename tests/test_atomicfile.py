@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Atomic file writes tests."""
+
+import os
+import threading
+
+from unittest import (
+    mock
+)
+
+import pytest
+
+from polydating_bot import (
+    PersistenceError
+)
+from polydating_bot.store import (
+    AtomicWriter,
+    Durability
+)
+from polydating_bot.store.atomicfile import (
+    remove_stale
+)
+
+def _files(path):
+    return sorted(os.listdir(path))
+
+def test_failed_dump_removes_temporary_file(tmp_path):
+    def dump(_):
+        raise ValueError('not serializable')
+
+    with pytest.raises(ValueError):
+        AtomicWriter().write(str(tmp_path / 'data.yaml'), dump)
+    assert _files(tmp_path) == []
+
+def test_failed_commit_keeps_files_pending(tmp_path):
+    writer = AtomicWriter(Durability.GROUP_COMMIT, 60000)
+    for name in ('a', 'b'):
+        writer.write(str(tmp_path / name / 'data.yaml'), lambda f, x=name: f.write(x))
+
+    replace = os.replace
+    calls = []
+
+    def flaky_replace(src, dst):
+        calls.append(dst)
+        if len(calls) == 2:
+            raise OSError('no space left')
+        replace(src, dst)
+
+    with mock.patch('os.replace', flaky_replace):
+        with pytest.raises(PersistenceError):
+            writer.commit()
+    writer.commit()
+
+    for name in ('a', 'b'):
+        assert (tmp_path / name / 'data.yaml').read_text() == name
+        assert _files(tmp_path / name) == ['data.yaml']
+
+def test_commit_hook(tmp_path):
+    committed = threading.Event()
+    writer = AtomicWriter(Durability.GROUP_COMMIT, 10, committed.set)
+    writer.write(str(tmp_path / 'data.yaml'), lambda f: f.write('data'))
+    assert committed.wait(5)
+    assert (tmp_path / 'data.yaml').read_text() == 'data'
+
+def test_remove_stale(tmp_path):
+    (tmp_path / 'user').mkdir()
+    (tmp_path / 'user' / '.data.yaml.123.0.tmp').write_text('partial')
+    (tmp_path / 'user' / 'data.yaml').write_text('data')
+    assert remove_stale(str(tmp_path)) == 1
+    assert _files(tmp_path / 'user') == ['data.yaml']
+
+def test_missing_file_does_not_block_commit(tmp_path):
+    writer = AtomicWriter(Durability.GROUP_COMMIT, 60000)
+    writer.write(str(tmp_path / 'a.yaml'), lambda f: f.write('a'))
+    for name in _files(tmp_path):
+        os.remove(tmp_path / name)
+    writer.write(str(tmp_path / 'b.yaml'), lambda f: f.write('b'))
+
+    writer.commit()
+    assert _files(tmp_path) == ['b.yaml']
+    writer.commit()
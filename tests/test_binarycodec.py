@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Binary record codec tests."""
+
+import io
+import os
+
+import pytest
+
+from polydating_bot import (
+    PersistenceError
+)
+from polydating_bot.data import (
+    Data,
+    DataType
+)
+from polydating_bot.store import (
+    Compression,
+    binarycodec,
+    yamlcodec
+)
+
+@pytest.mark.parametrize('compression', list(Compression))
+def test_binary_round_trip(directory, compression):
+    path = os.path.join(directory, DataType.USER.value, Data.shard(1), '1', 'data.yaml')
+    with open(path, 'r') as f:
+        data = yamlcodec.load(f)
+
+    stream = io.BytesIO()
+    binarycodec.dump(data, stream, compression)
+    stream.seek(0)
+    loaded = binarycodec.load(stream)
+    assert type(loaded) is type(data)
+    assert loaded.id == data.id
+    assert type(loaded).to_mapping(loaded) == type(data).to_mapping(data)
+
+def test_binary_version_mismatch():
+    record = bytearray(binarycodec.dumps({'key': 'value'}))
+    record[len(binarycodec.MAGIC)] = binarycodec.VERSION + 1
+    with pytest.raises(PersistenceError, match='unsupported version'):
+        binarycodec.loads(bytes(record))
+
+def test_binary_bad_header():
+    with pytest.raises(PersistenceError, match='bad header'):
+        binarycodec.loads(b'not a record')
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Chat cache tests."""
+
+import pytest
+
+from telegram import (
+    Chat
+)
+from telegram.error import (
+    BadRequest,
+    NetworkError,
+    TelegramError,
+    Unauthorized
+)
+
+from polydating_bot.data import (
+    ChatCache
+)
+
+class _Bot:
+    """Bot answering 'getChat' with a chat or raising the given error."""
+    def __init__(self, error: TelegramError = None):
+        self.error = error
+        self.requests = 0
+
+    def getChat(self, chat_id): # pylint: disable=C0103
+        self.requests += 1
+        if self.error:
+            raise self.error
+        return Chat(int(chat_id), Chat.PRIVATE, username=f'user{chat_id}')
+
+def _get_twice(cache, bot, chat_id):
+    for _ in range(2):
+        try:
+            cache.get(bot, chat_id)
+        except TelegramError:
+            pass
+    return bot.requests
+
+def test_chats_are_cached():
+    cache = ChatCache()
+    bot = _Bot()
+    assert cache.get(bot, 5).username == 'user5'
+    assert _get_twice(cache, bot, 5) == 1
+    assert cache.stats == {'size': 1, 'hits': 2, 'misses': 1}
+
+def test_renamed_chat_is_dropped():
+    cache = ChatCache()
+    bot = _Bot()
+    cache.get(bot, 5)
+    cache.observe(Chat(5, Chat.PRIVATE, username='renamed'))
+    cache.get(bot, 5)
+    assert bot.requests == 2
+
+def test_chat_not_found_is_cached():
+    cache = ChatCache()
+    bot = _Bot(BadRequest('Bad Request: chat not found'))
+    with pytest.raises(BadRequest):
+        cache.get(bot, 5)
+    assert _get_twice(cache, bot, 5) == 1
+
+@pytest.mark.parametrize('error', [
+    Unauthorized('Forbidden: bot was blocked by the user'),
+    BadRequest('Bad Request: wrong file identifier'),
+    NetworkError('Connection reset'),
+])
+def test_other_errors_are_not_cached(error):
+    cache = ChatCache()
+    bot = _Bot(error)
+    with pytest.raises(type(error)):
+        cache.get(bot, 5)
+    assert _get_twice(cache, bot, 5) == 3
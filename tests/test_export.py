@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Export tests."""
+
+import os
+import shutil
+
+import pytest
+
+from polydating_bot.data import (
+    Data,
+    DataType
+)
+from polydating_bot.export import (
+    export
+)
+from polydating_bot.store import (
+    AtomicWriter,
+    Durability,
+    SqlitePersistence,
+    YamlPersistence
+)
+
+def _open(path):
+    if path.endswith('.db'):
+        return SqlitePersistence(filename=path)
+    return YamlPersistence(directory=path)
+
+@pytest.mark.parametrize('target', ['target', 'target.db'])
+def test_delta_pass_removes_missing_records(directory, tmp_path, target):
+    target = str(tmp_path / target)
+    export(directory, target)
+    ids = sorted(_open(directory).iter_record_ids(DataType.USER))
+    assert sorted(_open(target).iter_record_ids(DataType.USER)) == ids
+
+    type_dir = os.path.join(directory, DataType.USER.value)
+    shutil.rmtree(os.path.join(type_dir, Data.shard(5), '5'))
+    export(directory, target)
+    assert sorted(_open(target).iter_record_ids(DataType.USER)) == [x for x in ids if x != 5]
+
+def test_export_leaves_source_intact(directory, tmp_path):
+    type_dir = os.path.join(directory, DataType.USER.value)
+    shutil.move(os.path.join(type_dir, Data.shard(3), '3'), os.path.join(type_dir, '3_user3'))
+    before = sorted(os.listdir(type_dir))
+
+    target = str(tmp_path / 'target.db')
+    export(directory, target)
+    assert sorted(os.listdir(type_dir)) == before
+    assert 3 in set(_open(target).iter_record_ids(DataType.USER))
+
+def test_export_keeps_files_being_written(directory, tmp_path):
+    # The bot keeps running: its files wait for group commit meanwhile
+    writer = AtomicWriter(Durability.GROUP_COMMIT, 60000)
+    path = os.path.join(directory, DataType.BOT.value, 'data.yaml')
+    writer.write(path, lambda f: f.write('{}'))
+
+    export(directory, str(tmp_path / 'target'))
+    writer.commit()
+    with open(path, 'r') as f:
+        assert f.read() == '{}'
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Dating form tests."""
+
+import random
+
+import pytest
+
+from polydating_bot import (
+    MissingDataError
+)
+from polydating_bot.data import (
+    Coverage,
+    Data,
+    Form,
+    FormStatus,
+    StatusIndex,
+    UserData
+)
+from polydating_bot.data.dating import (
+    _Answer,
+    _AnswerList,
+    _Question
+)
+from polydating_bot.store import (
+    YamlPersistence,
+    yamlcodec
+)
+
+from generator import (
+    CUSTOM_QUESTIONS,
+    make_user
+)
+from store import (
+    FakeBot
+)
+
+@pytest.fixture
+def users():
+    """Users with random answers and statuses by ID."""
+    rng = random.Random(1)
+    return {x: make_user(x, rng) for x in range(1, 51)}
+
+def test_coverage_queries(users):
+    coverage = Coverage(users)
+    complete = [x for x, y in users.items() if not y.required_left]
+    assert len(coverage) == len(users)
+    assert coverage.complete() == complete
+    assert sorted(coverage.incomplete() + complete) == sorted(users)
+
+    assert coverage.answered(['soundtrack']) == [
+        x for x, y in users.items() if 'soundtrack' in y.answers
+    ]
+    assert coverage.missing(['name', 'photo']) == [
+        x for x, y in users.items() if 'name' not in y.answers or 'photo' not in y.answers
+    ]
+    assert coverage.missing_counts() == {
+        x: sum(1 for y in users.values() if x not in y.answers) for x in Form.required_tags()
+    }
+
+def test_coverage_unknown_question(users):
+    with pytest.raises(MissingDataError):
+        Coverage(users).missing(['no_such_question'])
+
+def test_update_statuses(users):
+    # Statuses were not derived from answers yet
+    incomplete = set(Coverage(users).incomplete())
+    expected = sum(
+        1 for x, y in users.items()
+        if (x in incomplete) != (y._status == FormStatus.BLOCKING.name) # pylint: disable=W0212
+    )
+    assert Form.update_statuses(users.values()) == expected
+    assert Form.update_statuses(users.values()) == 0
+    for var_id, user in users.items():
+        assert (user.status == FormStatus.BLOCKING) == (var_id in incomplete)
+
+def test_writing_form_keeps_status_index(users):
+    user = next(x for x in users.values() if not x.required_left)
+    user._status = FormStatus.BLOCKING.name # pylint: disable=W0212
+    version = user.version
+    Form.status_index().update(user.id, FormStatus.PENDING)
+
+    # Older snapshot is written after the form was sent
+    entry = YamlPersistence._manifest_entry(user, 'dir') # pylint: disable=W0212
+    yamlcodec.dump(user)
+    assert entry[1] == FormStatus.IDLE.name
+    assert Form.status_index().status(user.id) == FormStatus.PENDING
+    assert user.version == version
+
+def test_status_index():
+    index = StatusIndex()
+    for var_id, status in [(1, FormStatus.PENDING), (2, FormStatus.IDLE), (3, FormStatus.PENDING)]:
+        index.update(var_id, status)
+    assert index.ids(FormStatus.PENDING) == [1, 3]
+    assert index.count(FormStatus.IDLE) == 1
+
+    index.update(1, FormStatus.PUBLISHED)
+    index.update(1, FormStatus.PENDING)
+    assert index.ids(FormStatus.PENDING) == [3, 1]
+    assert index.status(1) == FormStatus.PENDING
+
+    index.remove(3)
+    index.remove(4)
+    assert index.status(3) is None
+    assert index.counts()[FormStatus.PENDING] == 1
+    assert sum(index.counts().values()) == 2
+
+    index.clear()
+    assert not any(index.counts().values())
+
+def test_status_index_follows_forms(users):
+    index = Form.status_index()
+    index.clear()
+    user = next(x for x in users.values() if not x.required_left)
+    user.status = FormStatus.PENDING
+    assert index.ids(FormStatus.PENDING) == [user.id]
+
+    # Reading status derived from answers updates the index too
+    user.delete_answer(next(iter(Form.required_tags())))
+    assert user.status == FormStatus.BLOCKING
+    assert index.status(user.id) == FormStatus.BLOCKING
+    assert index.count(FormStatus.PENDING) == 0
+
+def _answers(*tags):
+    return _AnswerList([_Answer(x, f'{x} answer') for x in tags])
+
+def test_answers_index_after_insert():
+    answers = _answers('a', 'b', 'c')
+    assert answers['c'].value == 'c answer'
+    answers.insert(0, _Answer('d', 'd answer'))
+    assert [answers[x].value for x in 'abcd'] == [f'{x} answer' for x in 'abcd']
+    answers.append(_Answer('e', 'e answer'))
+    answers['f'] = 'f answer'
+    assert [answers[x].value for x in 'ef'] == ['e answer', 'f answer']
+
+def test_answers_index_after_delete():
+    answers = _answers('a', 'b', 'c', 'd')
+    assert 'b' in answers
+    del answers['b']
+    assert 'b' not in answers
+    assert [answers[x].value for x in 'acd'] == [f'{x} answer' for x in 'acd']
+    with pytest.raises(MissingDataError):
+        del answers['b']
+    del answers['a']
+    answers['c'] = 'new answer'
+    assert [x.value for x in answers] == ['new answer', 'd answer']
+
+def test_required_left_after_delete(users):
+    user = next(x for x in users.values() if not x.required_left)
+    required = Form.required_tags()
+    user.delete_answer(required[0])
+    assert user.required_left == 1
+    user.answers[required[1]].value = 'changed'
+    del user.answers[required[1]]
+    assert user.required_left == 2
+    user.answers[required[0]] = 'answer'
+    assert user.required_left == 1
+
+def test_required_left_after_catalog_change(users):
+    user = next(x for x in users.values() if not x.required_left)
+    extra = _Question('extra', 'Extra question?', '', 'text', True)
+    Form.load_questions([extra, *reversed(CUSTOM_QUESTIONS)])
+    assert user.required_left == 1
+    assert user.coverage == Form.question_mask(x.tag for x in user.answers)
+
+    Form.load_questions([x for x in CUSTOM_QUESTIONS if not x.required])
+    assert user.required_left == 0
+
+def test_print_body_is_rendered_once(users, monkeypatch):
+    monkeypatch.setattr(Data, '_bot', FakeBot())
+    render_body = UserData._render_body # pylint: disable=W0212
+    rendered = []
+
+    def counted_render_body(self):
+        rendered.append(self.id)
+        return render_body(self)
+
+    monkeypatch.setattr(UserData, '_render_body', counted_render_body)
+    user = next(
+        x for x in users.values() if all(y in x.answers for y in ('name', 'age', 'place', 'self'))
+    )
+    body = user.print_body()
+    assert user.print_body() == body
+    assert len(rendered) == 1
+
+    user.answers['self'] = 'Changed answer'
+    assert user.print_body() != body
+    assert len(rendered) == 2
+
+    user.name_id = 'renamed'
+    user.print_body()
+    user.print_body()
+    assert len(rendered) == 3
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Conversation journal tests."""
+
+import os
+import time
+
+from polydating_bot.store import (
+    ConversationJournal
+)
+
+def _journal_lines(path):
+    with open(path + '.journal', 'r') as f:
+        return f.readlines()
+
+def test_journal_replay_drops_truncated_tail(tmp_path):
+    path = str(tmp_path / 'conv.yaml')
+    journal = ConversationJournal(path)
+    journal.load()
+    journal.append('user', (1,), 3)
+    journal.append('user', (2,), 4)
+    journal.append('user', (1,), 5)
+    journal.commit()
+
+    # Crash in the middle of the last record
+    lines = _journal_lines(path)
+    with open(path + '.journal', 'w') as f:
+        f.writelines(lines[:-1])
+        f.write(lines[-1][:len(lines[-1]) // 2])
+
+    assert ConversationJournal.read(path) == {'user': {(1,): 3, (2,): 4}}
+    assert ConversationJournal(path).load() == {'user': {(1,): 3, (2,): 4}}
+    # Loaded journal is compacted: no partial record stays behind
+    assert not os.path.exists(path + '.journal')
+
+def test_journal_compaction(tmp_path):
+    path = str(tmp_path / 'conv.yaml')
+    journal = ConversationJournal(path, ratio=1.0, min_size=64)
+    journal.load()
+    for key in range(100):
+        journal.append('user', (key,), key % 3 or None)
+
+    expected = {(x,): x % 3 for x in range(100) if x % 3}
+    deadline = time.monotonic() + 5
+    while os.path.exists(path + '.journal.old') and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ConversationJournal.read(path) == {'user': expected}
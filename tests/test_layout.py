@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Persistence directory layout tests."""
+
+import os
+
+from polydating_bot.data import (
+    Data,
+    DataType
+)
+from polydating_bot.store.layout import (
+    migrate_layout,
+    needs_migration,
+    record_directories
+)
+
+def _record(path, mtime):
+    os.makedirs(path)
+    with open(os.path.join(path, 'data.yaml'), 'w') as f:
+        f.write(path)
+    os.utime(os.path.join(path, 'data.yaml'), (mtime, mtime))
+
+def test_migrate_layout_keeps_newest(tmp_path):
+    type_dir = tmp_path / DataType.USER.value
+    target = type_dir / Data.shard(7) / '7'
+    _record(str(type_dir / '7_old'), 1000)
+    _record(str(type_dir / '7_new'), 3000)
+    _record(str(target), 2000)
+    _record(str(type_dir / '8_only'), 1000)
+    (type_dir / 'manifest.yaml').write_text('{}')
+    assert needs_migration(str(tmp_path))
+
+    assert migrate_layout(str(tmp_path)) == 2
+    assert not needs_migration(str(tmp_path))
+    assert (target / 'data.yaml').read_text() == str(type_dir / '7_new')
+    assert record_directories(str(type_dir)) == sorted([
+        os.path.join(Data.shard(7), '7'), os.path.join(Data.shard(8), '8')
+    ])
+    assert not (type_dir / 'manifest.yaml').exists()
+
+def test_migrate_layout_is_idempotent(tmp_path):
+    _record(str(tmp_path / DataType.CHAT.value / '-5_chat'), 1000)
+    assert migrate_layout(str(tmp_path)) == 1
+    assert migrate_layout(str(tmp_path)) == 0
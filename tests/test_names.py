@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Username lookup tests."""
+
+import random
+import types
+
+import pytest
+
+from telegram.ext import (
+    Dispatcher
+)
+
+from polydating_bot import (
+    CommandError,
+    MissingDataError
+)
+from polydating_bot.data import (
+    BotData,
+    Data,
+    UserData
+)
+from polydating_bot.handlers.common import (
+    _AdminAdd
+)
+
+from generator import (
+    make_bot,
+    make_user
+)
+from store import (
+    FakeBot
+)
+
+@pytest.fixture
+def dispatcher(monkeypatch):
+    """Dispatcher data with indexed users and bot data, without a bot."""
+    rng = random.Random(1)
+    dispatcher = types.SimpleNamespace(user_data={}, chat_data={}, bot_data={})
+    for var_id in range(1, 6):
+        user = make_user(var_id, rng)
+        dispatcher.user_data[var_id] = {}
+        user.update_dict(dispatcher.user_data, var_id)
+        user.index()
+    make_bot([1], []).update_dict(dispatcher.bot_data)
+
+    monkeypatch.setattr(Dispatcher, 'get_instance', lambda: dispatcher)
+    monkeypatch.setattr(Data, '_bot', FakeBot())
+    return dispatcher
+
+def test_by_username(dispatcher): # pylint: disable=W0613
+    assert UserData.by_username('user3').id == 3
+    assert UserData.by_username('@User3').id == 3
+    with pytest.raises(MissingDataError):
+        UserData.by_username('nobody')
+
+def test_by_username_after_rename(dispatcher): # pylint: disable=W0613
+    user = UserData.by_id(3)
+    user.name_id = 'Renamed'
+    assert UserData.by_username('@renamed') is user
+    with pytest.raises(MissingDataError):
+        UserData.by_username('user3')
+
+def _admin_add(dispatcher, value):
+    update = types.SimpleNamespace(message=types.SimpleNamespace(reply_to_message=None))
+    context = types.SimpleNamespace(bot_data=dispatcher.bot_data)
+    action = _AdminAdd(option_strings=[], dest='id', update=update, context=context)
+    action(None, None, value)
+    return list(BotData.from_dict(dispatcher.bot_data).admins)
+
+def test_admin_add(dispatcher):
+    assert _admin_add(dispatcher, '4') == [1, 4]
+    assert _admin_add(dispatcher, '@user5') == [1, 4, 5]
+    with pytest.raises(CommandError):
+        _admin_add(dispatcher, '@nobody')
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""YAML persistence tests."""
+
+import os
+import shutil
+import time
+
+import pytest
+
+from polydating_bot.data import (
+    Data,
+    DataType,
+    Form,
+    FormStatus,
+    UserData
+)
+from polydating_bot.store import (
+    Durability
+)
+from polydating_bot.store.workingset import (
+    WorkingSet
+)
+
+MODES = {
+    'sync': {},
+    'write-behind': {'flush_interval': 10},
+    'queue': {'write_queue': 4},
+    'on-flush': {'on_flush': True},
+    'group-commit': {'durability': Durability.GROUP_COMMIT, 'commit_interval': 10},
+    'per-write': {'durability': Durability.PER_WRITE},
+    'lazy': {'lazy': True, 'cache_size': 2},
+    'binary': {'binary': True},
+}
+
+def _note(user_data, user_id):
+    return UserData.from_dict(user_data[user_id]).note
+
+@pytest.mark.parametrize('mode', MODES)
+def test_round_trip(directory, open_store, mode):
+    persistence = open_store(directory, **MODES[mode])
+    user_data = persistence.get_user_data()
+    persistence.get_chat_data()
+    persistence.get_bot_data()
+    persistence.get_conversations('user')
+
+    for user_id in range(1, 6):
+        UserData.from_dict(user_data[user_id]).note = f'note {user_id}'
+        persistence.update_user_data(user_id, user_data[user_id])
+    persistence.update_conversation('user', (1,), 7)
+    persistence.update_conversation('user', (2,), None)
+    persistence.flush()
+
+    reopened = open_store(directory, binary=MODES[mode].get('binary', False))
+    user_data = reopened.get_user_data()
+    for user_id in range(1, 6):
+        assert _note(user_data, user_id) == f'note {user_id}'
+    conversations = reopened.get_conversations('user')
+    assert conversations[(1,)] == 7
+    assert (2,) not in conversations
+
+def test_write_behind_coalesces(directory, open_store):
+    persistence = open_store(directory, flush_interval=50)
+    user_data = persistence.get_user_data()
+    for count in range(20):
+        UserData.from_dict(user_data[1]).note = f'note {count}'
+        persistence.update_user_data(1, user_data[1])
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if _note(open_store(directory).get_user_data(), 1) == 'note 19':
+            break
+        time.sleep(0.05)
+    assert _note(open_store(directory).get_user_data(), 1) == 'note 19'
+
+def test_lazy_pinned_records_stay_loaded(directory, open_store):
+    persistence = open_store(directory, lazy=True, cache_size=1)
+    user_data = persistence.get_user_data()
+    assert isinstance(user_data, WorkingSet)
+
+    with user_data.pinned():
+        held = user_data[1]
+        for user_id in range(2, 6):
+            user_data[user_id] # pylint: disable=W0104
+        assert user_data[1] is held
+        UserData.from_dict(held).note = 'held'
+        persistence.update_user_data(1, user_data[1])
+    assert len(dict.keys(user_data)) == 1
+    persistence.flush()
+
+    assert _note(open_store(directory).get_user_data(), 1) == 'held'
+
+def test_bot_data_snapshot_is_detached(directory, open_store):
+    persistence = open_store(directory, on_flush=True)
+    bot_data = Data.from_dict(persistence.get_bot_data())
+    admins = list(bot_data.admins)
+    snapshot = bot_data.snapshot()
+
+    assert snapshot is not bot_data
+    assert list(snapshot.admins) == admins
+    del snapshot.admins[0]
+    assert list(bot_data.admins) == admins
+
+def test_iter_records_does_not_migrate(directory, open_store):
+    type_dir = os.path.join(directory, DataType.USER.value)
+    shutil.move(os.path.join(type_dir, Data.shard(3), '3'), os.path.join(type_dir, '3_user3'))
+    before = sorted(os.listdir(type_dir))
+
+    records = list(open_store(directory).iter_records(DataType.USER))
+    assert sorted(x.id for _, x in records) == list(range(1, 11))
+    assert [x for x, _ in records] == sorted(x for x, _ in records)
+    assert sorted(os.listdir(type_dir)) == before
+
+def test_iter_records_resumes(directory, open_store):
+    persistence = open_store(directory)
+    records = list(persistence.iter_records(DataType.USER))
+    start = records[4][0]
+    assert list(persistence.iter_records(DataType.USER, start)) == records[5:]
+
+def test_write_behind_survives_unexpected_errors(directory, open_store):
+    persistence = open_store(directory, flush_interval=10)
+    user_data = persistence.get_user_data()
+    dump_data = persistence._dump_data # pylint: disable=W0212
+    failures = []
+
+    def flaky_dump_data(data):
+        if not failures:
+            failures.append(data)
+            raise TypeError('not serializable')
+        dump_data(data)
+
+    persistence._dump_data = flaky_dump_data # pylint: disable=W0212
+    for user_id in range(1, 4):
+        UserData.from_dict(user_data[user_id]).note = f'note {user_id}'
+        persistence.update_user_data(user_id, user_data[user_id])
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        stored = open_store(directory).get_user_data()
+        if all(_note(stored, x) == f'note {x}' for x in range(1, 4)):
+            break
+        time.sleep(0.05)
+    stored = open_store(directory).get_user_data()
+    assert failures
+    assert [_note(stored, x) for x in range(1, 4)] == ['note 1', 'note 2', 'note 3']
+
+def test_indexes_are_written_on_flush(directory, open_store):
+    path = os.path.join(directory, DataType.USER.value, 'manifest.yaml')
+    persistence = open_store(directory, lazy=True)
+    persistence.get_user_data()
+    persistence.flush()
+    manifest_time = os.path.getmtime(path)
+
+    persistence = open_store(directory, lazy=True)
+    user_data = persistence.get_user_data()
+    for user_id in range(1, 4):
+        UserData.from_dict(user_data[user_id]).status = FormStatus.PENDING
+        persistence.update_user_data(user_id, user_data[user_id])
+    assert os.path.getmtime(path) == manifest_time
+
+    # Stale manifest entries of written records are loaded again
+    Form.status_index().clear()
+    open_store(directory, lazy=True).get_user_data()
+    assert all(Form.status_index().status(x) == FormStatus.PENDING for x in range(1, 4))
+
+    persistence.flush()
+    assert os.path.getmtime(path) != manifest_time
+
+def test_navigation_is_stored_apart(directory, open_store):
+    persistence = open_store(directory)
+    user_data = persistence.get_user_data()
+    user = UserData.from_dict(user_data[1])
+    data_path = os.path.join(user.directory(directory), 'data.yaml')
+    with open(data_path, 'rb') as file:
+        stored = file.read()
+
+    question = (user.current_question + 1) % len(user.questions)
+    user.current_question = question
+    persistence.update_user_data(1, user_data[1])
+    persistence.flush()
+    with open(data_path, 'rb') as file:
+        assert file.read() == stored
+    assert os.path.exists(os.path.join(user.directory(directory), 'nav.yaml'))
+
+    # Navigation state overrides the older one of data record
+    reopened = UserData.from_dict(open_store(directory).get_user_data()[1])
+    assert reopened.current_question == question
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""SQLite persistence tests."""
+
+from polydating_bot.store import (
+    SqlitePersistence
+)
+
+def _rows(persistence):
+    return persistence._execute( # pylint: disable=W0212
+        'SELECT name, key FROM conversations'
+    )
+
+def test_ended_conversation_is_deleted(tmp_path):
+    path = str(tmp_path / 'store.db')
+    persistence = SqlitePersistence(filename=path)
+    persistence.get_conversations('user')
+    persistence.update_conversation('user', (1,), 7)
+    persistence.update_conversation('user', (2,), 3)
+    persistence.update_conversation('user', (1,), None)
+    persistence.update_conversation('user', (3,), None)
+    assert persistence.get_conversations('user') == {(2,): 3}
+    assert [tuple(x) for x in _rows(persistence)] == [('user', '[2]')]
+
+    assert SqlitePersistence(filename=path).get_conversations('user') == {(2,): 3}
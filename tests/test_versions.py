@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Change detection tests."""
+
+import random
+
+from polydating_bot.data import (
+    DataType
+)
+from polydating_bot.store.versions import (
+    VersionTracker
+)
+
+from generator import (
+    make_user
+)
+
+def _user_dict(var_id):
+    data = {}
+    make_user(var_id, random.Random(var_id)).update_dict(data)
+    return data
+
+def test_loaded_record_is_unchanged():
+    tracker = VersionTracker()
+    data = _user_dict(1)
+    assert tracker.changes(DataType.USER, 1, data) == (False, False)
+    assert not tracker.changed(DataType.USER, 1, {})
+
+def test_data_and_detached_changes():
+    tracker = VersionTracker()
+    data = _user_dict(1)
+    user = data['data']
+
+    user.touch()
+    assert tracker.changes(DataType.USER, 1, data) == (True, False)
+    assert tracker.changes(DataType.USER, 1, data) == (False, False)
+
+    user.current_question += 1
+    assert tracker.changes(DataType.USER, 1, data) == (False, True)
+    assert tracker.changes(DataType.USER, 1, data) == (False, False)
+
+    user.touch()
+    user.current_question += 1
+    assert tracker.changes(DataType.USER, 1, data) == (True, True)
+
+def test_records_are_tracked_apart():
+    tracker = VersionTracker()
+    first, second = _user_dict(1), _user_dict(2)
+    first['data'].touch()
+    assert tracker.changed(DataType.USER, 1, first)
+    assert not tracker.changed(DataType.USER, 2, second)
+    assert not tracker.changed(DataType.USER, 1, first)
+
+def test_forget():
+    tracker = VersionTracker()
+    data = _user_dict(1)
+    data['data'].touch()
+    assert tracker.changed(DataType.USER, 1, data)
+    tracker.forget(DataType.USER, 1)
+    assert tracker.changed(DataType.USER, 1, data)
+    tracker.forget(DataType.USER, 2)
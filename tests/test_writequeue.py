@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Write queue tests."""
+
+import threading
+import time
+
+from polydating_bot.store.writequeue import (
+    WriteQueue
+)
+
+def test_write_queue_survives_unexpected_errors():
+    written = []
+    failures = []
+
+    def write(key, item):
+        # Poisoned record fails a few times, then goes through
+        if key == 'poisoned' and len(failures) < 3:
+            failures.append(key)
+            raise RuntimeError('bug in serializer')
+        written.append((key, item))
+
+    queue = WriteQueue(write, 4, retry_interval=0.01, max_retry_interval=0.02)
+    queue.put('poisoned', 0)
+    queue.put('a', 1)
+    queue.put('b', 2)
+
+    assert queue.join(5)
+    queue.put('c', 3)
+    deadline = time.monotonic() + 5
+    while len(written) < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(written) == [('a', 1), ('b', 2), ('c', 3), ('poisoned', 0)]
+    assert queue.stats['failures'] == 3
+
+def test_write_queue_coalesces():
+    release = threading.Event()
+    written = []
+
+    def write(key, item):
+        release.wait(5)
+        written.append((key, item))
+
+    queue = WriteQueue(write, 4)
+    queue.put('first', 0)
+    for value in range(10):
+        queue.put('key', value)
+    release.set()
+    assert queue.join(5)
+    assert ('key', 9) in written
+    assert len([x for x in written if x[0] == 'key']) <= 2